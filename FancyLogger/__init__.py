@@ -3,17 +3,46 @@
 
 import logging
 import os
+import pickle
+import socket
+import sys
+import threading
 import time
-import uuid
+import traceback
+from itertools import count, islice
 from logging import Formatter
 from logging.handlers import RotatingFileHandler
-from multiprocessing import Queue
+from multiprocessing import Array, Condition, Event, Pool, Queue, RawValue, Value, parent_process, resource_tracker
+from multiprocessing.util import Finalize
+from queue import SimpleQueue
 from time import strftime
 
 import dill
 
 from .commands import *
+from .handlers import BridgeHandler, CompressedRotatingFileHandler, DirectFileWriter
+from .mapping import ChunkSizer, MapFailure, map_chunk
+from .metrics import Counter, Gauge, MetricsRecorder, Span
+from .network import NetworkForwarder
 from .processing import MultiprocessingLogger
+from .sampling import SamplingRates
+from .sinks import BinaryIndexedSink, JsonLinesSink, Sink
+from .stacktraces import StacktraceTable, stacktrace_digest
+from .transport import RingBuffer, share_payload
+
+ring_creation_lock = threading.Lock()
+"Held while a thread allocates the ring buffer of the current process, so that its other threads do not allocate one."
+
+
+def reset_ring_creation_lock():
+    """
+    Gives a forked process its own ring creation lock, since another thread may have been holding it during the fork.
+    """
+    global ring_creation_lock
+    ring_creation_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=reset_ring_creation_lock)
 
 
 class TaskProgress(object):
@@ -32,7 +61,9 @@ class TaskProgress(object):
                  display_time=False):
         """
         Creates a new progress bar using the given information.
-        :param total:                       The total number of iteration for this progress bar.
+        :param total:                       The total number of iteration for this progress bar. If None, the bar is
+                                            indeterminate: it shows the number of iterations done so far until a total
+                                            is given.
         :param prefix:                      [Optional] The text that should be displayed at the left side of the
                                             progress bar. Note that progress bars will always stay left-aligned at the
                                             shortest possible.
@@ -67,15 +98,20 @@ class TaskProgress(object):
         self.decimals = decimals
         self.bar_length = bar_length
 
-    def set_progress(self, progress):
+    def set_progress(self, progress, total=None):
         """
         Defines the current progress for this progress bar in iteration units (not percent).
         :param progress:    Current progress in iteration units regarding its total (not percent).
-        :return:            True if the progress has changed. If the given progress is higher than the total or lower
-                            than 0 then it will be ignored.
+        :param total:       [Optional] New total number of iterations, such as the final count of an indeterminate bar.
+        :return:            True if the progress or the total has changed. If the given progress is higher than the
+                            total or lower than 0 then it will be ignored.
         """
+        total_changed = total is not None and total != self.total
+        if total_changed:
+            self.total = total
+
         _progress = progress
-        if _progress > self.total:
+        if self.total is not None and _progress > self.total:
             _progress = self.total
         elif _progress < 0:
             _progress = 0
@@ -93,7 +129,231 @@ class TaskProgress(object):
         if has_changed:
             self.progress = _progress
 
-        return has_changed
+        return has_changed or total_changed
+
+    def is_complete(self):
+        """
+        Tells whether the progress has reached the total. Indeterminate bars are never complete.
+        :return: True if the task has completed.
+        """
+        return self.total is not None and self.progress >= self.total
+
+
+class ProgressIterator(object):
+    """
+    Wraps any iterable, including generators and iterators of unknown length, to drive a progress bar while iterating.
+    Each iterator has its own state, so loops can be nested or run concurrently. Items are never stored, and updates are
+    sent at most once per interval rather than once per item.
+    """
+
+    def __init__(self,
+                 logger,
+                 iterable,
+                 total=None,
+                 task_progress_object=None,
+                 update_interval_millis=100):
+        """
+        Creates the progress bar of the iteration.
+        :param logger:                  The FancyLogger instance to send progress updates to.
+        :param iterable:                Any iterable.
+        :param total:                   [Optional] The expected number of items. Defaults to the length of the iterable
+                                        if it has one, otherwise to the total of 'task_progress_object'. If there is
+                                        none, the bar is indeterminate until the iteration ends.
+        :param task_progress_object:    [Optional] TaskProgress object holding the progress bar information.
+        :param update_interval_millis:  [Optional] Minimum time lapse in milliseconds between two progress updates.
+        """
+        super(ProgressIterator, self).__init__()
+
+        if total is None:
+            try:
+                total = len(iterable)
+            except TypeError:
+                total = task_progress_object.total if task_progress_object else None
+
+        if task_progress_object:
+            # Force total attribute
+            task_progress_object.total = total
+        else:
+            task_progress_object = TaskProgress(total=total,
+                                                display_time=True,
+                                                prefix='Progress')
+
+        self.logger = logger
+        self.iterator = iter(iterable)
+        self.total = total
+        self.update_interval = update_interval_millis / 1000.
+        self.count = 0
+        self.sent_count = 0
+        self.last_update = time.time()
+
+        # Create a task progress, updated through its handle
+        self.task_id = self.logger.set_task_object(task_id=None,
+                                                   task_progress_object=task_progress_object)
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            item = next(self.iterator)
+        except StopIteration:
+            # The final count is the actual total, whatever was expected
+            self.close(total=self.count)
+            raise
+
+        self.count += 1
+
+        now = time.time()
+        if now - self.last_update >= self.update_interval:
+            self.last_update = now
+            self.sent_count = self.count
+            self.logger.update(task_id=self.task_id, progress=self.count)
+
+        return item
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.abandon()
+
+    def __del__(self):
+        # A loop left by 'break' or an exception drops the iterator without closing it
+        if not getattr(self, 'closed', True):
+            self.abandon()
+
+    def abandon(self):
+        """
+        Sends the last progress update of an iteration that may not have reached its end.
+        """
+        # An indeterminate bar would otherwise never complete
+        self.close(total=self.count if self.total is None else None)
+
+    def close(self, total=None):
+        """
+        Sends the last progress update. Called when the iteration ends, when leaving a 'with' block, or when the
+        iterator is dropped before its end.
+        :param total: [Optional] The final total of the bar.
+        """
+        if self.closed:
+            return
+        self.closed = True
+
+        if self.count != self.sent_count or total is not None:
+            self.logger.update(task_id=self.task_id, progress=self.count, total=total)
+
+
+class FuturesTracker(object):
+    """
+    Drives a progress bar from a batch of concurrent.futures futures, using done-callbacks. Completions are counted
+    locally and sent as throttled progress updates rather than one command per future. Failed futures are sent to the
+    exceptions panel.
+    """
+
+    def __init__(self,
+                 logger,
+                 futures,
+                 task_progress_object=None,
+                 update_interval_millis=100):
+        """
+        Creates the progress bar and attaches a done-callback to every future.
+        :param logger:                  The FancyLogger instance to send progress updates to.
+        :param futures:                 Iterable of futures, from a ThreadPoolExecutor, a ProcessPoolExecutor or any
+                                        other executor.
+        :param task_progress_object:    [Optional] TaskProgress object holding the progress bar information.
+        :param update_interval_millis:  [Optional] Minimum time lapse in milliseconds between two progress updates.
+        """
+        super(FuturesTracker, self).__init__()
+
+        self.futures = list(futures)
+        self.total = len(self.futures)
+
+        if task_progress_object:
+            # Force total attribute
+            task_progress_object.total = self.total
+        else:
+            task_progress_object = TaskProgress(total=self.total,
+                                                display_time=True,
+                                                prefix='Futures')
+
+        self.logger = logger
+        self.update_interval = update_interval_millis / 1000.
+        self.last_update = 0
+
+        # Callbacks run in executor threads, incrementing an itertools counter and appending to a list are atomic
+        self.completed = count(1)
+        self.failed_futures = []
+        self.send_lock = threading.Lock()
+        self.done = threading.Event()
+
+        self.task_id = self.logger.set_task_object(task_id=None,
+                                                   task_progress_object=task_progress_object)
+
+        if not self.futures:
+            self.done.set()
+
+        for future in self.futures:
+            future.add_done_callback(self.future_done)
+
+    def future_done(self, future):
+        """
+        Done-callback of every future: counts it, reports its exception if any, and sends a progress update if the
+        interval has elapsed or if it is the last one.
+        :param future: The completed future.
+        """
+        completed = next(self.completed)
+
+        if not future.cancelled() and future.exception() is not None:
+            self.failed_futures.append(future)
+            exception = future.exception()
+            self.logger.throw(stacktrace=''.join(traceback.format_exception(type(exception),
+                                                                            exception,
+                                                                            exception.__traceback__)),
+                              process_title='future')
+
+        if completed >= self.total:
+            with self.send_lock:
+                self.logger.update(task_id=self.task_id, progress=completed)
+                self.done.set()
+        elif time.time() - self.last_update >= self.update_interval and self.send_lock.acquire(blocking=False):
+            # Another thread may already be sending an update, then this one is skipped. So is an update that would
+            # come after the last one
+            try:
+                if not self.done.is_set():
+                    self.last_update = time.time()
+                    self.logger.update(task_id=self.task_id, progress=completed)
+            finally:
+                self.send_lock.release()
+
+    def wait(self, timeout=None):
+        """
+        Waits for all the futures to complete.
+        :param timeout: [Optional] Maximum time in seconds to wait.
+        :return:        True if all the futures have completed.
+        """
+        return self.done.wait(timeout)
+
+
+class LazyArg(object):
+    """
+    Argument of a log message whose value is expensive to compute, such as a large representation. The function is
+    called only if some output displays or writes the message, by the process that logs it.
+    """
+
+    __slots__ = ('function',)
+
+    def __init__(self, function):
+        """
+        Defines the argument.
+        :param function: Function without parameters returning the value of the argument.
+        """
+        super(LazyArg, self).__init__()
+
+        self.function = function
+
+    def __call__(self):
+        return self.function()
 
 
 class FancyLogger(object):
@@ -107,6 +367,88 @@ class FancyLogger(object):
 
     queue = None
     "Handles all messages and progress to be sent to the logger process."
+    ring_wakeup = None
+    "Event set when a ring buffer goes from empty to non-empty. If None, all commands are sent through the queue."
+    ring = None
+    "The shared memory ring buffer of the current process. Each producer process allocates its own."
+    ring_pid = None
+    "The pid of the process that allocated 'ring', so forked processes know they must allocate their own."
+    ring_lock = None
+    """
+    Held by the threads of the current process while writing to 'ring', whose producer side is single-threaded. Rings
+    are fastest with one sending thread per process, since other threads wait for the lock.
+    """
+    ring_buffer_size = None
+    "The size in bytes of each producer's ring buffer."
+    large_payload_size = None
+    """
+    Size in bytes above which a serialized command is passed through a shared memory block of its own, and only a
+    reference to it is sent. If None, all commands are sent whole.
+    """
+    lanes = None
+    """
+    Queues of the priority lanes, indexed by CONTROL_LANE, ERROR_LANE, MESSAGE_LANE and PROGRESS_LANE. The first one is
+    'queue'. If None, all commands are sent through 'queue' alone.
+    """
+    lane_wakeup = None
+    "Event set when a command is sent through a priority lane while the logger process is waiting for one."
+    lanes_idle = None
+    "Shared flag raised by the logger process before it waits on 'lane_wakeup'."
+    coalesce_interval_millis = None
+    """
+    Maximum time lapse in milliseconds during which identical consecutive messages of a process are counted instead of
+    being sent. If None or 0, every message is sent.
+    """
+    last_message = None
+    "Tuple (level, text, args, kwargs, console weight, file weight) of the last message sent by the current process."
+    last_message_time = None
+    "The time in seconds since the epoch at which the last message, or its repeat count, was sent."
+    pending_message = None
+    "LogMessageCommand counting the repeats of the last message that have not been sent yet."
+    message_pid = None
+    "The pid of the process that sent 'last_message', so forked processes do not inherit its repeat count."
+    sampling_rates = None
+    "Sampling rates of each level for console and file outputs, shared by all processes."
+    call_site_counts = None
+    """
+    The number of messages sent so far by each call site of the current process, identified by tuples (code, line), so
+    that sampling keeps the same messages from one run to the next.
+    """
+    sampling_pid = None
+    "The pid of the process that counted 'call_site_counts', so forked processes start counting from zero."
+    stacktrace_table = None
+    """
+    Digests of the stacktraces whose full text has already been sent, shared by all processes. Later occurrences are
+    sent as references. If None, stacktraces are always sent in full.
+    """
+    metrics = None
+    "MetricsRecorder aggregating the spans, counters and gauges of the current process. Each process creates its own."
+    metrics_interval_millis = None
+    "Minimum time lapse in milliseconds between two batches of metrics sent by a process."
+    flush_barrier = None
+    "Shared counter from which each flush barrier takes its identifier."
+    flush_acks = None
+    "Shared array in which the logger process acknowledges flush barriers, one slot per identifier modulo its size."
+    flush_condition = None
+    "Shared condition notified by the logger process each time it acknowledges a flush barrier."
+    bridge_handlers = None
+    "BridgeHandler objects installed by 'bridge_logging', whose pending records are sent on flush."
+    handle_counter = None
+    "Counter from which the current process allocates task handles."
+    handle_pid = None
+    "The pid of the process that owns 'handle_counter', so that handles allocated by forked processes cannot collide."
+    levels = None
+    """
+    Shared array of the lowest levels (from standard logging module) displayed by the console, written by the file
+    handlers and written by the sinks, so that every process can drop the messages that no output emits before
+    formatting them. If None, such as with 'remote_address', all messages are sent.
+    """
+    direct_file = None
+    "DirectFileWriter to which each process writes the messages of file-only levels itself. If None, all are sent."
+    sequence_counter = None
+    "Counter from which the current process numbers its messages."
+    sequence_pid = None
+    "The pid of the process that owns 'sequence_counter', so forked processes number their messages from zero."
 
     default_message_number = 20
     "Default value for the logger configuration."
@@ -137,7 +479,33 @@ class FancyLogger(object):
                  console_format_strftime=default_console_format_strftime,
                  console_format=default_console_format,
                  file_handlers=None,
-                 application_name=None):
+                 application_name=None,
+                 collector_address=None,
+                 remote_address=None,
+                 node_name=None,
+                 collector_secret=None,
+                 transport='queue',
+                 ring_buffer_size=4194304,
+                 sinks=None,
+                 record_filename=None,
+                 keyframe_interval_millis=10000,
+                 line_mode=None,
+                 line_progress_interval_millis=5000,
+                 stacktrace_table_size=4096,
+                 coalesce_interval_millis=None,
+                 rate_limit=None,
+                 rate_limit_burst=None,
+                 rate_limit_interval_millis=1000,
+                 console_sampling_rates=None,
+                 file_sampling_rates=None,
+                 metrics_interval_millis=1000,
+                 metrics_textfile=None,
+                 metrics_textfile_interval_millis=15000,
+                 direct_filename=None,
+                 reorder_delay_millis=None,
+                 reorder_capacity=10000,
+                 large_payload_size=None,
+                 priority_lanes=False):
         """
         Initializes a new logger and starts its process immediately using given configuration.
         :param message_number:              [Optional] Number of simultaneously displayed messages below progress bars.
@@ -169,11 +537,143 @@ class FancyLogger(object):
         :param application_name:            [Optional] Used only if 'file_handlers' parameter is ignored. Specifies the
                                             application name to use to format the default file logger using format:
                                             application_%Y-%m-%d_%H-%M-%S.log
+        :param collector_address:           [Optional] Tuple (host, port) on which the logger process accepts batches
+                                            from remote FancyLogger instances. Each remote node is displayed as one
+                                            aggregate progress bar and its messages are prefixed by the node name.
+        :param remote_address:              [Optional] Tuple (host, port) of a collector. If specified, no display is
+                                            done locally: commands are batched, compressed and sent to the collector by
+                                            a forwarder process, which buffers them while the collector is unreachable.
+        :param node_name:                   [Optional] Used only with 'remote_address'. The name under which this node
+                                            is displayed by the collector. Defaults to the host name.
+        :param collector_secret:            [Optional] Required with 'collector_address' or 'remote_address'. The secret,
+                                            as bytes or string, shared by the collector and its remote nodes. Every
+                                            batch is signed with it, and the collector drops the batches whose signature
+                                            does not match. The collector only accepts plain command data from remote
+                                            nodes: commands that only dill can serialize are dropped.
+        :param transport:                   [Optional] How commands reach the logger process. 'queue' uses one shared
+                                            multiprocessing queue. 'ring' gives each producer process its own lock-free
+                                            ring buffer in shared memory, polled by the logger process in round-robin.
+                                            Ignored with 'remote_address'.
+        :param ring_buffer_size:            [Optional] Used only with 'ring' transport. The size in bytes of the ring
+                                            buffer allocated by each producer process. Defaults to 4 MB.
+        :param sinks:                       [Optional] Outputs fed directly from command fields in addition to the file
+                                            handlers, such as JsonLinesSink which writes one JSON object per line.
+        :param record_filename:             [Optional] Path of the file to record the session into. Commands are
+                                            written as they are received by the logger process, along with periodic
+                                            snapshots of the display, so that the session can be replayed at any speed
+                                            and from any point in time with 'python -m FancyLogger.replay'.
+        :param keyframe_interval_millis:    [Optional] Used only with 'record_filename'. Minimum time lapse in
+                                            milliseconds between two display snapshots. Lower values make seeking
+                                            faster and the recorded file larger.
+        :param line_mode:                   [Optional] If True, the console output is append-only instead of being
+                                            redrawn: each message is written once and progress is written as periodic
+                                            summary lines for the tasks that changed. If None, line mode is used when
+                                            stdout is not a terminal, such as in CI jobs, pipes and container logs.
+        :param line_progress_interval_millis: [Optional] Used only in line mode. Minimum time lapse in milliseconds
+                                            between two progress summaries.
+        :param stacktrace_table_size: [Optional] The number of unique stacktraces whose full text is sent only once.
+                                            Stacktraces are normalized to remove addresses and pids, and later
+                                            occurrences are sent as references and displayed as a count. Once the table
+                                            is full, new stacktraces are sent in full each time. Disabled if 0.
+        :param coalesce_interval_millis:    [Optional] Identical consecutive messages of a process are counted instead
+                                            of being sent, and their count is sent at most once per this time lapse in
+                                            milliseconds, or along with the next different message or flush. The logger
+                                            process also coalesces identical consecutive messages from all processes
+                                            into a single '(repeated N times)' line. Counts not sent yet when a process
+                                            exits are sent by its exit handlers. Disabled if None or 0.
+        :param rate_limit:                  [Optional] Maximum number of messages per second accepted from each process
+                                            at each level, enforced by the logger process with a token bucket. Messages
+                                            beyond it are dropped and their count is written to the file handlers and
+                                            sinks. Disabled if None.
+        :param rate_limit_burst:            [Optional] Used only with 'rate_limit'. The number of messages that can be
+                                            accepted at once after a quiet period. Defaults to 'rate_limit'.
+        :param rate_limit_interval_millis:  [Optional] Used only with 'rate_limit'. Time lapse in milliseconds between
+                                            two reports of suppressed messages.
+        :param console_sampling_rates:      [Optional] Dictionary of sampling rates between 0 and 1 for console output,
+                                            identified by level (from standard logging module), such as
+                                            {logging.DEBUG: 0.01}. Messages are sampled by the process that logs them,
+                                            before serialization, keeping one message out of 1/rate at each call site,
+                                            always the same ones from one run to the next. Missing levels are not
+                                            sampled. Can be changed at runtime with 'set_configuration' or 'set_level'.
+        :param file_sampling_rates:         [Optional] Same as above for file handlers and sinks. Sampled messages are
+                                            written with their weight, that is the number of messages they stand for.
+        :param metrics_interval_millis:     [Optional] Spans, counters and gauges are aggregated by the process that
+                                            records them, and sent to the logger process at most once per this time
+                                            lapse in milliseconds, or on flush.
+        :param metrics_textfile:            [Optional] Path of a file that the logger process rewrites atomically with
+                                            all metrics in the Prometheus text format, to be read by the node exporter
+                                            textfile collector. Its name should end with '.prom'.
+        :param metrics_textfile_interval_millis: [Optional] Used only with 'metrics_textfile'. Minimum time lapse in
+                                            milliseconds between two rewrites of the file.
+        :param direct_filename:             [Optional] Path of a log file to which each process appends the messages
+                                            that are kept by the file output but not displayed by the console, such as
+                                            DEBUG ones after 'set_level(DEBUG)' then 'set_level(INFO,
+                                            console_only=True)', without sending them to the logger process. The logger
+                                            process appends the other messages to the same file, and is its only file
+                                            output: a ValueError is raised if 'file_handlers', 'sinks', 'rate_limit' or
+                                            'reorder_delay_millis' is specified too, since they would not receive the
+                                            messages written directly. Repeats are coalesced by each process. Ignored
+                                            with 'remote_address'.
+        :param reorder_delay_millis:        [Optional] Each process numbers its messages, and the logger process holds
+                                            them up to this time lapse in milliseconds to merge the messages of all
+                                            processes in the order of their timestamps before writing them to the file
+                                            handlers and sinks. File records then carry the time at which messages were
+                                            made instead of the time they were received. The console is not delayed.
+                                            Disabled if None or 0.
+        :param reorder_capacity:            [Optional] Used only with 'reorder_delay_millis'. The maximum number of
+                                            messages held, beyond which the oldest ones are written without waiting.
+        :param large_payload_size:          [Optional] Size in bytes above which a serialized command, such as a long
+                                            stacktrace or message, is copied into a shared memory block of its own and
+                                            only a small reference goes through the queue or ring buffer, so that it
+                                            does not hold back the commands of other processes. The logger process
+                                            deserializes it from the block, then destroys the block. Disabled if None.
+                                            Ignored with 'remote_address'.
+        :param priority_lanes:              [Optional] Used only with 'queue' transport. If True, commands are sent
+                                            through four queues: control commands, then ERROR and CRITICAL messages and
+                                            exceptions, then other messages, then progress. The logger process always
+                                            drains a lane before the next ones, and applies only the latest update of
+                                            each task among the progress updates read at once, so that failures are
+                                            displayed without waiting behind progress traffic. Messages of different
+                                            lanes may be written out of order, unless 'reorder_delay_millis' is
+                                            specified. Configuration changes, flush barriers and exit are sent through
+                                            every lane and applied once everything sent before them has been. Ignored
+                                            with 'remote_address'.
         """
         super(FancyLogger, self).__init__()
 
+        if stacktrace_table_size and not self.stacktrace_table:
+            self.stacktrace_table = StacktraceTable(size=stacktrace_table_size)
+
+        self.coalesce_interval_millis = coalesce_interval_millis
+        self.metrics_interval_millis = metrics_interval_millis
+
+        if not self.sampling_rates:
+            self.sampling_rates = SamplingRates(console_rates=console_sampling_rates, file_rates=file_sampling_rates)
+
+        if (collector_address or remote_address) and not collector_secret:
+            raise ValueError('collector_secret is required with collector_address or remote_address')
+
+        if isinstance(collector_secret, str):
+            collector_secret = collector_secret.encode('utf8')
+
+        # Send everything to a remote collector
+        if remote_address:
+            if not self.queue:
+                self.queue = Queue()
+                self.process = NetworkForwarder(queue=self.queue,
+                                                address=remote_address,
+                                                node_name=node_name or socket.gethostname(),
+                                                secret=collector_secret)
+                self.process.start()
+            return
+
+        # Messages written directly would not reach them
+        if direct_filename and (file_handlers or sinks or rate_limit or reorder_delay_millis):
+            raise ValueError('direct_filename cannot be used with file_handlers, sinks, rate_limit or '
+                             'reorder_delay_millis')
+
         # Define default file handlers
-        if not file_handlers:
+        if not file_handlers and not direct_filename:
             if not application_name:
                 app_name = 'application'
             else:
@@ -192,8 +692,43 @@ class FancyLogger(object):
 
             file_handlers = self.default_file_handlers
 
+        if self.levels is None:
+            # The file level is the console level until 'set_level' changes either. Each level is written at once by a
+            # single store, so readers do not need the lock
+            self.levels = Array('i', [console_level, console_level, self.sinks_level(sinks)], lock=False)
+
+        if direct_filename and not self.direct_file:
+            self.direct_file = DirectFileWriter(filename=direct_filename,
+                                                levels=self.levels,
+                                                formatter=Formatter(fmt='%(asctime)s [%(levelname)s]\t%(message)s',
+                                                                    datefmt=self.default_console_format_strftime))
+            file_handlers = list(file_handlers or []) + [self.direct_file.handler()]
+
+        # Only used by 'flush(wait=True)'; slots are reused once that many barriers have been acknowledged
+        if self.flush_acks is None:
+            self.flush_barrier = Value('Q', 0)
+            self.flush_acks = Array('Q', 1024, lock=False)
+            self.flush_condition = Condition()
+
+        if transport == 'ring':
+            self.ring_wakeup = Event()
+            self.ring_buffer_size = ring_buffer_size
+
+        self.large_payload_size = large_payload_size
+
+        if transport == 'ring' or large_payload_size:
+            # Producers and the logger process must share one resource tracker, otherwise a shared memory block would be
+            # destroyed as soon as its producer exits
+            resource_tracker.ensure_running()
+
         if not self.queue:
             self.queue = Queue()
+
+            if priority_lanes and transport != 'ring':
+                self.lanes = [self.queue] + [Queue() for _ in range(PROGRESS_LANE)]
+                self.lane_wakeup = Event()
+                self.lanes_idle = RawValue('b', 0)
+
             self.process = MultiprocessingLogger(queue=self.queue,
                                                  console_level=console_level,
                                                  message_number=message_number,
@@ -203,27 +738,350 @@ class FancyLogger(object):
                                                  task_millis_to_removal=task_millis_to_removal,
                                                  console_format_strftime=console_format_strftime,
                                                  console_format=console_format,
-                                                 file_handlers=file_handlers)
+                                                 file_handlers=file_handlers,
+                                                 collector_address=collector_address,
+                                                 collector_secret=collector_secret,
+                                                 ring_wakeup=self.ring_wakeup,
+                                                 sinks=sinks,
+                                                 record_filename=record_filename,
+                                                 keyframe_interval_millis=keyframe_interval_millis,
+                                                 line_mode=line_mode,
+                                                 line_progress_interval_millis=line_progress_interval_millis,
+                                                 coalesce_interval_millis=coalesce_interval_millis,
+                                                 rate_limit=rate_limit,
+                                                 rate_limit_burst=rate_limit_burst,
+                                                 rate_limit_interval_millis=rate_limit_interval_millis,
+                                                 metrics_textfile=metrics_textfile,
+                                                 metrics_textfile_interval_millis=metrics_textfile_interval_millis,
+                                                 flush_acks=self.flush_acks,
+                                                 flush_condition=self.flush_condition,
+                                                 reorder_delay_millis=reorder_delay_millis,
+                                                 reorder_capacity=reorder_capacity,
+                                                 lanes=self.lanes,
+                                                 lane_wakeup=self.lane_wakeup,
+                                                 lanes_idle=self.lanes_idle)
             self.process.start()
 
-    def flush(self):
+    def send_command(self, command):
+        """
+        Serializes a command and sends it to the logger process through the configured transport.
+        :param command: The command object to send.
+        """
+        try:
+            serialized = pickle.dumps(command, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # Objects such as file handlers can only be serialized by dill, which is much slower
+            serialized = dill.dumps(command)
+
+        if self.lanes is None:
+            self.send_serialized(serialized)
+        elif is_barrier(command):
+            for lane in range(len(self.lanes)):
+                self.send_serialized(serialized, lane=lane)
+        else:
+            self.send_serialized(serialized, lane=command_lane(command))
+
+    def send_serialized(self, serialized, lane=CONTROL_LANE):
+        """
+        Sends a serialized command to the logger process through the configured transport.
+        :param serialized:  The command as returned by 'pickle.dumps', 'dill.dumps' or 'encode_update'.
+        :param lane:        [Optional] Used only with priority lanes. The lane through which the command is sent.
+        """
+        if self.large_payload_size and len(serialized) > self.large_payload_size:
+            serialized = share_payload(serialized) or serialized
+
+        if self.ring_wakeup is None:
+            if self.lanes is None:
+                self.queue.put(serialized)
+                return
+
+            self.lanes[lane].put(serialized)
+
+            # Reading the flag is much cheaper than setting the event, which only the first command after the logger
+            # process started waiting does
+            if self.lanes_idle.value:
+                self.lanes_idle.value = 0
+                self.lane_wakeup.set()
+            return
+
+        # Each process allocates its own ring buffer the first time it sends something
+        if self.ring_pid != os.getpid():
+            with ring_creation_lock:
+                if self.ring_pid != os.getpid():
+                    self.ring_lock = threading.Lock()
+                    self.ring = RingBuffer.create(size=self.ring_buffer_size)
+                    self.queue.put(dill.dumps(RegisterRingCommand(pid=os.getpid(),
+                                                                  name=self.ring.name)))
+                    self.ring_wakeup.set()
+
+                    # Run before the finalizers of the queue, which close it
+                    Finalize(None, self.close_ring, exitpriority=100)
+
+                    # Set last, so that other threads skip this block only once the ring is ready
+                    self.ring_pid = os.getpid()
+
+        with self.ring_lock:
+            if self.ring is None:
+                self.queue.put(serialized)
+                self.ring_wakeup.set()
+                return
+
+            was_empty = self.ring.write(serialized)
+
+            if was_empty is None:
+                # The logger process has not been reading for a while. From now on, this process sends everything
+                # through the queue, and the logger process reads what is left in the ring before what comes after
+                # this command
+                self.ring = None
+                self.queue.put(dill.dumps(UnregisterRingCommand(pid=self.ring_pid)))
+                self.queue.put(serialized)
+                self.ring_wakeup.set()
+            elif was_empty:
+                self.ring_wakeup.set()
+
+    def close_ring(self):
+        """
+        Tells the logger process that the current process will not write to its ring buffer anymore, so that the ring
+        is destroyed once read, then unmaps it. Called when the process exits. Later commands are sent through the queue.
+        """
+        if self.ring_pid != os.getpid():
+            return
+
+        with self.ring_lock:
+            ring = self.ring
+            if ring is None:
+                return
+            self.ring = None
+
+            serialized = dill.dumps(UnregisterRingCommand(pid=self.ring_pid))
+            if ring.write(serialized) is None:
+                # The logger process reads what is left in the ring upon receiving it
+                self.queue.put(serialized)
+            self.ring_wakeup.set()
+
+            ring.close()
+
+    @staticmethod
+    def sinks_level(sinks):
+        """
+        Finds the lowest level written by some sink.
+        :param sinks:   List of Sink objects, or None.
+        :return:        The lowest level of the sinks, or a level above all standard ones if there are none.
+        """
+        return min([sink.level for sink in sinks or ()] + [logging.CRITICAL + 1])
+
+    def defer_arguments(self, text, args, kwargs):
+        """
+        Computes the LazyArg arguments of a message. Arguments are sent as they are to be formatted by the logger
+        process when all of them are primitive values, otherwise the message is formatted now.
+        :param text:    The format string of the message.
+        :param args:    The positional arguments.
+        :param kwargs:  The keyword arguments.
+        :return:        Tuple (text, args, kwargs) to send, where args and kwargs are None if the text is formatted.
+        """
+        args = tuple(arg() if isinstance(arg, LazyArg) else arg for arg in args)
+        kwargs = {key: value() if isinstance(value, LazyArg) else value for key, value in kwargs.items()}
+
+        # Other objects may not be serializable, or may not format the same way once serialized
+        if all(type(arg) in DEFERRED_TYPES for arg in args) \
+                and all(type(value) in DEFERRED_TYPES for value in kwargs.values()):
+            return text, args or None, kwargs or None
+
+        return format_message(text, args, kwargs), None, None
+
+    def send_message(self, text, level, args=None, kwargs=None):
+        """
+        Sends a log message, unless it is identical to the previous one of the current process, in which case it is
+        counted and the count is sent later as one command.
+        :param text:    The text to log into file and console, or its format string if there are arguments.
+        :param level:   Level of logging for this message.
+        :param args:    [Optional] Positional arguments of the format string.
+        :param kwargs:  [Optional] Keyword arguments of the format string.
+        """
+        # Arguments are not even computed for messages that no output emits
+        if (args or kwargs) and self.levels is not None and level < min(self.levels):
+            return
+
+        now = time.time()
+        console_weight = file_weight = 1.
+
+        if self.sampling_rates:
+            if self.sampling_pid != os.getpid():
+                self.sampling_pid = os.getpid()
+                self.call_site_counts = {}
+
+            # The caller of the public logging method
+            frame = sys._getframe(2)
+            call_site = (frame.f_code, frame.f_lineno)
+            count = self.call_site_counts[call_site] = self.call_site_counts.get(call_site, 0) + 1
+
+            console_weight, file_weight = self.sampling_rates.weights(level=level, count=count)
+            if not console_weight and not file_weight:
+                return
+
+        if args or kwargs:
+            text, args, kwargs = self.defer_arguments(text=text, args=args or (), kwargs=kwargs or {})
+
+        if not self.coalesce_interval_millis:
+            self.send_message_command(LogMessageCommand(text=text, level=level, pid=os.getpid(), timestamp=now,
+                                                        console_weight=console_weight, file_weight=file_weight,
+                                                        sequence=self.next_sequence(), args=args, kwargs=kwargs))
+            return
+
+        if self.message_pid != os.getpid():
+            self.message_pid = os.getpid()
+            self.last_message = None
+            self.pending_message = None
+
+            # The repeat count of the last message must not be lost when the process exits. Runs before the finalizers
+            # of the ring and of the queue, which close them
+            Finalize(None, self.send_pending_message, exitpriority=101)
+
+        if self.last_message == (level, text, args, kwargs, console_weight, file_weight):
+            if not self.pending_message:
+                self.pending_message = LogMessageCommand(text=text, level=level, pid=self.message_pid, repeat=0,
+                                                         console_weight=console_weight, file_weight=file_weight,
+                                                         args=args, kwargs=kwargs)
+            self.pending_message.repeat += 1
+            self.pending_message.timestamp = now
+
+            if (now - self.last_message_time) * 1000 >= self.coalesce_interval_millis:
+                self.send_pending_message()
+            return
+
+        self.send_pending_message()
+        self.send_message_command(LogMessageCommand(text=text, level=level, pid=self.message_pid, timestamp=now,
+                                                    console_weight=console_weight, file_weight=file_weight,
+                                                    sequence=self.next_sequence(), args=args, kwargs=kwargs))
+        self.last_message = (level, text, args, kwargs, console_weight, file_weight)
+        self.last_message_time = now
+
+    def send_message_command(self, command):
+        """
+        Sends a message to the logger process, or appends it to the direct log file if its level is kept by the file
+        output only.
+        :param command: The LogMessageCommand object.
+        """
+        if not self.direct_file or not self.direct_file.accepts(command.level):
+            self.send_command(command)
+            return
+
+        if command.file_weight:
+            text = format_message(command.text, command.args, command.kwargs)
+            if command.repeat > 1:
+                text = '{} (repeated {} times)'.format(text, command.repeat)
+            self.direct_file.write(text=text, level=command.level, timestamp=command.timestamp,
+                                   weight=command.file_weight)
+
+    def next_sequence(self):
+        """
+        Numbers a message of the current process.
+        :return: The sequence number of the message.
+        """
+        if self.sequence_pid != os.getpid():
+            self.sequence_pid = os.getpid()
+            self.sequence_counter = count()
+
+        return next(self.sequence_counter)
+
+    def send_pending_message(self):
+        """
+        Sends the repeat count of the last message of the current process, if any.
+        """
+        if self.pending_message and self.message_pid == os.getpid():
+            self.pending_message.sequence = self.next_sequence()
+            self.send_message_command(self.pending_message)
+            self.last_message_time = time.time()
+        self.pending_message = None
+
+    def flush_bridges(self):
+        """
+        Sends the records waiting in the batches of the bridge handlers, if any.
+        """
+        for handler in self.bridge_handlers or ():
+            handler.flush()
+
+    def send_metrics(self, exited=False):
+        """
+        Sends the metrics aggregated by the current process since its last batch, if any.
+        :param exited: [Optional] True if the current process is exiting, so that the values of its gauges are dropped.
+        """
+        if self.metrics and self.metrics.pid == os.getpid():
+            command = self.metrics.take_command(exited=exited)
+            if command:
+                self.send_command(command)
+
+    def next_barrier(self):
+        """
+        Takes a new identifier from the shared flush barrier counter.
+        :return: The identifier, unique across processes.
+        """
+        with self.flush_barrier.get_lock():
+            self.flush_barrier.value += 1
+            return self.flush_barrier.value
+
+    def config_barrier(self):
+        """
+        With priority lanes, configuration commands are barriers, so that they do not overtake the messages sent before
+        them through the lower lanes.
+        :return: A new barrier identifier with priority lanes, None otherwise.
+        """
+        return self.next_barrier() if self.lanes is not None else None
+
+    def flush(self, wait=False, timeout=None):
         """
         Flushes the remaining messages and progress bars state by forcing redraw. Can be useful if you want to be sure
         that a message or progress has been updated in display at a given moment in code, like when you are exiting an
         application or doing some kind of synchronized operations.
+        :param wait:    [Optional] If True, blocks until the logger process has applied every command sent by the current
+                        process before this call, flushed every file handler and sink, and rendered a frame. Ignored
+                        with 'remote_address'.
+        :param timeout: [Optional] Used only with 'wait'. Maximum time in seconds to wait. If None, waits forever.
+        :return:        With 'wait', the time in seconds the barrier took, or None if the timeout expired. Otherwise
+                        None.
         """
-        self.queue.put(dill.dumps(FlushCommand()))
+        self.send_pending_message()
+        self.send_metrics()
+        self.flush_bridges()
+
+        if not wait or self.flush_acks is None:
+            self.send_command(FlushCommand())
+            return None
+
+        start = time.time()
+
+        barrier = self.next_barrier()
+        slot = barrier % len(self.flush_acks)
+
+        # Commands of a process are received in order, so the barrier comes after everything sent before it. With
+        # priority lanes, it is sent through each of them and applied once it came out of the last one
+        self.send_command(FlushCommand(barrier=barrier))
+
+        with self.flush_condition:
+            acknowledged = self.flush_condition.wait_for(lambda: self.flush_acks[slot] == barrier, timeout)
+
+        return time.time() - start if acknowledged else None
 
     def terminate(self):
         """
         Tells the logger process to exit immediately. If you do not call 'flush' method before, you may lose some
         messages of progresses that have not been displayed yet. This method blocks until logger process has stopped.
         """
-        self.queue.put(dill.dumps(ExitCommand()))
+        self.send_pending_message()
+        self.send_metrics()
+        self.flush_bridges()
+        self.send_command(ExitCommand())
 
         if self.process:
             self.process.join()
 
+        # The logger process has destroyed every ring
+        if self.ring_pid == os.getpid():
+            with self.ring_lock:
+                if self.ring is not None:
+                    self.ring.close()
+                    self.ring = None
+
     def set_configuration(self,
                           message_number=default_message_number,
                           exception_number=default_exception_number,
@@ -233,7 +1091,10 @@ class FancyLogger(object):
                           task_millis_to_removal=default_task_millis_to_removal,
                           console_format_strftime=default_console_format_strftime,
                           console_format=default_console_format,
-                          file_handlers=default_file_handlers):
+                          file_handlers=default_file_handlers,
+                          sinks=None,
+                          console_sampling_rates=None,
+                          file_sampling_rates=None):
         """
         Defines the current configuration of the logger. Can be used at any moment during runtime to modify the logger
         behavior.
@@ -263,44 +1124,93 @@ class FancyLogger(object):
                                             uses regular python logging rules. All handlers are permitted except
                                             StreamHandler if used with stdout or stderr which are reserved by this
                                             library for custom console output.
+        :param sinks:                       [Optional] Outputs fed directly from command fields in addition to the file
+                                            handlers, such as JsonLinesSink. If None, the current sinks are kept.
+        :param console_sampling_rates:      [Optional] Dictionary of sampling rates between 0 and 1 for console output,
+                                            identified by level. Applies to all processes. Missing levels keep their
+                                            current rate.
+        :param file_sampling_rates:         [Optional] Same as above for file handlers and sinks.
         """
-        self.queue.put(dill.dumps(SetConfigurationCommand(task_millis_to_removal=task_millis_to_removal,
-                                                          console_level=console_level,
-                                                          permanent_progressbar_slots=permanent_progressbar_slots,
-                                                          message_number=message_number,
-                                                          exception_number=exception_number,
-                                                          redraw_frequency_millis=redraw_frequency_millis,
-                                                          console_format_strftime=console_format_strftime,
-                                                          console_format=console_format,
-                                                          file_handlers=file_handlers)))
+        # Nothing is changed if the configuration is refused
+        if self.direct_file and (file_handlers or sinks):
+            raise ValueError('direct_filename cannot be used with file_handlers or sinks')
+
+        self.sampling_rates.update(console_rates=console_sampling_rates, file_rates=file_sampling_rates)
+
+        if self.levels is not None:
+            self.levels[0] = console_level
+            if sinks is not None:
+                self.levels[2] = self.sinks_level(sinks)
+
+        if self.direct_file:
+            file_handlers = [self.direct_file.handler()]
+
+        self.send_command(SetConfigurationCommand(task_millis_to_removal=task_millis_to_removal,
+                                                  console_level=console_level,
+                                                  permanent_progressbar_slots=permanent_progressbar_slots,
+                                                  message_number=message_number,
+                                                  exception_number=exception_number,
+                                                  redraw_frequency_millis=redraw_frequency_millis,
+                                                  console_format_strftime=console_format_strftime,
+                                                  console_format=console_format,
+                                                  file_handlers=file_handlers,
+                                                  sinks=sinks,
+                                                  barrier=self.config_barrier()))
 
     def set_level(self,
                   level,
-                  console_only=False):
+                  console_only=False,
+                  sampling_rate=None):
         """
         Defines the logging level (from standard logging module) for log messages.
         :param level:           Level of logging for the file logger.
         :param console_only:    [Optional] If True then the file logger will not be affected.
+        :param sampling_rate:   [Optional] Sampling rate between 0 and 1 of the messages at this level, for all
+                                processes. If None, the current rate is kept.
         """
-        self.queue.put(dill.dumps(SetLevelCommand(level=level,
-                                                  console_only=console_only)))
+        if sampling_rate is not None:
+            self.sampling_rates.update(console_rates={level: sampling_rate},
+                                       file_rates=None if console_only else {level: sampling_rate})
+
+        if self.levels is not None:
+            self.levels[0] = level
+            if not console_only:
+                self.levels[1] = level
+
+        self.send_command(SetLevelCommand(level=level,
+                                          console_only=console_only,
+                                          barrier=self.config_barrier()))
+
+    def new_handle(self):
+        """
+        Allocates a task handle unique across processes: the pid of the current process in the high 32 bits, and a
+        counter of this process in the low ones.
+        :return: The TaskHandle.
+        """
+        if self.handle_pid != os.getpid():
+            self.handle_pid = os.getpid()
+            self.handle_counter = count(1)
+
+        return TaskHandle((self.handle_pid << 32) | (next(self.handle_counter) & 0xFFFFFFFF))
 
     def set_task_object(self,
                         task_id,
                         task_progress_object):
         """
         Defines a new progress bar with the given information using a TaskProgress object.
-        :param task_id:                 Unique identifier for this progress bar. Will erase if already existing.
+        :param task_id:                 Unique identifier for this progress bar. Will erase if already existing. If
+                                        None, the returned handle is used as identifier.
         :param task_progress_object:    TaskProgress object holding the progress bar information.
+        :return:                        The TaskHandle of the progress bar, see 'set_task'.
         """
-        self.set_task(task_id=task_id,
-                      total=task_progress_object.total,
-                      prefix=task_progress_object.prefix,
-                      suffix=task_progress_object.suffix,
-                      decimals=task_progress_object.decimals,
-                      bar_length=task_progress_object.bar_length,
-                      keep_alive=task_progress_object.keep_alive,
-                      display_time=task_progress_object.display_time)
+        return self.set_task(task_id=task_id,
+                             total=task_progress_object.total,
+                             prefix=task_progress_object.prefix,
+                             suffix=task_progress_object.suffix,
+                             decimals=task_progress_object.decimals,
+                             bar_length=task_progress_object.bar_length,
+                             keep_alive=task_progress_object.keep_alive,
+                             display_time=task_progress_object.display_time)
 
     def set_task(self,
                  task_id,
@@ -313,7 +1223,10 @@ class FancyLogger(object):
                  display_time=False):
         """
         Defines a new progress bar with the given information.
-        :param task_id:         Unique identifier for this progress bar. Will erase if already existing.
+        The returned handle can be given to 'update' instead of the task id: the logger process maps it to the task id
+        once, so that each update is sent as a small fixed-size record instead of a pickled command.
+        :param task_id:         Unique identifier for this progress bar. Will erase if already existing. If None, the
+                                returned handle is used as identifier.
         :param total:           The total number of iteration for this progress bar.
         :param prefix:          The text that should be displayed at the left side of the progress bar. Note that
                                 progress bars will always stay left-aligned at the shortest possible.
@@ -325,19 +1238,67 @@ class FancyLogger(object):
         :param display_time:    [Optional] Specify whether the duration since the progress has begun should be
                                 displayed. Running time will be displayed between parenthesis, whereas it will be
                                 displayed between brackets when the progress has completed.
+        :return:                The TaskHandle of the progress bar.
         """
-        self.queue.put(dill.dumps(NewTaskCommand(task_id=task_id,
-                                                 task=TaskProgress(total,
-                                                                   prefix,
-                                                                   suffix,
-                                                                   decimals,
-                                                                   bar_length,
-                                                                   keep_alive,
-                                                                   display_time))))
+        handle = self.new_handle()
+
+        self.send_command(NewTaskCommand(task_id=handle if task_id is None else task_id,
+                                         task=TaskProgress(total,
+                                                           prefix,
+                                                           suffix,
+                                                           decimals,
+                                                           bar_length,
+                                                           keep_alive,
+                                                           display_time),
+                                         handle=handle))
+
+        return handle
+
+    def set_tasks(self, tasks):
+        """
+        Defines many progress bars in one command, which the logger process applies with a single layout computation
+        and a single redraw.
+        :param tasks: Dictionary of TaskProgress objects identified by task id, or iterable of tuples (task id,
+                      TaskProgress). Existing progress bars with the same ids are erased.
+        :return:      The list of the TaskHandle of each progress bar, in the same order.
+        """
+        tasks = list(tasks.items() if isinstance(tasks, dict) else tasks)
+        handles = [self.new_handle() for _ in tasks]
+
+        self.send_command(NewTaskBatchCommand(task_ids=[task_id for task_id, _ in tasks],
+                                              totals=[t.total for _, t in tasks],
+                                              prefixes=[t.prefix for _, t in tasks],
+                                              suffixes=[t.suffix for _, t in tasks],
+                                              decimals=[t.decimals for _, t in tasks],
+                                              bar_lengths=[t.bar_length for _, t in tasks],
+                                              keep_alive=[t.keep_alive for _, t in tasks],
+                                              display_time=[t.display_time for _, t in tasks],
+                                              handles=handles))
+
+        return handles
+
+    def update_many(self, progresses, totals=None):
+        """
+        Defines the current progress of many progress bars in one command, which the logger process applies with a
+        single redraw. Unknown ids and unchanged progress are ignored.
+        :param progresses:  Dictionary of current progress in iteration units (not percent), identified by task id or
+                            TaskHandle.
+        :param totals:      [Optional] Dictionary of new total numbers of iterations, identified the same way. Totals of
+                            the other progress bars are kept.
+        """
+        task_ids = list(progresses)
+
+        self.send_command(UpdateProgressBatchCommand(task_ids=task_ids,
+                                                     progresses=[progresses[task_id] for task_id in task_ids],
+                                                     pid=os.getpid(),
+                                                     timestamp=time.time(),
+                                                     totals=[totals.get(task_id) for task_id in task_ids]
+                                                     if totals else None))
 
     def update(self,
                task_id,
-               progress):
+               progress,
+               total=None):
         """
         Defines the current progress for this progress bar id in iteration units (not percent).
         If the given id does not exist or the given progress is identical to the current, then does nothing.
@@ -345,66 +1306,104 @@ class FancyLogger(object):
         at the very time they are being logged but their timestamp will be captured at the right time. Logger will
         redraw at a given time period AND when new messages or progress are logged. If you still want to force redraw
         immediately (may produce flickering) then call 'flush' method.
-        :param task_id:     Unique identifier for this progress bar. Will erase if already existing.
+        :param task_id:     Unique identifier for this progress bar, or the TaskHandle returned by 'set_task'.
         :param progress:    Current progress in iteration units regarding its total (not percent).
+        :param total:       [Optional] New total number of iterations, such as the final count of an indeterminate bar.
+                            If None, the total is kept.
         """
-        self.queue.put(dill.dumps(UpdateProgressCommand(task_id=task_id,
-                                                        progress=progress)))
+        if total is None and isinstance(task_id, TaskHandle):
+            self.send_serialized(encode_update(handle=task_id,
+                                               progress=progress,
+                                               pid=os.getpid(),
+                                               timestamp=time.time()),
+                                 lane=PROGRESS_LANE)
+            return
 
-    def debug(self, text):
+        self.send_command(UpdateProgressCommand(task_id=task_id,
+                                                progress=progress,
+                                                pid=os.getpid(),
+                                                timestamp=time.time(),
+                                                total=total))
+
+    def debug(self, text, *args, **kwargs):
         """
         Posts a debug message adding a timestamp and logging level to it for both file and console handlers.
         Logger uses a redraw rate because of console flickering. That means it will not draw new messages or progress
         at the very time they are being logged but their timestamp will be captured at the right time. Logger will
         redraw at a given time period AND when new messages or progress are logged. If you still want to force redraw
         immediately (may produce flickering) then call 'flush' method.
-        :param text: The text to log into file and console.
+        :param text:    The text to log into file and console. With arguments, a format string such as 'rows=%s' that
+                        the logger process formats with the '%' operator, as the standard logging module does, only if
+                        the message is displayed or written. Arguments may be LazyArg objects, whose value is computed
+                        only if some output emits the message.
+        :param args:    [Optional] Positional arguments of the format string.
+        :param kwargs:  [Optional] Keyword arguments of the format string, for named conversions such as '%(rows)s'.
         """
-        self.queue.put(dill.dumps(LogMessageCommand(text=text, level=logging.DEBUG)))
+        self.send_message(text=text, level=logging.DEBUG, args=args, kwargs=kwargs)
 
-    def info(self, text):
+    def info(self, text, *args, **kwargs):
         """
         Posts an info message adding a timestamp and logging level to it for both file and console handlers.
         Logger uses a redraw rate because of console flickering. That means it will not draw new messages or progress
         at the very time they are being logged but their timestamp will be captured at the right time. Logger will
         redraw at a given time period AND when new messages or progress are logged. If you still want to force redraw
         immediately (may produce flickering) then call 'flush' method.
-        :param text: The text to log into file and console.
+        :param text:    The text to log into file and console. With arguments, a format string such as 'rows=%s' that
+                        the logger process formats with the '%' operator, as the standard logging module does, only if
+                        the message is displayed or written. Arguments may be LazyArg objects, whose value is computed
+                        only if some output emits the message.
+        :param args:    [Optional] Positional arguments of the format string.
+        :param kwargs:  [Optional] Keyword arguments of the format string, for named conversions such as '%(rows)s'.
         """
-        self.queue.put(dill.dumps(LogMessageCommand(text=text, level=logging.INFO)))
+        self.send_message(text=text, level=logging.INFO, args=args, kwargs=kwargs)
 
-    def warning(self, text):
+    def warning(self, text, *args, **kwargs):
         """
         Posts a warning message adding a timestamp and logging level to it for both file and console handlers.
         Logger uses a redraw rate because of console flickering. That means it will not draw new messages or progress
         at the very time they are being logged but their timestamp will be captured at the right time. Logger will
         redraw at a given time period AND when new messages or progress are logged. If you still want to force redraw
         immediately (may produce flickering) then call 'flush' method.
-        :param text: The text to log into file and console.
+        :param text:    The text to log into file and console. With arguments, a format string such as 'rows=%s' that
+                        the logger process formats with the '%' operator, as the standard logging module does, only if
+                        the message is displayed or written. Arguments may be LazyArg objects, whose value is computed
+                        only if some output emits the message.
+        :param args:    [Optional] Positional arguments of the format string.
+        :param kwargs:  [Optional] Keyword arguments of the format string, for named conversions such as '%(rows)s'.
         """
-        self.queue.put(dill.dumps(LogMessageCommand(text=text, level=logging.WARNING)))
+        self.send_message(text=text, level=logging.WARNING, args=args, kwargs=kwargs)
 
-    def error(self, text):
+    def error(self, text, *args, **kwargs):
         """
         Posts an error message adding a timestamp and logging level to it for both file and console handlers.
         Logger uses a redraw rate because of console flickering. That means it will not draw new messages or progress
         at the very time they are being logged but their timestamp will be captured at the right time. Logger will
         redraw at a given time period AND when new messages or progress are logged. If you still want to force redraw
         immediately (may produce flickering) then call 'flush' method.
-        :param text: The text to log into file and console.
+        :param text:    The text to log into file and console. With arguments, a format string such as 'rows=%s' that
+                        the logger process formats with the '%' operator, as the standard logging module does, only if
+                        the message is displayed or written. Arguments may be LazyArg objects, whose value is computed
+                        only if some output emits the message.
+        :param args:    [Optional] Positional arguments of the format string.
+        :param kwargs:  [Optional] Keyword arguments of the format string, for named conversions such as '%(rows)s'.
         """
-        self.queue.put(dill.dumps(LogMessageCommand(text=text, level=logging.ERROR)))
+        self.send_message(text=text, level=logging.ERROR, args=args, kwargs=kwargs)
 
-    def critical(self, text):
+    def critical(self, text, *args, **kwargs):
         """
         Posts a critical message adding a timestamp and logging level to it for both file and console handlers.
         Logger uses a redraw rate because of console flickering. That means it will not draw new messages or progress
         at the very time they are being logged but their timestamp will be captured at the right time. Logger will
         redraw at a given time period AND when new messages or progress are logged. If you still want to force redraw
         immediately (may produce flickering) then call 'flush' method.
-        :param text: The text to log into file and console.
+        :param text:    The text to log into file and console. With arguments, a format string such as 'rows=%s' that
+                        the logger process formats with the '%' operator, as the standard logging module does, only if
+                        the message is displayed or written. Arguments may be LazyArg objects, whose value is computed
+                        only if some output emits the message.
+        :param args:    [Optional] Positional arguments of the format string.
+        :param kwargs:  [Optional] Keyword arguments of the format string, for named conversions such as '%(rows)s'.
         """
-        self.queue.put(dill.dumps(LogMessageCommand(text=text, level=logging.CRITICAL)))
+        self.send_message(text=text, level=logging.CRITICAL, args=args, kwargs=kwargs)
 
     def throw(self, stacktrace, process_title=None):
         """
@@ -414,58 +1413,321 @@ class FancyLogger(object):
         :param process_title:   [Optional] Define the current process title to display into the logger for this
                                 exception.
         """
-        self.queue.put(dill.dumps(StacktraceCommand(pid=os.getpid(),
-                                                    stacktrace=stacktrace,
-                                                    process_title=process_title)))
+        digest = stacktrace_digest(stacktrace)
+
+        # Only the first process that hits a bug sends the full stacktrace
+        if self.stacktrace_table and not self.stacktrace_table.add(digest):
+            self.send_command(StacktraceReferenceCommand(pid=os.getpid(),
+                                                         digest=digest,
+                                                         process_title=process_title,
+                                                         timestamp=time.time()))
+        else:
+            self.send_command(StacktraceCommand(pid=os.getpid(),
+                                                stacktrace=stacktrace,
+                                                process_title=process_title,
+                                                timestamp=time.time(),
+                                                digest=digest))
+
+    def bridge_logging(self,
+                       level=logging.INFO,
+                       logger_name=None,
+                       batch_size=100,
+                       batch_millis=100):
+        """
+        Forwards the records of the standard logging module to the logger process, so that third-party libraries are
+        displayed and written like the other messages, prefixed by their logger name. Must be called in each process
+        whose records should be forwarded, typically at the start of every worker. Replaces any bridge installed on the
+        same logger before.
+        :param level:           [Optional] The minimum level (from standard logging module) of forwarded records. It
+                                is also set as the level of the standard logger, so records below it are not even
+                                created.
+        :param logger_name:     [Optional] The name of the standard logger to install the bridge on. Defaults to the
+                                root logger, which receives the records of all libraries.
+        :param batch_size:      [Optional] The maximum number of records sent in one batch.
+        :param batch_millis:    [Optional] Maximum time lapse in milliseconds a record waits for its batch to be sent.
+        :return:                The installed BridgeHandler.
+        """
+        standard_logger = logging.getLogger(logger_name)
+
+        replaced = [h for h in standard_logger.handlers if isinstance(h, BridgeHandler)]
+        for handler in replaced:
+            handler.close()
+            standard_logger.removeHandler(handler)
+
+        handler = BridgeHandler(logger=self, level=level, batch_size=batch_size, batch_millis=batch_millis)
+        standard_logger.addHandler(handler)
+        standard_logger.setLevel(level)
+
+        self.bridge_handlers = [h for h in self.bridge_handlers or () if h not in replaced] + [handler]
+
+        return handler
+
+    def span(self, name):
+        """
+        Measures the wall and CPU durations of a block of code with 'with logger.span(name):', or of every call to a
+        function with '@logger.span(name)'. Durations are aggregated into histograms by the calling process and sent in
+        batches, then displayed by the logger process as call count and percentiles per span name.
+        :param name:    The name under which durations are aggregated and displayed.
+        :return:        Span object, to use as a context manager or as a decorator.
+        """
+        return Span(logger=self, name=name)
+
+    def record_span(self, name, wall, cpu):
+        """
+        Aggregates the durations of one span, and sends the aggregated metrics if the interval has elapsed.
+        :param name:    The span name.
+        :param wall:    The wall-clock duration in seconds.
+        :param cpu:     The CPU duration of the process in seconds.
+        """
+        self.metrics_recorder().record_span(name=name, wall=wall, cpu=cpu)
+
+        if self.metrics.is_due():
+            self.send_metrics()
+
+    def counter(self, name):
+        """
+        Gets a counter of events, such as rows written or retries, to increment with 'logger.counter(name).inc(n)'.
+        Increments are summed by the calling process and sent in batches, then the logger process adds up the counts of
+        all processes and displays them in the metrics panel.
+        :param name:    The name under which counts are added up and displayed.
+        :return:        Counter object.
+        """
+        return Counter(logger=self, name=name)
+
+    def gauge(self, name):
+        """
+        Gets a gauge holding a value that can go up and down, such as a queue size, to set with
+        'logger.gauge(name).set(value)'. Only the last value of each batch is sent. The logger process keeps one value
+        per process and displays their sum in the metrics panel.
+        :param name:    The name under which values are displayed.
+        :return:        Gauge object.
+        """
+        return Gauge(logger=self, name=name)
+
+    def record_counter(self, name, delta):
+        """
+        Aggregates an increment of a counter, and sends the aggregated metrics if the interval has elapsed.
+        :param name:    The counter name.
+        :param delta:   The amount added.
+        """
+        self.metrics_recorder().record_counter(name=name, delta=delta)
+
+        if self.metrics.is_due():
+            self.send_metrics()
+
+    def record_gauge(self, name, value, relative=False):
+        """
+        Aggregates a new value of a gauge, and sends the aggregated metrics if the interval has elapsed.
+        :param name:        The gauge name.
+        :param value:       The new value.
+        :param relative:    [Optional] If True, 'value' is added to the current value of the gauge instead.
+        """
+        self.metrics_recorder().record_gauge(name=name, value=value, relative=relative)
+
+        if self.metrics.is_due():
+            self.send_metrics()
+
+    def metrics_recorder(self):
+        """
+        Gets the MetricsRecorder of the current process, creating it the first time.
+        :return: MetricsRecorder object.
+        """
+        # Each process aggregates its own metrics
+        if not self.metrics or self.metrics.pid != os.getpid():
+            self.metrics = MetricsRecorder(interval_millis=self.metrics_interval_millis)
+
+            # Metrics aggregated since the last batch must not be lost when the process exits, and the gauges of a
+            # producer process must not count once it is gone. Runs before the finalizers of the ring and of the queue,
+            # which close them
+            Finalize(None, self.send_metrics, kwargs={'exited': parent_process() is not None}, exitpriority=101)
+
+        return self.metrics
 
     # --------------------------------------------------------------------
     # Iterator implementation
     def progress(self,
                  enumerable,
-                 task_progress_object=None):
+                 task_progress_object=None,
+                 total=None,
+                 update_interval_millis=100):
         """
-        Enables the object to be used as an iterator. Each iteration will produce a progress update in the logger.
-        :param enumerable:              Collection to iterate over.
+        Wraps an iterable so that iterating over it drives a progress bar in the logger.
+        :param enumerable:              Any iterable, including generators and iterators of unknown length.
         :param task_progress_object:    [Optional] TaskProgress object holding the progress bar information.
-        :return:                        The logger instance.
+        :param total:                   [Optional] The expected number of items, if the iterable has no length. If
+                                        there is none, the bar is indeterminate until the iteration ends.
+        :param update_interval_millis:  [Optional] Minimum time lapse in milliseconds between two progress updates.
+        :return:                        A new ProgressIterator over the iterable.
         """
-        self.list = enumerable
-        self.list_length = len(enumerable)
-        self.task_id = uuid.uuid4()
-        self.index = 0
+        return ProgressIterator(logger=self,
+                                iterable=enumerable,
+                                total=total,
+                                task_progress_object=task_progress_object,
+                                update_interval_millis=update_interval_millis)
+
+    def track_futures(self,
+                      futures,
+                      task_progress_object=None,
+                      update_interval_millis=100):
+        """
+        Drives a progress bar from a batch of futures, such as those returned by 'submit' on a ThreadPoolExecutor or a
+        ProcessPoolExecutor. Each future only costs a done-callback and a counter increment, progress updates are
+        throttled, and failed futures are sent to the exceptions panel as with 'throw'.
+        :param futures:                 Iterable of futures.
+        :param task_progress_object:    [Optional] TaskProgress object holding the progress bar information.
+        :param update_interval_millis:  [Optional] Minimum time lapse in milliseconds between two progress updates.
+        :return:                        A FuturesTracker, whose 'wait' method waits for all the futures.
+        """
+        return FuturesTracker(logger=self,
+                              futures=futures,
+                              task_progress_object=task_progress_object,
+                              update_interval_millis=update_interval_millis)
+
+    def progress_map(self,
+                     func,
+                     iterable,
+                     processes=None,
+                     chunksize=None,
+                     ordered=True,
+                     total=None,
+                     task_progress_object=None,
+                     worker_bars=False,
+                     max_chunks_in_flight=None,
+                     update_interval_millis=100):
+        """
+        Applies a function to every item of an iterable in a pool of processes, driving a progress bar. Items are read
+        lazily and only a bounded number of chunks is submitted at once, so the iterable can be larger than memory.
+        Exceptions raised by the function are sent to the exceptions panel with their stacktrace, and a MapFailure object
+        holding that stacktrace is yielded in place of the result of each failed item.
+        :param func:                    The function to apply. Must be picklable, that is defined at module level.
+        :param iterable:                Any iterable, including generators and iterators of unknown length.
+        :param processes:               [Optional] The number of worker processes. Defaults to the number of CPUs.
+        :param chunksize:               [Optional] The number of items sent to a worker at once. By default, it is
+                                        adjusted continuously so that each chunk takes about 100 milliseconds.
+        :param ordered:                 [Optional] If True, results are yielded in the order of the items. Otherwise,
+                                        they are yielded as soon as their chunk completes.
+        :param total:                   [Optional] The expected number of items, if the iterable has no length. If
+                                        there is none, the bar is indeterminate until all items have been processed.
+        :param task_progress_object:    [Optional] TaskProgress object holding the progress bar information.
+        :param worker_bars:             [Optional] If True, each worker also gets an indeterminate bar counting the
+                                        items it has processed.
+        :param max_chunks_in_flight:    [Optional] The maximum number of chunks submitted and not yet returned. Defaults
+                                        to twice the number of processes.
+        :param update_interval_millis:  [Optional] Minimum time lapse in milliseconds between two progress updates.
+        :return:                        Generator of the results of the function, or of MapFailure objects for the
+                                        failed items.
+        """
+        if total is None:
+            try:
+                total = len(iterable)
+            except TypeError:
+                total = task_progress_object.total if task_progress_object else None
 
         if task_progress_object:
             # Force total attribute
-            task_progress_object.total = self.list_length
+            task_progress_object.total = total
         else:
-            task_progress_object = TaskProgress(total=self.list_length,
+            task_progress_object = TaskProgress(total=total,
                                                 display_time=True,
                                                 prefix='Progress')
 
-        # Create a task progress
-        self.set_task_object(task_id=self.task_id,
-                             task_progress_object=task_progress_object)
+        task_id = self.set_task_object(task_id=None,
+                                       task_progress_object=task_progress_object)
 
-        return self
+        processes = processes or os.cpu_count() or 1
+        max_chunks_in_flight = max_chunks_in_flight or 2 * processes
+        sizer = ChunkSizer()
+        iterator = iter(iterable)
 
-    def __iter__(self):
-        """
-        Enables the object to be used as an iterator. Each iteration will produce a progress update in the logger.
-        :return: The logger instance.
-        """
-        return self
+        # Pool callbacks run in a thread of the pool, they hand results over to this generator
+        returned = SimpleQueue()
 
-    def __next__(self):
-        """
-        Enables the object to be used as an iterator. Each iteration will produce a progress update in the logger.
-        :return: The current object of the iterator.
-        """
-        if self.index >= self.list_length:
-            raise StopIteration
-        else:
-            self.index += 1
-            self.update(task_id=self.task_id,
-                        progress=self.index)
+        pool = Pool(processes=processes)
+        completed = False
+        progress = 0
+        workers = {}
+        worker_handles = {}
+
+        try:
+            submitted = 0
+            in_flight = 0
+            exhausted = False
+            next_index = 0
+            buffered = {}
+            last_update = time.time()
+
+            while True:
+                # Keep the pool fed while bounding the work held in memory
+                while not exhausted and in_flight < max_chunks_in_flight:
+                    chunk = list(islice(iterator, chunksize or sizer.size))
+                    if not chunk:
+                        exhausted = True
+                        break
+
+                    # A chunk that fails before reaching a worker still counts one outcome per item
+                    pool.apply_async(map_chunk,
+                                     (func, submitted, chunk),
+                                     callback=returned.put,
+                                     error_callback=lambda e, index=submitted, size=len(chunk):
+                                     returned.put((index, None, 0., [(False, ''.join(
+                                         traceback.format_exception(type(e), e, e.__traceback__)))] * size)))
+                    submitted += 1
+                    in_flight += 1
+
+                if not in_flight:
+                    break
+
+                chunk_index, pid, duration, outcomes = returned.get()
+                in_flight -= 1
+
+                if pid is None:
+                    # The whole chunk failed before reaching a worker, such as when the function cannot be pickled
+                    self.throw(stacktrace=outcomes[0][1], process_title='progress_map')
+                else:
+                    sizer.measure(items=len(outcomes), duration=duration)
+
+                    for success, value in outcomes:
+                        if not success:
+                            self.throw(stacktrace=value, process_title='progress_map worker {}'.format(pid))
+
+                progress += len(outcomes)
+                if worker_bars and pid is not None:
+                    if pid not in workers:
+                        workers[pid] = 0
+                        worker_handles[pid] = self.set_task(task_id=(task_id, pid),
+                                                            total=None,
+                                                            prefix='Worker {}'.format(pid))
+                    workers[pid] += len(outcomes)
+
+                now = time.time()
+                if (now - last_update) * 1000 >= update_interval_millis:
+                    last_update = now
+                    self.update(task_id=task_id, progress=progress)
+                    for worker_pid, count in workers.items():
+                        self.update(task_id=worker_handles[worker_pid], progress=count)
+
+                if ordered:
+                    buffered[chunk_index] = outcomes
+                    while next_index in buffered:
+                        for success, value in buffered.pop(next_index):
+                            yield value if success else MapFailure(stacktrace=value)
+                        next_index += 1
+                else:
+                    for success, value in outcomes:
+                        yield value if success else MapFailure(stacktrace=value)
+
+            completed = True
+        finally:
+            # The final count is the actual total, whatever was expected, so bars complete even after an early exit
+            self.update(task_id=task_id, progress=progress, total=progress if completed or total is None else None)
+            for worker_pid, count in workers.items():
+                self.update(task_id=worker_handles[worker_pid], progress=count, total=count)
+
+            if completed:
+                pool.close()
+            else:
+                # The caller stopped iterating, or an error occurred: pending chunks are abandoned
+                pool.terminate()
+            pool.join()
 
-            return self.list[self.index - 1]
     # ---------------------------------------------------------------------
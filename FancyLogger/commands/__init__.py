@@ -1,6 +1,126 @@
 #!/bin/env/python
 # coding: utf-8
 
+import logging
+import struct
+from collections.abc import Mapping
+
+import dill
+
+from ..transport import PAYLOAD_TAG, load_payload
+
+UPDATE_TAG = b'U'
+"First byte of a compact progress update. Pickles start with the PROTO opcode instead, so both share a transport."
+UPDATE_RECORD = struct.Struct('<cIQdd')
+"Layout of a compact progress update: tag, pid, task handle, progress and timestamp."
+DEFERRED_TYPES = (type(None), bool, int, float, complex, str, bytes)
+"Types of the message arguments sent as they are, to be formatted by the logger process."
+CONTROL_LANE, ERROR_LANE, MESSAGE_LANE, PROGRESS_LANE = range(4)
+"Priority lanes, from the first drained by the logger process to the last."
+
+
+class TaskHandle(int):
+    """
+    Compact identifier of a progress bar, allocated by the process that defines it. The logger process maps it to the
+    task id once, so that the updates sent with it only carry a fixed-width integer.
+    """
+
+    __slots__ = ()
+
+
+def encode_update(handle, progress, pid, timestamp):
+    """
+    Serializes a progress update of a task known by its handle, as a fixed-size record instead of a pickle.
+    :param handle:      The TaskHandle of the progress bar.
+    :param progress:    Current progress in iteration units regarding its total (not percent).
+    :param pid:         The pid of the process that sent the update.
+    :param timestamp:   The time of the update in seconds since the epoch.
+    :return:            The serialized update.
+    """
+    return UPDATE_RECORD.pack(UPDATE_TAG, pid, handle, progress, timestamp)
+
+
+def decode_command(serialized):
+    """
+    Deserializes a command sent by a working process: pickled, a compact progress update, or a reference to a command
+    passed through shared memory, whose block is then destroyed.
+    :param serialized:  The serialized command.
+    :return:            The ProcessCommand object.
+    """
+    tag = serialized[:1]
+
+    if tag == UPDATE_TAG:
+        _, pid, handle, progress, timestamp = UPDATE_RECORD.unpack(serialized)
+        return UpdateProgressCommand(task_id=TaskHandle(handle),
+                                     progress=int(progress) if progress.is_integer() else progress,
+                                     pid=pid,
+                                     timestamp=timestamp)
+
+    if tag == PAYLOAD_TAG:
+        return load_payload(serialized)
+
+    return dill.loads(serialized)
+
+
+def format_message(text, args=None, kwargs=None):
+    """
+    Formats the text of a message with its arguments using the '%' operator, as the standard logging module does, if
+    there are any. A single mapping argument, or keyword arguments, are used for named conversions such as '%(rows)s'.
+    :param text:    The text of the message, or its format string if there are arguments.
+    :param args:    [Optional] The positional arguments.
+    :param kwargs:  [Optional] The keyword arguments.
+    :return:        The formatted text. If formatting fails, such as when some arguments are not converted, the format
+                    string followed by the arguments and the error.
+    """
+    if not args and not kwargs:
+        return text
+
+    try:
+        if kwargs:
+            if args:
+                raise TypeError('cannot mix positional and keyword arguments')
+            return text % kwargs
+
+        if len(args) == 1 and isinstance(args[0], Mapping) and args[0]:
+            return text % args[0]
+
+        return text % tuple(args)
+    except Exception as e:
+        return '{} (cannot format {!r} {!r}: {!r})'.format(text, args or (), kwargs or {}, e)
+
+
+def command_lane(command):
+    """
+    Chooses the priority lane through which a command is sent.
+    :param command: The command object.
+    :return:        CONTROL_LANE, ERROR_LANE, MESSAGE_LANE or PROGRESS_LANE.
+    """
+    # Tasks are defined in the same lane as their updates, so that they are never updated before being defined
+    if isinstance(command, (UpdateProgressCommand, UpdateProgressBatchCommand, NewTaskCommand, NewTaskBatchCommand)):
+        return PROGRESS_LANE
+
+    if isinstance(command, (StacktraceCommand, StacktraceReferenceCommand)):
+        return ERROR_LANE
+
+    if isinstance(command, LogMessageCommand):
+        return ERROR_LANE if command.level >= logging.ERROR else MESSAGE_LANE
+
+    # Commands of a remote node are received in order with each other, but not with those of local processes
+    if isinstance(command, (LogBatchCommand, MetricsCommand, RemoteCommand)):
+        return MESSAGE_LANE
+
+    return CONTROL_LANE
+
+
+def is_barrier(command):
+    """
+    Tells whether a command is sent through every priority lane and applied once it came out of all of them, so that
+    everything sent before it through any lane has been applied.
+    :param command: The command object.
+    :return:        True for exit commands, flush barriers and configuration commands given a barrier identifier.
+    """
+    return isinstance(command, ExitCommand) or getattr(command, 'barrier', None) is not None
+
 
 class ProcessCommand(object):
     """
@@ -19,9 +139,16 @@ class FlushCommand(ProcessCommand):
     application or doing some kind of synchronized operations.
     """
 
-    def __init__(self):
+    def __init__(self,
+                 barrier=None):
+        """
+        Asks for a redraw, and optionally for an acknowledgement once it is done.
+        :param barrier: [Optional] Identifier of the flush barrier to acknowledge once every file handler and sink has
+                        been flushed and a frame has been rendered. If None, nothing is acknowledged.
+        """
         super(FlushCommand, self).__init__()
-        pass
+
+        self.barrier = barrier
 
 
 class ExitCommand(ProcessCommand):
@@ -42,16 +169,20 @@ class SetLevelCommand(ProcessCommand):
 
     def __init__(self,
                  level,
-                 console_only=False):
+                 console_only=False,
+                 barrier=None):
         """
         Defines the logging level (from standard logging module) for log messages.
         :param level:           Level of logging for the file logger.
         :param console_only:    [Optional] If True then the file logger will not be affected.
+        :param barrier:         [Optional] Used only with priority lanes. Identifier taken from the flush barrier
+                                counter, so that the level is applied once everything sent before it has been.
         """
         super(SetLevelCommand, self).__init__()
 
         self.level = level
         self.console_only = console_only
+        self.barrier = barrier
 
 
 class NewTaskCommand(ProcessCommand):
@@ -61,16 +192,60 @@ class NewTaskCommand(ProcessCommand):
 
     def __init__(self,
                  task_id,
-                 task):
+                 task,
+                 handle=None):
         """
         Defines a new progress bar with the given information using a TaskProgress object.
         :param task_id: Unique identifier for this progress bar. Will erase if already existing.
         :param task:    TaskProgress object holding the progress bar information.
+        :param handle:  [Optional] The TaskHandle that later updates may carry instead of the task id.
         """
         super(NewTaskCommand, self).__init__()
 
         self.task_id = task_id
         self.task = task
+        self.handle = handle
+
+
+class NewTaskBatchCommand(ProcessCommand):
+    """
+    Calls to define many progress bars at once.
+    """
+
+    def __init__(self,
+                 task_ids,
+                 totals,
+                 prefixes,
+                 suffixes,
+                 decimals,
+                 bar_lengths,
+                 keep_alive,
+                 display_time,
+                 handles=None):
+        """
+        Defines new progress bars, one per item of the given lists, which must all have the same length. Plain values
+        are sent instead of TaskProgress objects so that the command stays compact.
+        :param task_ids:        Unique identifiers of the progress bars. Will erase if already existing.
+        :param totals:          The total number of iterations of each progress bar, or None if indeterminate.
+        :param prefixes:        The text displayed at the left side of each progress bar.
+        :param suffixes:        The text displayed at the right side of each progress bar.
+        :param decimals:        The number of decimals to display for each percentage.
+        :param bar_lengths:     The graphical size of each bar, in characters.
+        :param keep_alive:      Whether each progress bar stays displayed once completed.
+        :param display_time:    Whether the duration since each progress has begun is displayed.
+        :param handles:         [Optional] The TaskHandle of each progress bar.
+        """
+        super(NewTaskBatchCommand, self).__init__()
+
+        self.task_ids = task_ids
+        self.totals = totals
+        self.prefixes = prefixes
+        self.suffixes = suffixes
+        self.decimals = decimals
+        self.bar_lengths = bar_lengths
+        self.keep_alive = keep_alive
+        self.display_time = display_time
+        self.handles = handles
 
 
 class UpdateProgressCommand(ProcessCommand):
@@ -80,7 +255,10 @@ class UpdateProgressCommand(ProcessCommand):
 
     def __init__(self,
                  task_id,
-                 progress):
+                 progress,
+                 pid=None,
+                 timestamp=None,
+                 total=None):
         """
         Defines the current progress for this progress bar id in iteration units (not percent).
         If the given id does not exist or the given progress is identical to the current, then does nothing.
@@ -88,13 +266,49 @@ class UpdateProgressCommand(ProcessCommand):
         at the very time they are being logged but their timestamp will be captured at the right time. Logger will
         redraw at a given time period AND when new messages or progress are logged. If you still want to force redraw
         immediately (may produce flickering) then call 'flush' method.
-        :param task_id:     Unique identifier for this progress bar. Will erase if already existing.
+        :param task_id:     Unique identifier for this progress bar, or its TaskHandle.
         :param progress:    Current progress in iteration units regarding its total (not percent).
+        :param pid:         [Optional] The pid of the process that sent the update.
+        :param timestamp:   [Optional] The time of the update in seconds since the epoch.
+        :param total:       [Optional] New total number of iterations, such as the final count of an indeterminate bar.
+                            If None, the total is kept.
         """
         super(UpdateProgressCommand, self).__init__()
 
         self.task_id = task_id
         self.progress = progress
+        self.pid = pid
+        self.timestamp = timestamp
+        self.total = total
+
+
+class UpdateProgressBatchCommand(ProcessCommand):
+    """
+    Posts progress updates for many progress bars at once.
+    """
+
+    def __init__(self,
+                 task_ids,
+                 progresses,
+                 pid=None,
+                 timestamp=None,
+                 totals=None):
+        """
+        Defines the current progress of several progress bars, one per item of the given lists.
+        :param task_ids:    Unique identifiers of the progress bars, or their TaskHandle. Unknown ones are ignored.
+        :param progresses:  Current progress of each progress bar in iteration units (not percent).
+        :param pid:         [Optional] The pid of the process that sent the updates.
+        :param timestamp:   [Optional] The time of the updates in seconds since the epoch.
+        :param totals:      [Optional] New total number of iterations of each progress bar, None keeping the total.
+                            If None, all totals are kept.
+        """
+        super(UpdateProgressBatchCommand, self).__init__()
+
+        self.task_ids = task_ids
+        self.progresses = progresses
+        self.pid = pid
+        self.timestamp = timestamp
+        self.totals = totals
 
 
 class LogMessageCommand(ProcessCommand):
@@ -104,20 +318,65 @@ class LogMessageCommand(ProcessCommand):
 
     def __init__(self,
                  text,
-                 level):
+                 level,
+                 pid=None,
+                 timestamp=None,
+                 repeat=1,
+                 console_weight=1.,
+                 file_weight=1.,
+                 sequence=None,
+                 args=None,
+                 kwargs=None):
         """
         Posts a message adding a timestamp and logging level to it for both file and console handlers.
         Logger uses a redraw rate because of console flickering. That means it will not draw new messages or progress
         at the very time they are being logged but their timestamp will be captured at the right time. Logger will
         redraw at a given time period AND when new messages or progress are logged. If you still want to force redraw
         immediately (may produce flickering) then call 'flush' method.
-        :param text:    The text to log into file and console.
-        :param level:   Level of logging for this message.
+        :param text:        The text to log into file and console.
+        :param level:       Level of logging for this message.
+        :param pid:         [Optional] The pid of the process that posted the message.
+        :param timestamp:   [Optional] The time of the message in seconds since the epoch.
+        :param repeat:      [Optional] The number of identical consecutive messages this command stands for. The
+                            timestamp is then the time of the last one.
+        :param console_weight: [Optional] The number of messages this one stands for on the console after sampling, or
+                            0 if it must not be displayed.
+        :param file_weight: [Optional] The number of messages this one stands for in the file handlers and sinks after
+                            sampling, or 0 if it must not be written.
+        :param sequence:    [Optional] The number of the message among those sent by its process, so that they can be
+                            written in the order they were made.
+        :param args:        [Optional] Positional arguments of the text, which is then a format string formatted by the
+                            logger process with 'format_message', only if the message is displayed or written.
+        :param kwargs:      [Optional] Keyword arguments of the text, same as above.
         """
         super(LogMessageCommand, self).__init__()
 
         self.text = text
         self.level = level
+        self.pid = pid
+        self.timestamp = timestamp
+        self.repeat = repeat
+        self.console_weight = console_weight
+        self.file_weight = file_weight
+        self.sequence = sequence
+        self.args = args
+        self.kwargs = kwargs
+
+
+class LogBatchCommand(ProcessCommand):
+    """
+    Posts several messages at once.
+    """
+
+    def __init__(self,
+                 commands):
+        """
+        Posts a batch of messages, such as the records forwarded by a BridgeHandler.
+        :param commands: List of LogMessageCommand objects, in the order they were logged.
+        """
+        super(LogBatchCommand, self).__init__()
+
+        self.commands = commands
 
 
 class SetConfigurationCommand(ProcessCommand):
@@ -134,7 +393,9 @@ class SetConfigurationCommand(ProcessCommand):
                  task_millis_to_removal,
                  console_format_strftime,
                  console_format,
-                 file_handlers):
+                 file_handlers,
+                 sinks=None,
+                 barrier=None):
         """
         Defines the current configuration of the logger.
         :param message_number:              Number of simultaneously displayed messages below progress bars.
@@ -162,6 +423,11 @@ class SetConfigurationCommand(ProcessCommand):
                                             uses regular python logging rules. All handlers are permitted except
                                             StreamHandler if used with stdout or stderr which are reserved by this
                                             library for custom console output.
+        :param sinks:                       [Optional] Specify the sinks fed directly from command fields, such as
+                                            JsonLinesSink. If None, the current sinks are kept.
+        :param barrier:                     [Optional] Used only with priority lanes. Identifier taken from the flush
+                                            barrier counter, so that the configuration is applied once everything sent
+                                            before it has been.
         """
         super(SetConfigurationCommand, self).__init__()
 
@@ -174,6 +440,8 @@ class SetConfigurationCommand(ProcessCommand):
         self.console_format_strftime = console_format_strftime
         self.console_format = console_format
         self.file_handlers = file_handlers
+        self.sinks = sinks
+        self.barrier = barrier
 
 
 class StacktraceCommand(ProcessCommand):
@@ -184,15 +452,155 @@ class StacktraceCommand(ProcessCommand):
     def __init__(self,
                  pid,
                  stacktrace,
-                 process_title):
+                 process_title,
+                 timestamp=None,
+                 digest=None):
         """
         Sends an exception's stacktrace to the logger.
         :param pid:             The current process's pid.
         :param stacktrace:      Stacktrace string as returned by 'traceback.format_exc()' in an 'except' block.
         :param process_title:   Define the current process title to display into the logger for this exception..
+        :param timestamp:       [Optional] The time of the exception in seconds since the epoch.
+        :param digest:          [Optional] The digest of the normalized stacktrace, under which later occurrences will
+                                be sent as StacktraceReferenceCommand. If None, the logger process computes it.
         """
         super(StacktraceCommand, self).__init__()
 
         self.pid = pid
         self.stacktrace = stacktrace
         self.process_title = process_title
+        self.timestamp = timestamp
+        self.digest = digest
+
+
+class StacktraceReferenceCommand(ProcessCommand):
+    """
+    Posts one more occurrence of a stacktrace whose full text has already been sent to the logger.
+    """
+
+    def __init__(self,
+                 pid,
+                 digest,
+                 process_title,
+                 timestamp=None):
+        """
+        Sends a reference to an already sent stacktrace.
+        :param pid:             The current process's pid.
+        :param digest:          The digest of the normalized stacktrace.
+        :param process_title:   Define the current process title to display into the logger for this exception.
+        :param timestamp:       [Optional] The time of the exception in seconds since the epoch.
+        """
+        super(StacktraceReferenceCommand, self).__init__()
+
+        self.pid = pid
+        self.digest = digest
+        self.process_title = process_title
+        self.timestamp = timestamp
+
+
+class MetricsCommand(ProcessCommand):
+    """
+    Posts the metrics aggregated by a process since its previous MetricsCommand.
+    """
+
+    def __init__(self,
+                 pid,
+                 spans,
+                 counters=None,
+                 gauges=None,
+                 timestamp=None,
+                 exited=False):
+        """
+        Sends a batch of aggregated metrics.
+        :param pid:         The current process's pid.
+        :param spans:       Dictionary of span durations identified by span name, each one being a tuple of histograms
+                            (wall durations, CPU durations).
+        :param counters:    [Optional] Dictionary of the amounts added to each counter since the previous batch,
+                            identified by counter name.
+        :param gauges:      [Optional] Dictionary of the last value of each gauge set since the previous batch,
+                            identified by gauge name.
+        :param timestamp:   [Optional] The time the batch was sent, in seconds since the epoch.
+        :param exited:      [Optional] True if the process is exiting, so that the values of its gauges are dropped.
+        """
+        super(MetricsCommand, self).__init__()
+
+        self.pid = pid
+        self.spans = spans
+        self.counters = counters or {}
+        self.gauges = gauges or {}
+        self.timestamp = timestamp
+        self.exited = exited
+
+
+class RemoteCommand(ProcessCommand):
+    """
+    Wraps a command received by the collector from a remote node.
+    """
+
+    def __init__(self,
+                 node,
+                 command):
+        """
+        Wraps a serialized command sent by a remote FancyLogger instance so the logger process can namespace it.
+        :param node:    The name of the remote node that sent the command.
+        :param command: The serialized command as it was put into the remote node's queue.
+        """
+        super(RemoteCommand, self).__init__()
+
+        self.node = node
+        self.command = command
+
+
+class NodeConnectionCommand(ProcessCommand):
+    """
+    Calls to count a connection of a remote node that opened or closed, so that the tasks of a node are dropped once it
+    has been gone for a while.
+    """
+
+    def __init__(self,
+                 node,
+                 connected):
+        """
+        Announces that a connection of a remote node opened or closed.
+        :param node:        The name of the remote node.
+        :param connected:   True when the connection sent its first batch, False when it closed.
+        """
+        super(NodeConnectionCommand, self).__init__()
+
+        self.node = node
+        self.connected = connected
+
+
+class RegisterRingCommand(ProcessCommand):
+    """
+    Calls to poll a new shared memory ring buffer.
+    """
+
+    def __init__(self,
+                 pid,
+                 name):
+        """
+        Announces the ring buffer through which a process will send its next commands.
+        :param pid:     The producer process's pid.
+        :param name:    The shared memory block name of the ring buffer.
+        """
+        super(RegisterRingCommand, self).__init__()
+
+        self.pid = pid
+        self.name = name
+
+
+class UnregisterRingCommand(ProcessCommand):
+    """
+    Calls to stop polling the shared memory ring buffer of a process once everything written to it has been read.
+    """
+
+    def __init__(self,
+                 pid):
+        """
+        Announces that a process will not write to its ring buffer anymore.
+        :param pid: The producer process's pid.
+        """
+        super(UnregisterRingCommand, self).__init__()
+
+        self.pid = pid
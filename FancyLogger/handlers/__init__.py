@@ -0,0 +1,496 @@
+#!/bin/env/python
+# coding: utf-8
+
+import glob
+import gzip
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import WatchedFileHandler
+from multiprocessing.util import Finalize
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from ..commands import LogBatchCommand, LogMessageCommand
+
+
+class CompressedRotatingFileHandler(logging.Handler):
+    """
+    File handler that compresses records as it writes them, from a background thread. Records are compressed in
+    complete gzip members or zstd frames, one per flush interval, so a crash loses at most one interval of records and
+    files can be read with the usual tools while being written. Files are rotated by size or by time, and the oldest
+    ones are deleted once all files together exceed a total size.
+    """
+
+    def __init__(self,
+                 filename,
+                 compression='gzip',
+                 compression_level=6,
+                 max_bytes=52428800,
+                 rotate_seconds=None,
+                 max_total_bytes=1073741824,
+                 flush_interval_seconds=5.,
+                 encoding='utf8'):
+        """
+        Defines a new compressed log file. The file itself is opened by the background thread on the first record.
+        :param filename:                The base path of the log files. Each file is named after it, followed by its
+                                        creation time and by the compression extension.
+        :param compression:             [Optional] Either 'gzip' or 'zstd'. The latter requires the zstandard package.
+        :param compression_level:       [Optional] The compression level, whose meaning depends on the compression.
+        :param max_bytes:               [Optional] The compressed size in bytes at which a new file is started. Ignored
+                                        if None or 0. Defaults to 50 MB.
+        :param rotate_seconds:          [Optional] The age in seconds at which a new file is started. Ignored if None.
+        :param max_total_bytes:         [Optional] The compressed size in bytes of all files together beyond which the
+                                        oldest ones are deleted. Ignored if None or 0. Defaults to 1 GB.
+        :param flush_interval_seconds:  [Optional] Maximum time lapse in seconds between two compressed frames written
+                                        to disk.
+        :param encoding:                [Optional] The encoding of the formatted records.
+        """
+        super(CompressedRotatingFileHandler, self).__init__()
+
+        if compression == 'zstd' and not zstandard:
+            raise ValueError('zstd compression requires the zstandard package')
+        elif compression not in ('gzip', 'zstd'):
+            raise ValueError('compression must be either \'gzip\' or \'zstd\'')
+
+        self.base_filename = os.path.abspath(filename)
+        self.compression = compression
+        self.compression_level = compression_level
+        self.extension = 'gz' if compression == 'gzip' else 'zst'
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.max_total_bytes = max_total_bytes
+        self.flush_interval_seconds = flush_interval_seconds
+        self.encoding = encoding
+
+        self.records = None
+        self.thread = None
+        self.stream = None
+        self.stream_filename = None
+        self.stream_opened_at = None
+        self.stream_size = 0
+
+    def __getstate__(self):
+        # The handler is serialized to reach the logger process, where the thread is started again when needed
+        state = self.__dict__.copy()
+        state['lock'] = None
+        state['records'] = None
+        state['thread'] = None
+        state['stream'] = None
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.createLock()
+
+    def emit(self, record):
+        """
+        Formats the record and hands it to the background thread.
+        :param record: The logging record.
+        """
+        try:
+            line = (self.format(record) + '\n').encode(self.encoding)
+        except Exception:
+            self.handleError(record)
+            return
+
+        if not self.thread:
+            self.records = queue.SimpleQueue()
+            self.thread = threading.Thread(target=self.write_records, daemon=True)
+            self.thread.start()
+
+        self.records.put(line)
+
+    def compress(self, data):
+        """
+        Compresses data into one complete frame, readable on its own.
+        :param data:    The bytes to compress.
+        :return:        The gzip member or zstd frame.
+        """
+        if self.compression == 'gzip':
+            return gzip.compress(data, compresslevel=self.compression_level)
+
+        return zstandard.ZstdCompressor(level=self.compression_level).compress(data)
+
+    def open_file(self):
+        """
+        Starts a new file named after the current time, then deletes the oldest files beyond the total size limit.
+        """
+        if self.stream:
+            self.stream.close()
+
+        name = '{}.{}'.format(self.base_filename, time.strftime('%Y-%m-%d_%H-%M-%S'))
+        filename = '{}.{}'.format(name, self.extension)
+        index = 1
+        while os.path.exists(filename):
+            filename = '{}.{}.{}'.format(name, index, self.extension)
+            index += 1
+
+        self.stream = open(filename, 'ab')
+        self.stream_filename = filename
+        self.stream_opened_at = time.time()
+        self.stream_size = 0
+
+        self.delete_old_files()
+
+    def delete_old_files(self):
+        """
+        Deletes the oldest files, except the current one, while all files together exceed the total size limit.
+        """
+        if not self.max_total_bytes:
+            return
+
+        files = sorted(glob.glob('{}.*.{}'.format(glob.escape(self.base_filename), self.extension)),
+                       key=os.path.getmtime)
+        sizes = [os.path.getsize(f) for f in files]
+        total = sum(sizes)
+
+        for filename, size in zip(files, sizes):
+            if total <= self.max_total_bytes:
+                break
+            if filename == self.stream_filename:
+                continue
+
+            try:
+                os.remove(filename)
+            except OSError:
+                continue
+            total -= size
+
+    def write_frame(self, data):
+        """
+        Compresses buffered records into one frame and appends it to the current file, rotating it beforehand if needed.
+        :param data: The buffered records.
+        """
+        if not self.stream \
+                or (self.max_bytes and self.stream_size >= self.max_bytes) \
+                or (self.rotate_seconds and time.time() - self.stream_opened_at >= self.rotate_seconds):
+            self.open_file()
+
+        frame = self.compress(bytes(data))
+        self.stream.write(frame)
+        self.stream.flush()
+        self.stream_size += len(frame)
+
+        if self.max_total_bytes:
+            self.delete_old_files()
+
+    def write_records(self):
+        """
+        The background thread loop. Buffers records and writes one compressed frame per flush interval, or earlier if a
+        flush is requested. Returns when the handler is closed.
+        """
+        data = bytearray()
+        deadline = time.time() + self.flush_interval_seconds
+
+        while True:
+            try:
+                line = self.records.get(timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                line = b''
+
+            if line is None or isinstance(line, threading.Event) or time.time() >= deadline:
+                if data:
+                    try:
+                        self.write_frame(data)
+                    except OSError:
+                        pass
+                    data = bytearray()
+                deadline = time.time() + self.flush_interval_seconds
+
+            if line is None:
+                if self.stream:
+                    self.stream.close()
+                    self.stream = None
+                return
+            elif isinstance(line, threading.Event):
+                line.set()
+            else:
+                data += line
+
+    def flush(self):
+        """
+        Waits for the background thread to write a compressed frame with all records emitted so far.
+        """
+        if self.thread and self.thread.is_alive():
+            written = threading.Event()
+            self.records.put(written)
+            written.wait(timeout=max(self.flush_interval_seconds, 1.))
+
+    def close(self):
+        """
+        Writes the remaining records and stops the background thread.
+        """
+        if self.thread and self.thread.is_alive():
+            self.records.put(None)
+            self.thread.join()
+        self.thread = None
+
+        super(CompressedRotatingFileHandler, self).close()
+
+
+class BridgeHandler(logging.Handler):
+    """
+    Forwards the records of the standard logging module, such as those of third-party libraries, to the logger process
+    as regular messages prefixed by the logger name, along with the pid and time of the record. Records below the level
+    are dropped before any formatting, and the others are sent in batches. Warnings and above are sent at once. Each
+    process sends its batches from one background thread, and sends its last batch when it exits.
+    """
+
+    def __init__(self,
+                 logger,
+                 level=logging.NOTSET,
+                 batch_size=100,
+                 batch_millis=100):
+        """
+        Defines a new bridge to a FancyLogger instance.
+        :param logger:          The FancyLogger instance to send the records to.
+        :param level:           [Optional] The minimum level (from standard logging module) of forwarded records.
+        :param batch_size:      [Optional] The maximum number of records sent in one batch.
+        :param batch_millis:    [Optional] Maximum time lapse in milliseconds a record waits for its batch to be sent.
+        """
+        super(BridgeHandler, self).__init__(level=level)
+
+        self.logger = logger
+        self.batch_size = batch_size
+        self.batch_interval = batch_millis / 1000.
+
+        self.batch = []
+        # The pid of the process that filled 'batch', so forked processes do not send the records of their parent
+        self.batch_pid = None
+        # The time at which the background thread sends the batch, or None if the batch is empty
+        self.deadline = None
+        self.pending = None
+        self.thread = None
+        self.stopped = False
+
+    def __getstate__(self):
+        # Pending records and the background thread belong to the process that serializes the handler
+        state = self.__dict__.copy()
+        state['lock'] = None
+        state['batch'] = []
+        state['batch_pid'] = None
+        state['deadline'] = None
+        state['pending'] = None
+        state['thread'] = None
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.createLock()
+
+    def handle(self, record):
+        # Records can reach a handler without going through its logger's level check
+        if record.levelno < self.level:
+            return False
+
+        return super(BridgeHandler, self).handle(record)
+
+    def emit(self, record):
+        """
+        Turns the record into a message and adds it to the batch. Called with the handler lock held.
+        :param record: The logging record.
+        """
+        try:
+            text = record.getMessage()
+            if record.exc_info:
+                text = '{}\n{}'.format(text, logging.Formatter().formatException(record.exc_info))
+        except Exception:
+            self.handleError(record)
+            return
+
+        # Custom levels are displayed as the closest standard level below them
+        level = logging.DEBUG
+        for standard_level in (logging.INFO, logging.WARNING, logging.ERROR, logging.CRITICAL):
+            if record.levelno >= standard_level:
+                level = standard_level
+
+        if self.batch_pid != os.getpid():
+            self.start_process()
+
+        self.batch.append(LogMessageCommand(text='[{}] {}'.format(record.name, text),
+                                            level=level,
+                                            pid=record.process,
+                                            timestamp=record.created,
+                                            sequence=self.logger.next_sequence()))
+
+        if len(self.batch) >= self.batch_size or level >= logging.WARNING:
+            self.send_batch()
+        elif self.deadline is None:
+            # Sends the batch even if no other record comes
+            self.deadline = time.time() + self.batch_interval
+            self.pending.notify()
+
+    def start_process(self):
+        """
+        Drops the records inherited from the parent process, then starts the background thread of the current process
+        and makes it send its last batch when it exits. Must be called with the handler lock held.
+        """
+        self.batch_pid = os.getpid()
+        self.batch = []
+        self.deadline = None
+
+        self.pending = threading.Condition(self.lock)
+        self.thread = threading.Thread(target=self.send_batches, daemon=True)
+        self.thread.start()
+
+        # Runs before the ring buffer of the process is closed
+        Finalize(None, self.flush, exitpriority=101)
+
+    def send_batches(self):
+        """
+        The background thread loop. Sends the batch once its first record has waited for the batch interval. Returns
+        when the handler is closed.
+        """
+        with self.lock:
+            while not self.stopped:
+                if self.deadline is None:
+                    self.pending.wait()
+                elif self.deadline > time.time():
+                    self.pending.wait(self.deadline - time.time())
+                else:
+                    self.send_batch()
+
+    def send_batch(self):
+        """
+        Sends the pending records of the current process, if any. Must be called with the handler lock held.
+        """
+        if self.batch and self.batch_pid == os.getpid():
+            self.logger.send_command(LogBatchCommand(commands=self.batch))
+        self.batch = []
+        self.deadline = None
+
+    def flush(self):
+        """
+        Sends the pending records at once.
+        """
+        with self.lock:
+            self.send_batch()
+
+    def close(self):
+        """
+        Sends the pending records and stops the background thread.
+        """
+        with self.lock:
+            self.send_batch()
+            self.stopped = True
+            if self.pending and self.batch_pid == os.getpid():
+                self.pending.notify()
+
+        super(BridgeHandler, self).close()
+
+
+class DirectFileWriter(object):
+    """
+    Writes the messages of file-only levels, those kept by the file output but not displayed by the console, to a log
+    file straight from the process that logs them instead of sending them to the logger process. Each process opens the
+    file with O_APPEND and writes each record with a single call, so that records of concurrent processes never
+    interleave. The logger process writes the other messages to the same file through the handler given by 'handler'.
+    Both reopen the file when it has been moved away, such as by logrotate.
+    """
+
+    def __init__(self,
+                 filename,
+                 levels,
+                 formatter,
+                 check_interval_millis=1000):
+        """
+        Defines the file.
+        :param filename:                Path of the log file.
+        :param levels:                  Shared array whose first two items are the logging levels (from standard
+                                        logging module) of console output and of file output, kept up to date by the
+                                        FancyLogger instance.
+        :param formatter:               The logging.Formatter of the records, used by all processes.
+        :param check_interval_millis:   [Optional] Minimum time lapse in milliseconds between two checks of a process
+                                        that the file has not been moved away.
+        """
+        super(DirectFileWriter, self).__init__()
+
+        self.filename = os.path.abspath(filename)
+        self.formatter = formatter
+        self.check_interval = check_interval_millis / 1000.
+        self.levels = levels
+
+        self.fd = None
+        # The pid of the process that opened 'fd', so forked processes open the file again
+        self.pid = None
+        self.device_inode = None
+        self.last_check = 0
+
+    def __getstate__(self):
+        # The file descriptor belongs to the process that serializes the writer
+        state = self.__dict__.copy()
+        state['fd'] = None
+        state['pid'] = None
+
+        return state
+
+    def handler(self):
+        """
+        Creates the handler with which the logger process writes the other messages to the file.
+        :return: The WatchedFileHandler object.
+        """
+        handler = WatchedFileHandler(filename=self.filename, mode='a', encoding='utf8', delay=True)
+        handler.setFormatter(fmt=self.formatter)
+
+        return handler
+
+    def accepts(self, level):
+        """
+        Tells whether a message is written directly, that is if its level is kept by the file output only.
+        :param level:   The message level (from standard logging module).
+        :return:        True if the message must be given to 'write' instead of being sent to the logger process.
+        """
+        return self.levels[1] <= level < self.levels[0]
+
+    def open(self):
+        """
+        Opens the file for the current process, closing the previous descriptor of this process if any.
+        """
+        if self.fd is not None and self.pid == os.getpid():
+            os.close(self.fd)
+
+        self.fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.pid = os.getpid()
+
+        stat = os.fstat(self.fd)
+        self.device_inode = (stat.st_dev, stat.st_ino)
+        self.last_check = time.time()
+
+    def write(self, text, level, timestamp, weight=1.):
+        """
+        Formats a message the same way as the logger process does and appends it to the file.
+        :param text:        The text of the message.
+        :param level:       The message level (from standard logging module).
+        :param timestamp:   The time of the message in seconds since the epoch.
+        :param weight:      [Optional] The number of messages it stands for, if sampled.
+        """
+        if self.pid != os.getpid():
+            self.open()
+        elif timestamp - self.last_check >= self.check_interval:
+            self.last_check = timestamp
+            try:
+                stat = os.stat(self.filename)
+                moved = (stat.st_dev, stat.st_ino) != self.device_inode
+            except FileNotFoundError:
+                moved = True
+            if moved:
+                self.open()
+
+        # Same indentation and sampling note as the messages written by the logger process
+        text = '{}{}{}'.format('\t\t' if level == logging.INFO else '\t',
+                               text,
+                               '' if weight == 1 else ' (sampled, weight {:g})'.format(weight))
+
+        record = logging.LogRecord(name='root', level=level, pathname='', lineno=0, msg=text, args=None, exc_info=None)
+        record.created = timestamp
+        record.msecs = (timestamp - int(timestamp)) * 1000
+
+        os.write(self.fd, (self.formatter.format(record) + '\n').encode('utf8'))
@@ -0,0 +1,88 @@
+#!/bin/env/python
+# coding: utf-8
+
+import os
+import time
+import traceback
+
+
+def map_chunk(func, chunk_index, items):
+    """
+    Applies a function to a chunk of items in a pool worker. Exceptions are caught item by item so that one failure
+    does not lose the results of the rest of the chunk.
+    :param func:        The function to apply, which must be picklable.
+    :param chunk_index: The position of the chunk in the input.
+    :param items:       The list of items of the chunk.
+    :return:            Tuple (chunk index, worker pid, duration in seconds, outcomes), where each outcome is a tuple
+                        (True, result) or (False, stacktrace string).
+    """
+    start = time.time()
+    outcomes = []
+
+    for item in items:
+        try:
+            outcomes.append((True, func(item)))
+        except Exception:
+            outcomes.append((False, traceback.format_exc()))
+
+    return chunk_index, os.getpid(), time.time() - start, outcomes
+
+
+class MapFailure(object):
+    """
+    Yielded by 'progress_map' in place of the result of an item for which the function raised an exception, so that
+    results stay aligned with the items.
+    """
+
+    def __init__(self, stacktrace):
+        """
+        Holds the stacktrace of a failed item.
+        :param stacktrace: Stacktrace string as returned by 'traceback.format_exc()'.
+        """
+        super(MapFailure, self).__init__()
+
+        self.stacktrace = stacktrace
+
+    def __repr__(self):
+        return 'MapFailure({})'.format(self.stacktrace.rstrip().rsplit('\n', 1)[-1])
+
+
+class ChunkSizer(object):
+    """
+    Sizes chunks so that each one keeps a worker busy for about the same time: long enough to make the inter-process
+    overhead negligible, short enough to keep workers balanced and progress smooth.
+    """
+
+    def __init__(self, target_millis=100, max_size=10000):
+        """
+        Starts with chunks of one item until a duration has been measured.
+        :param target_millis:   [Optional] The time in milliseconds a chunk should take to process.
+        :param max_size:        [Optional] The maximum number of items of a chunk.
+        """
+        super(ChunkSizer, self).__init__()
+
+        self.target = target_millis / 1000.
+        self.max_size = max_size
+        self.item_duration = None
+        self.size = 1
+
+    def measure(self, items, duration):
+        """
+        Updates the mean item duration with a processed chunk and resizes the next chunks.
+        :param items:       The number of items of the chunk.
+        :param duration:    The time in seconds the chunk took to process.
+        """
+        if not items:
+            return
+
+        item_duration = duration / items
+        if self.item_duration is None:
+            self.item_duration = item_duration
+        else:
+            # Exponential moving average, so the size follows changes in the workload without jumping around
+            self.item_duration = 0.8 * self.item_duration + 0.2 * item_duration
+
+        if self.item_duration <= 0:
+            self.size = self.max_size
+        else:
+            self.size = int(min(max(self.target / self.item_duration, 1), self.max_size))
@@ -0,0 +1,374 @@
+#!/bin/env/python
+# coding: utf-8
+
+import functools
+import math
+import os
+import re
+import tempfile
+import time
+
+from ..commands import MetricsCommand
+
+HISTOGRAM_BASE = 1.1
+"Ratio between the bounds of two consecutive histogram buckets, so values are known within 5% whatever their scale."
+HISTOGRAM_RESOLUTION = 0.000001
+"Values below one microsecond all fall in the first bucket."
+EXPORTED_QUANTILES = (0.5, 0.95, 0.99)
+"Quantiles of each span written to the Prometheus textfile."
+
+
+def format_duration(seconds):
+    """
+    Formats a duration with a unit suited to its scale.
+    :param seconds: The duration in seconds.
+    :return:        Duration string such as '850 µs', '12.3 ms' or '1.20 s'.
+    """
+    if seconds is None:
+        return '-'
+    elif seconds < 0.001:
+        return '{:.0f} µs'.format(seconds * 1000000)
+    elif seconds < 1:
+        return '{:.1f} ms'.format(seconds * 1000)
+
+    return '{:.2f} s'.format(seconds)
+
+
+def format_value(value):
+    """
+    Formats a counter or gauge value, without decimals when it is a whole number.
+    :param value:   The value.
+    :return:        Value string such as '1200' or '0.125'.
+    """
+    if value == int(value):
+        return str(int(value))
+
+    return '{:.6g}'.format(value)
+
+
+def metric_name(name):
+    """
+    Turns a metric name into a valid Prometheus metric name.
+    :param name:    The name given by the application, such as 'rows written'.
+    :return:        The name with invalid characters replaced by underscores, such as 'rows_written'.
+    """
+    name = re.sub('[^a-zA-Z0-9_:]', '_', name)
+
+    return '_' + name if name[:1].isdigit() else name
+
+
+def prometheus_text(counters, gauges, spans):
+    """
+    Renders metrics in the Prometheus text exposition format.
+    :param counters:    Dictionary of counter totals identified by name.
+    :param gauges:      Dictionary of gauges identified by name, each one being a dictionary of values identified by
+                        the pid of the process that set them.
+    :param spans:       Dictionary of spans identified by name, as tuples of histograms (wall durations, CPU durations).
+    :return:            The text to write into a textfile collector file.
+    """
+    lines = []
+
+    for name, value in counters.items():
+        name = metric_name(name)
+        lines.append('# TYPE {} counter'.format(name))
+        lines.append('{} {}'.format(name, format_value(value)))
+
+    for name, values in gauges.items():
+        name = metric_name(name)
+        lines.append('# TYPE {} gauge'.format(name))
+        for pid, value in values.items():
+            lines.append('{}{{pid="{}"}} {}'.format(name, pid, format_value(value)))
+
+    for name, (wall, cpu) in spans.items():
+        name = '{}_seconds'.format(metric_name(name))
+        lines.append('# TYPE {} summary'.format(name))
+        for quantile in EXPORTED_QUANTILES:
+            lines.append('{}{{quantile="{}"}} {:.9f}'.format(name, quantile, wall.percentile(quantile * 100)))
+        lines.append('{}_sum {:.9f}'.format(name, wall.sum))
+        lines.append('{}_count {}'.format(name, wall.count))
+
+    return '\n'.join(lines) + '\n'
+
+
+def write_textfile(filename, text):
+    """
+    Replaces the content of a file atomically, so that a collector reading it never sees a partial file.
+    :param filename:    Path of the file, whose name should end with '.prom' for the node exporter textfile collector.
+    :param text:        The new content of the file.
+    """
+    # The temporary file must be on the same file system for the rename to be atomic
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'w', encoding='utf8') as stream:
+            stream.write(text)
+        os.replace(temporary, filename)
+    except Exception:
+        os.unlink(temporary)
+        raise
+
+
+class Histogram(object):
+    """
+    Compact histogram of positive values in logarithmic buckets. Histograms from several processes or intervals can be
+    merged exactly, and percentiles are estimated within the bucket precision.
+    """
+
+    def __init__(self):
+        super(Histogram, self).__init__()
+
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """
+        Records one value.
+        :param value: The value, such as a duration in seconds.
+        """
+        index = int(math.log(value / HISTOGRAM_RESOLUTION, HISTOGRAM_BASE)) if value > HISTOGRAM_RESOLUTION else 0
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+
+    def merge(self, other):
+        """
+        Adds all the values of another histogram to this one.
+        :param other: The Histogram to merge.
+        """
+        for index, bucket_count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + bucket_count
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentile(self, q):
+        """
+        Estimates a percentile.
+        :param q:   The percentile between 0 and 100.
+        :return:    The estimated value, or None if the histogram is empty.
+        """
+        if not self.count:
+            return None
+
+        rank = q / 100. * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                # Geometric middle of the bucket, within the observed range
+                value = HISTOGRAM_RESOLUTION * HISTOGRAM_BASE ** (index + 0.5)
+                return min(max(value, self.min), self.max)
+
+        return self.max
+
+    def items(self):
+        """
+        Lists the non-empty buckets.
+        :return: List of tuples (bucket upper bound, number of values), by increasing bound.
+        """
+        return [(HISTOGRAM_RESOLUTION * HISTOGRAM_BASE ** (index + 1), self.buckets[index])
+                for index in sorted(self.buckets)]
+
+
+class Span(object):
+    """
+    Measures the wall and CPU durations of a block of code, as a context manager, or of every call to a function, as
+    a decorator. Durations are recorded in the calling process and sent to the logger process in batches.
+    """
+
+    def __init__(self, logger, name):
+        """
+        Defines a span.
+        :param logger:  The FancyLogger instance to record durations with.
+        :param name:    The name under which durations are aggregated and displayed.
+        """
+        super(Span, self).__init__()
+
+        self.logger = logger
+        self.name = name
+        self.starts = []
+
+    def __enter__(self):
+        # A stack, so the same span can be nested
+        self.starts.append((time.perf_counter(), time.process_time()))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_start, cpu_start = self.starts.pop()
+        self.logger.record_span(name=self.name,
+                                wall=time.perf_counter() - wall_start,
+                                cpu=time.process_time() - cpu_start)
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.logger.record_span(name=self.name,
+                                        wall=time.perf_counter() - wall_start,
+                                        cpu=time.process_time() - cpu_start)
+
+        return wrapper
+
+
+class Counter(object):
+    """
+    Counts events of the calling process, such as rows written or retries. Increments are summed locally and only
+    their total since the last batch is sent to the logger process, which adds up the counts of all processes.
+    """
+
+    def __init__(self, logger, name):
+        """
+        Defines a counter.
+        :param logger:  The FancyLogger instance to record increments with.
+        :param name:    The name under which counts are added up and displayed.
+        """
+        super(Counter, self).__init__()
+
+        self.logger = logger
+        self.name = name
+
+    def inc(self, n=1):
+        """
+        Increments the counter.
+        :param n: [Optional] The amount to add, which cannot be negative.
+        """
+        if n < 0:
+            raise ValueError('counters can only increase')
+
+        self.logger.record_counter(name=self.name, delta=n)
+
+
+class Gauge(object):
+    """
+    Holds a value of the calling process that can go up and down, such as a queue size. Only the last value set
+    before each batch is sent to the logger process, which keeps one value per process and displays their sum.
+    """
+
+    def __init__(self, logger, name):
+        """
+        Defines a gauge.
+        :param logger:  The FancyLogger instance to record values with.
+        :param name:    The name under which values are displayed.
+        """
+        super(Gauge, self).__init__()
+
+        self.logger = logger
+        self.name = name
+
+    def set(self, value):
+        """
+        Sets the value of the gauge for the calling process.
+        :param value: The new value.
+        """
+        self.logger.record_gauge(name=self.name, value=value)
+
+    def inc(self, n=1):
+        """
+        Increases the value of the gauge for the calling process.
+        :param n: [Optional] The amount to add.
+        """
+        self.logger.record_gauge(name=self.name, value=n, relative=True)
+
+    def dec(self, n=1):
+        """
+        Decreases the value of the gauge for the calling process.
+        :param n: [Optional] The amount to subtract.
+        """
+        self.logger.record_gauge(name=self.name, value=-n, relative=True)
+
+
+class MetricsRecorder(object):
+    """
+    Aggregates the metrics of one process and turns them into a MetricsCommand once per interval.
+    """
+
+    def __init__(self, interval_millis=1000):
+        """
+        Starts an empty aggregation.
+        :param interval_millis: [Optional] Minimum time lapse in milliseconds between two MetricsCommand.
+        """
+        super(MetricsRecorder, self).__init__()
+
+        self.pid = os.getpid()
+        self.interval = interval_millis / 1000.
+        self.last_flush = time.time()
+        self.spans = {}
+        self.counters = {}
+        self.gauges = {}
+        # Current value of every gauge of the process, including those already sent
+        self.gauge_values = {}
+
+    def record_span(self, name, wall, cpu):
+        """
+        Records the durations of one span.
+        :param name:    The span name.
+        :param wall:    The wall-clock duration in seconds.
+        :param cpu:     The CPU duration of the process in seconds.
+        """
+        histograms = self.spans.get(name)
+        if histograms is None:
+            histograms = self.spans[name] = (Histogram(), Histogram())
+
+        histograms[0].add(wall)
+        histograms[1].add(cpu)
+
+    def record_counter(self, name, delta):
+        """
+        Adds an increment to a counter.
+        :param name:    The counter name.
+        :param delta:   The amount added.
+        """
+        self.counters[name] = self.counters.get(name, 0) + delta
+
+    def record_gauge(self, name, value, relative=False):
+        """
+        Sets the value of a gauge, replacing the one not sent yet.
+        :param name:        The gauge name.
+        :param value:       The new value.
+        :param relative:    [Optional] If True, 'value' is added to the current value of the gauge instead.
+        """
+        if relative:
+            value += self.gauge_values.get(name, 0)
+
+        self.gauge_values[name] = self.gauges[name] = value
+
+    def is_due(self):
+        """
+        Tells whether the interval has elapsed since the last command.
+        :return: True if the aggregated metrics should be sent.
+        """
+        return time.time() - self.last_flush >= self.interval
+
+    def take_command(self, exited=False):
+        """
+        Builds the command holding everything aggregated since the last one, and starts a new aggregation.
+        :param exited:  [Optional] True if the process is exiting. The command is then built if any gauge has ever been
+                        set, so that the logger process drops their values.
+        :return:        The MetricsCommand, or None if nothing has to be sent.
+        """
+        self.last_flush = time.time()
+
+        if not self.spans and not self.counters and not self.gauges and not (exited and self.gauge_values):
+            return None
+
+        command = MetricsCommand(pid=self.pid,
+                                 spans=self.spans,
+                                 counters=self.counters,
+                                 gauges=self.gauges,
+                                 timestamp=self.last_flush,
+                                 exited=exited)
+        self.spans = {}
+        self.counters = {}
+        self.gauges = {}
+
+        return command
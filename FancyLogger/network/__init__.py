@@ -0,0 +1,416 @@
+#!/bin/env/python
+# coding: utf-8
+
+import hashlib
+import hmac
+import io
+import logging
+import pickle
+import select
+import socket
+import socketserver
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from multiprocessing import Process
+from queue import Empty
+
+import dill
+
+from ..commands import *
+
+FRAME_HEADER = struct.Struct('!I')
+"Header of every frame sent over TCP: the size in bytes of the compressed batch that follows its signature."
+FRAME_DIGEST = hashlib.sha256
+"Hash function of the HMAC signing every frame with the secret shared by the collector and the remote nodes."
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+"Frames announcing a larger size are refused before being read."
+ACKNOWLEDGEMENT = struct.Struct('!Q')
+"Sent back by the collector once a batch has been queued, holding the sequence number of that batch."
+FORWARDED_COMMANDS = (LogMessageCommand,
+                      LogBatchCommand,
+                      UpdateProgressCommand,
+                      UpdateProgressBatchCommand,
+                      NewTaskCommand,
+                      NewTaskBatchCommand,
+                      StacktraceCommand,
+                      StacktraceReferenceCommand,
+                      MetricsCommand,
+                      FlushCommand)
+"Commands that are forwarded to the collector. Configuration commands only apply to the local node."
+REMOTE_CLASSES = {('FancyLogger.commands', command.__name__) for command in FORWARDED_COMMANDS + (TaskHandle,)} | {
+    ('FancyLogger', 'TaskProgress'),
+    ('FancyLogger.metrics', 'Histogram'),
+    ('builtins', 'complex')}
+"Tuples (module, name) of the only classes that data received from remote nodes may instantiate."
+
+
+class RemoteUnpickler(pickle.Unpickler):
+    """
+    Unpickler of data received from remote nodes, which only instantiates the classes of forwarded commands and of
+    their fields, so that a peer cannot make the logger process run arbitrary code.
+    """
+
+    def find_class(self, module, name):
+        if (module, name) not in REMOTE_CLASSES:
+            raise pickle.UnpicklingError('remote data cannot refer to {}.{}'.format(module, name))
+
+        return super(RemoteUnpickler, self).find_class(module, name)
+
+
+def decode_remote_command(serialized):
+    """
+    Deserializes a command sent by a remote node. Unlike 'decode_command', commands serialized by dill and commands
+    passed through shared memory are refused.
+    :param serialized:  The serialized command.
+    :return:            The ProcessCommand object.
+    """
+    if serialized[:1] == UPDATE_TAG:
+        return decode_command(serialized)
+
+    return RemoteUnpickler(io.BytesIO(serialized)).load()
+
+
+def encode_frame(secret, node, session, sequence, commands, compression_level=6):
+    """
+    Builds a signed frame holding a batch of serialized commands.
+    :param secret:              The secret shared with the collector, as bytes.
+    :param node:                The name of the node sending the batch.
+    :param session:             Unique identifier of the sending process, so the collector can tell restarts apart.
+    :param sequence:            Sequence number of the batch within the session.
+    :param commands:            List of serialized commands as they were put into the local queue.
+    :param compression_level:   [Optional] The zlib compression level.
+    :return:                    The frame bytes, header included.
+    """
+    payload = zlib.compress(pickle.dumps((node, session, sequence, commands), pickle.HIGHEST_PROTOCOL),
+                            compression_level)
+
+    return FRAME_HEADER.pack(len(payload)) + hmac.digest(secret, payload, FRAME_DIGEST) + payload
+
+
+def receive_exactly(connection, size):
+    """
+    Reads the given amount of bytes from a socket.
+    :param connection:  The connected socket.
+    :param size:        The number of bytes to read.
+    :return:            The bytes read, or None if the connection has been closed before all bytes have been received.
+    """
+    chunks = []
+    while size > 0:
+        chunk = connection.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b''.join(chunks)
+
+
+def decode_frame(connection, secret):
+    """
+    Reads a frame from a socket and checks its signature.
+    :param connection:  The connected socket.
+    :param secret:      The secret shared with the remote nodes, as bytes.
+    :return:            Tuple (node, session, sequence, commands), or None if the connection has been closed or the
+                        frame is not signed with the secret.
+    """
+    header = receive_exactly(connection, FRAME_HEADER.size)
+    if header is None:
+        return None
+
+    size = FRAME_HEADER.unpack(header)[0]
+    if size > MAX_FRAME_SIZE:
+        return None
+
+    signature = receive_exactly(connection, FRAME_DIGEST().digest_size)
+    payload = receive_exactly(connection, size) if signature is not None else None
+    if payload is None or not hmac.compare_digest(signature, hmac.digest(secret, payload, FRAME_DIGEST)):
+        return None
+
+    return RemoteUnpickler(io.BytesIO(zlib.decompress(payload))).load()
+
+
+class CollectorRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Handles one remote node connection. Every received batch is pushed into the logger queue, then acknowledged. The
+    connection is closed as soon as a frame is not signed with the shared secret or cannot be decoded.
+    """
+
+    def handle(self):
+        node = None
+
+        try:
+            while True:
+                try:
+                    frame = decode_frame(self.request, self.server.secret)
+                    if frame is None:
+                        return
+                except (OSError, zlib.error, EOFError, pickle.UnpicklingError, ValueError, TypeError):
+                    return
+
+                if node is None:
+                    node = frame[0]
+                    self.server.push(NodeConnectionCommand(node=node, connected=True))
+
+                if not self.receive(frame):
+                    return
+        finally:
+            if node is not None:
+                self.server.push(NodeConnectionCommand(node=node, connected=False))
+
+    def receive(self, frame):
+        """
+        Queues the commands of a batch unless it has already been queued, then acknowledges it.
+        :param frame:   Tuple (node, session, sequence, commands) as returned by 'decode_frame'.
+        :return:        False if the connection is lost, True otherwise.
+        """
+        node, session, sequence, commands = frame
+
+        # Batches are resent after a reconnection, so skip the ones that have already been queued
+        if self.server.accept_batch(session, sequence):
+            for command in commands:
+                self.server.queue.put(dill.dumps(RemoteCommand(node=node,
+                                                               command=command)))
+            if self.server.wakeup is not None:
+                self.server.wakeup.set()
+
+        try:
+            self.request.sendall(ACKNOWLEDGEMENT.pack(sequence))
+        except OSError:
+            return False
+
+        return True
+
+
+class CollectorServer(socketserver.ThreadingTCPServer):
+    """
+    TCP server running inside the logger process. Receives framed and compressed batches of commands from remote nodes
+    and feeds them into the logger queue.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, queue, secret, wakeup=None):
+        """
+        Binds the server to the given address.
+        :param address: Tuple (host, port) to listen on.
+        :param queue:   The logger queue to push received commands into.
+        :param secret:  The secret shared with the remote nodes, as bytes. Frames not signed with it are dropped.
+        :param wakeup:  [Optional] Event set once the commands of a batch have been pushed, for a logger process that
+                        waits on it rather than on the queue.
+        """
+        super(CollectorServer, self).__init__(address, CollectorRequestHandler)
+
+        self.queue = queue
+        self.secret = secret
+        self.wakeup = wakeup
+        self.last_sequences = {}
+        self.lock = threading.Lock()
+
+    def push(self, command):
+        """
+        Pushes a command of the collector itself into the logger queue.
+        :param command: The command object.
+        """
+        self.queue.put(dill.dumps(command))
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def accept_batch(self, session, sequence):
+        """
+        Tells whether a batch has not been queued yet and records it as queued.
+        :param session:     Unique identifier of the sending process.
+        :param sequence:    Sequence number of the batch within the session.
+        :return:            True if the batch is new.
+        """
+        with self.lock:
+            if sequence <= self.last_sequences.get(session, -1):
+                return False
+            self.last_sequences[session] = sequence
+
+            return True
+
+    def start(self):
+        """
+        Serves connections from a background daemon thread.
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+
+
+class NetworkForwarder(Process):
+    """
+    Replaces the logger process on a remote node. Drains the local queue, batches commands and sends them to a collector
+    over TCP. Batches are buffered until acknowledged and resent after a reconnection, so worker processes never wait
+    for the network. Several batches are sent before waiting for their acknowledgements, so that the throughput is not
+    bound to one batch per round trip.
+    """
+
+    def __init__(self,
+                 queue,
+                 address,
+                 node_name,
+                 secret,
+                 batch_size=256,
+                 batch_millis=100,
+                 max_pending_batches=10000,
+                 reconnect_millis=1000,
+                 send_window=32):
+        """
+        Defines the collector to send commands to.
+        :param queue:               Queue to receive orders from all local processes.
+        :param address:             Tuple (host, port) of the collector.
+        :param node_name:           The name under which this node's tasks and messages are displayed.
+        :param secret:              The secret shared with the collector, as bytes, with which every frame is signed.
+        :param batch_size:          [Optional] Maximum number of commands per batch.
+        :param batch_millis:        [Optional] Maximum time lapse in milliseconds a command waits before being sent.
+        :param max_pending_batches: [Optional] Maximum number of unacknowledged batches kept while the collector is
+                                    unreachable. The oldest ones are dropped beyond this limit.
+        :param reconnect_millis:    [Optional] Minimum time lapse in milliseconds between two connection attempts.
+        :param send_window:         [Optional] Maximum number of batches sent and not acknowledged yet.
+        """
+        super(NetworkForwarder, self).__init__()
+
+        self.queue = queue
+        self.address = address
+        self.node_name = node_name
+        self.secret = secret
+        self.batch_size = batch_size
+        self.batch_millis = batch_millis
+        self.max_pending_batches = max_pending_batches
+        self.reconnect_millis = reconnect_millis
+        self.send_window = send_window
+
+        self.session = uuid.uuid4().hex
+        self.sequence = 0
+        self.pending = deque()
+        self.dropped_batches = 0
+        self.connection = None
+        self.last_connection_attempt = 0
+        self.in_flight = 0
+
+    def connect(self):
+        """
+        Opens the connection to the collector if needed, no more often than the reconnection delay.
+        :return: True if connected.
+        """
+        if self.connection:
+            return True
+
+        now = time.time() * 1000
+        if now - self.last_connection_attempt < self.reconnect_millis:
+            return False
+        self.last_connection_attempt = now
+
+        try:
+            self.connection = socket.create_connection(self.address, timeout=self.reconnect_millis / 1000)
+        except OSError:
+            self.connection = None
+            return False
+
+        if self.dropped_batches:
+            warning = dill.dumps(LogMessageCommand(text='Dropped {} batches while the collector was unreachable'
+                                                   .format(self.dropped_batches),
+                                                   level=logging.WARNING))
+            self.dropped_batches = 0
+            self.enqueue([warning])
+
+        return True
+
+    def enqueue(self, commands):
+        """
+        Adds a batch of serialized commands to the pending batches.
+        :param commands: List of serialized commands.
+        """
+        self.pending.append((self.sequence, encode_frame(self.secret,
+                                                                self.node_name,
+                                                                self.session,
+                                                                self.sequence,
+                                                                commands)))
+        self.sequence += 1
+
+        while len(self.pending) > self.max_pending_batches:
+            self.pending.popleft()
+            self.dropped_batches += 1
+            self.in_flight = max(self.in_flight - 1, 0)
+
+    def send_pending(self, wait=False):
+        """
+        Sends pending batches, keeping up to 'send_window' of them in flight, and forgets each of them once
+        acknowledged. The collector acknowledges batches in order. On failure, the connection is closed and the batches
+        that have not been acknowledged will be resent after the next reconnection.
+        :param wait:    [Optional] If True, returns once every batch has been acknowledged or the connection has failed.
+                        Otherwise, only waits for acknowledgements while the window is full.
+        """
+        while self.pending and self.connect():
+            try:
+                while self.in_flight < min(self.send_window, len(self.pending)):
+                    self.connection.sendall(self.pending[self.in_flight][1])
+                    self.in_flight += 1
+
+                if not wait and self.in_flight < self.send_window \
+                        and not select.select([self.connection], [], [], 0)[0]:
+                    return
+
+                acknowledgement = receive_exactly(self.connection, ACKNOWLEDGEMENT.size)
+            except OSError:
+                acknowledgement = None
+
+            sequence = ACKNOWLEDGEMENT.unpack(acknowledgement)[0] if acknowledgement is not None else None
+
+            if sequence is not None and sequence < self.pending[0][0]:
+                # The batch has been dropped from the pending ones while in flight
+                continue
+
+            if sequence != self.pending[0][0]:
+                self.connection.close()
+                self.connection = None
+                self.in_flight = 0
+                return
+
+            self.pending.popleft()
+            self.in_flight -= 1
+
+    def run(self):
+        """
+        The main loop for the forwarder process. Returns when the main application calls for exit, after a last attempt
+        to send the pending batches.
+        """
+        batch = []
+        batch_deadline = None
+
+        while True:
+            timeout = self.batch_millis / 1000 if batch_deadline is None \
+                else max(0, batch_deadline - time.time())
+            try:
+                serialized = self.queue.get(timeout=timeout)
+            except Empty:
+                serialized = None
+
+            if serialized is not None:
+                o = decode_command(serialized)
+
+                if isinstance(o, ExitCommand):
+                    if batch:
+                        self.enqueue(batch)
+                    self.last_connection_attempt = 0
+                    self.send_pending(wait=True)
+                    if self.connection:
+                        self.connection.close()
+                    return
+
+                if isinstance(o, FORWARDED_COMMANDS):
+                    batch.append(serialized)
+                    if batch_deadline is None:
+                        batch_deadline = time.time() + self.batch_millis / 1000
+
+            if batch and (len(batch) >= self.batch_size or time.time() >= batch_deadline):
+                self.enqueue(batch)
+                batch = []
+                batch_deadline = None
+
+            self.send_pending()
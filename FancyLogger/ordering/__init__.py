@@ -0,0 +1,116 @@
+#!/bin/env/python
+# coding: utf-8
+
+import heapq
+from bisect import bisect
+from collections import deque
+from itertools import count
+
+
+class ReorderWindow(object):
+    """
+    Merges records from many processes in timestamp order before they are written. The records of each process form a
+    stream sorted by their sequence numbers, and the streams are merged with a heap holding the first record of each
+    one, so that the records of one process always keep the order in which they were made even if its clock goes
+    backwards. A record is released once it has waited the maximum delay, or as soon as the window holds its maximum
+    number of records, so that both latency and memory stay bounded. A record arriving after a later one of another
+    process has been released is released with the next ones, as close to its place as is still possible.
+    """
+
+    def __init__(self, delay_millis, capacity=10000):
+        """
+        Defines an empty window.
+        :param delay_millis:    The maximum time lapse in milliseconds a record is held, measured from its timestamp.
+        :param capacity:        [Optional] The maximum number of records held.
+        """
+        super(ReorderWindow, self).__init__()
+
+        self.delay = delay_millis / 1000.
+        self.capacity = capacity
+
+        # Lists [sequence, timestamp, item] of each stream, identified by stream key
+        self.streams = {}
+        # Tuples (timestamp, arrival, stream key, sequence) of the first record of each stream
+        self.heads = []
+        self.size = 0
+
+        # Records without sequence number are sequenced in order of arrival, which also breaks ties between streams
+        self.arrivals = count()
+
+    def __len__(self):
+        return self.size
+
+    def push(self, stream, sequence, timestamp, item):
+        """
+        Adds a record to the window.
+        :param stream:      The key of the stream of the record, such as the pid of its process.
+        :param sequence:    The sequence number of the record in its stream. If None, records are sequenced in order of
+                            arrival.
+        :param timestamp:   The time of the record in seconds since the epoch.
+        :param item:        The record, returned as is when it is released.
+        """
+        if sequence is None:
+            sequence = next(self.arrivals)
+
+        records = self.streams.get(stream)
+        if records is None:
+            records = self.streams[stream] = deque()
+
+        record = [sequence, timestamp, item]
+        if not records or sequence > records[-1][0]:
+            records.append(record)
+        else:
+            # A record overtaken by a later one of the same process, such as when a ring buffer was full
+            records.insert(bisect([r[0] for r in records], sequence), record)
+
+        if records[0] is record:
+            # Older heads of the stream are discarded when they are popped
+            heapq.heappush(self.heads, (timestamp, next(self.arrivals), stream, sequence))
+
+        self.size += 1
+
+    def pop(self, now=None):
+        """
+        Removes the record to be written next, if it is due.
+        :param now: [Optional] The current time in seconds since the epoch. If None, the next record is removed whatever
+                    its time.
+        :return:    The record, or None if there is none or it is not due yet.
+        """
+        while self.heads:
+            timestamp, _, stream, sequence = self.heads[0]
+            records = self.streams.get(stream)
+
+            if not records or records[0][0] != sequence:
+                heapq.heappop(self.heads)
+                continue
+
+            if now is not None and self.size <= self.capacity and timestamp > now - self.delay:
+                return None
+
+            heapq.heappop(self.heads)
+            _, _, item = records.popleft()
+            self.size -= 1
+
+            if records:
+                heapq.heappush(self.heads, (records[0][1], next(self.arrivals), stream, records[0][0]))
+            else:
+                del self.streams[stream]
+
+            return item
+
+        return None
+
+    def release(self, now=None):
+        """
+        Removes all the records that are due, in order.
+        :param now: [Optional] The current time in seconds since the epoch. If None, all records are removed.
+        :return:    The list of released records.
+        """
+        released = []
+
+        item = self.pop(now)
+        while item is not None:
+            released.append(item)
+            item = self.pop(now)
+
+        return released
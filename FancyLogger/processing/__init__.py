@@ -8,10 +8,19 @@ import time
 from collections import OrderedDict
 from logging import getLogger, StreamHandler
 from multiprocessing import Process
+from queue import Empty
 
 import dill
 
 from ..commands import *
+from ..handlers import BridgeHandler
+from ..metrics import Histogram, format_duration, format_value, prometheus_text, write_textfile
+from ..network import CollectorServer, decode_remote_command
+from ..ordering import ReorderWindow
+from ..recording import SessionRecorder
+from ..stacktraces import UniqueStacktrace, stacktrace_digest
+from ..tasks import TaskTable
+from ..transport import PAYLOAD_TAG, RingBuffer
 
 
 def millis():
@@ -42,15 +51,153 @@ class MultiprocessingLogger(Process):
     changes_made = False
     "Indicates if a new message has been posted or if a task has updated. If none, then there is no need to redraw."
 
-    tasks = OrderedDict()
-    "List of tasks identified by an id. One progress bar per task."
-    to_delete = []
+    tasks = None
+    "TaskTable of the tasks identified by an id. One progress bar per task."
+    to_delete = None
     "When a task is marked for deletion, it is added in this list for next redraw to process it."
     exceptions = None
     """
     When a process sends an exception to the logger, the stacktrace will be permanently displayed below log messages."
     So the user can see that a process has failed even if the console is refreshing.
     """
+    stacktraces = None
+    """
+    Unique stacktraces identified by the digest of their normalized text. Each one is displayed once, along with its
+    number of occurrences, instead of once per process that hit the same bug.
+    """
+    node_tasks = None
+    """
+    TaskTable of the tasks received from each remote node, identified by node name. Each node is displayed as one
+    aggregate progress bar.
+    """
+    node_connections = None
+    "The number of open connections of each remote node, identified by node name."
+    node_departures = None
+    "The time in milliseconds at which the last connection of each remote node without any open one closed."
+    node_millis_to_removal = 60000
+    """
+    Minimum time lapse in milliseconds a remote node stays displayed once its last connection closed, so that a node
+    reconnecting after a network failure keeps its tasks.
+    """
+    collector_address = None
+    "Tuple (host, port) to listen on for remote nodes. If None, the logger only handles local processes."
+    collector_secret = None
+    "The secret shared with the remote nodes, as bytes, with which their frames must be signed."
+    ring_wakeup = None
+    """
+    Event set by producers when their ring buffer goes from empty to non-empty. If None, all commands are received
+    through the queue.
+    """
+    rings = None
+    "Shared memory ring buffers to poll, identified by the pid of their producer process."
+    sinks = None
+    "Outputs fed directly from command fields, such as JsonLinesSink, in addition to the file handlers."
+    ring_batch_size = 64
+    "Maximum number of records read from a ring before moving on to the next one."
+    ring_check_interval_millis = 1000
+    "Minimum time lapse in milliseconds between two checks for rings whose producer process has exited."
+    ring_check_timer = 0
+    "The time in milliseconds at which rings were last checked."
+    lanes = None
+    """
+    Queues of the priority lanes, drained in order, the first one being 'queue'. If None, all commands are received
+    through the queue.
+    """
+    lane_wakeup = None
+    "Event set by producers when they send a command while the logger process is waiting for the priority lanes."
+    lanes_idle = None
+    """
+    Shared flag raised by the logger process before it waits for the priority lanes, so that only the first command
+    sent after that sets 'lane_wakeup'.
+    """
+    progress_batch_size = 1000
+    "Maximum number of records read at once from the progress lane, among which updates of the same task are coalesced."
+    barriers = None
+    """
+    The set of lanes each barrier sent through all of them has come out of, identified by barrier, or None for exit.
+    Configuration commands take their identifier from the same counter as flush barriers.
+    """
+    record_filename = None
+    "Path of the file to record the session into, so that it can be replayed. If None, the session is not recorded."
+    keyframe_interval_millis = None
+    "Minimum time lapse in milliseconds between two keyframes of the recorded session."
+    recorder = None
+    "The SessionRecorder writing the recorded session, opened from the logger process."
+    line_mode = None
+    """
+    If True, the console output is append-only: each message is written once and progress is written as periodic
+    summary lines for the tasks that changed, instead of redrawing the whole screen. If None, line mode is used when
+    stdout is not a terminal.
+    """
+    line_progress_interval_millis = None
+    "Minimum time lapse in milliseconds between two progress summaries in line mode."
+    changed_tasks = None
+    "Tasks and remote nodes whose progress changed since the last progress summary in line mode."
+    coalesce_interval_millis = None
+    """
+    Maximum time lapse in milliseconds between two file records counting the repeats of the last message. Identical
+    consecutive messages are displayed as a single line. If None or 0, every message is displayed and written.
+    """
+    last_message = None
+    "Tuple (level, text) of the last message, to detect identical consecutive messages."
+    last_message_count = 0
+    "The number of times the last message has been received in a row."
+    last_message_line = None
+    "The console line of the last message as first displayed, before any repeat count was appended."
+    last_message_display = None
+    "The console line currently displaying the last message, to update it in place."
+    pending_repeats = 0
+    "The number of repeats of the last message that have not been written to the file handlers yet."
+    pending_pid = None
+    "The pid of the process that sent the last repeat of the last message."
+    repeat_timer = 0
+    "The time in milliseconds at which repeats of the last message were last written."
+    rate_limit = None
+    "Maximum number of messages per second accepted from each process at each level. If None, there is no limit."
+    rate_limit_burst = None
+    "The capacity of each token bucket, that is the number of messages accepted at once after a quiet period."
+    rate_limit_interval_millis = None
+    "Time lapse in milliseconds between two reports of suppressed messages to the file handlers and sinks."
+    buckets = None
+    "Token buckets as lists [tokens, last refill time in seconds], identified by tuples (pid, level)."
+    suppressed = None
+    "The number of messages dropped by the rate limit since the last report, identified by tuples (pid, level)."
+    rate_limit_timer = 0
+    "The time in milliseconds at which suppressed messages were last reported."
+    spans = None
+    """
+    Durations of each span from all processes, identified by span name, as tuples of histograms (wall durations, CPU
+    durations). Displayed as a panel below the progress bars and written to the file handlers on exit.
+    """
+    counters = None
+    "Totals of each counter over all processes, identified by counter name."
+    gauges = None
+    "Values of each gauge, identified by gauge name, as dictionaries of the last value set by each process by pid."
+    metrics_textfile = None
+    "Path of the file rewritten with all metrics in the Prometheus text format. If None, metrics are not exported."
+    metrics_textfile_interval_millis = None
+    "Minimum time lapse in milliseconds between two rewrites of the Prometheus textfile."
+    metrics_textfile_timer = 0
+    "The time in milliseconds at which the Prometheus textfile was last rewritten."
+    metrics_changed = False
+    "Indicates if metrics have been received since the Prometheus textfile was last rewritten."
+    flush_acks = None
+    """
+    Shared array in which flush barriers are acknowledged: the identifier of each barrier is written into the slot
+    'barrier % len(flush_acks)'. If None, barriers are not acknowledged.
+    """
+    flush_condition = None
+    "Shared condition notified each time a flush barrier is acknowledged."
+    reorder_delay_millis = None
+    """
+    Maximum time lapse in milliseconds a message is held before being written to the file handlers and sinks, so that
+    messages from all processes are written in the order of their timestamps. If None or 0, messages are written as
+    they are received.
+    """
+    reorder_capacity = None
+    "The maximum number of messages held to be reordered. The oldest ones are written once it is reached."
+    reorder = None
+    "The ReorderWindow holding the messages to be written, created from the logger process."
 
     # ------------- Customizable parameters
     messages = None
@@ -101,7 +248,28 @@ class MultiprocessingLogger(Process):
                  task_millis_to_removal,
                  console_format_strftime,
                  console_format,
-                 file_handlers):
+                 file_handlers,
+                 collector_address=None,
+                 collector_secret=None,
+                 ring_wakeup=None,
+                 sinks=None,
+                 record_filename=None,
+                 keyframe_interval_millis=10000,
+                 line_mode=None,
+                 line_progress_interval_millis=5000,
+                 coalesce_interval_millis=None,
+                 rate_limit=None,
+                 rate_limit_burst=None,
+                 rate_limit_interval_millis=1000,
+                 metrics_textfile=None,
+                 metrics_textfile_interval_millis=15000,
+                 flush_acks=None,
+                 flush_condition=None,
+                 reorder_delay_millis=None,
+                 reorder_capacity=10000,
+                 lanes=None,
+                 lane_wakeup=None,
+                 lanes_idle=None):
         """
         Defines the current configuration of the logger and the queue to receive messages from remote processes. Must be
         used one time only.
@@ -132,10 +300,83 @@ class MultiprocessingLogger(Process):
                                             uses regular python logging rules. All handlers are permitted except
                                             StreamHandler if used with stdout or stderr which are reserved by this
                                             library for custom console output.
+        :param collector_address:           [Optional] Tuple (host, port) to listen on for batches sent by remote
+                                            FancyLogger instances. Remote tasks are displayed as one aggregate progress
+                                            bar per node below the local ones.
+        :param collector_secret:            [Optional] Used only with 'collector_address'. The secret shared with the
+                                            remote nodes, as bytes. Frames not signed with it are dropped.
+        :param ring_wakeup:                 [Optional] Event set by producers when their shared memory ring buffer
+                                            goes from empty to non-empty. If specified, the logger process polls the
+                                            ring buffers announced through the queue.
+        :param sinks:                       [Optional] Outputs fed directly from command fields, such as
+                                            JsonLinesSink, in addition to the file handlers.
+        :param record_filename:             [Optional] Path of the file to record the session into. Every received
+                                            command is written along with its reception time, so that the session can
+                                            be replayed with 'python -m FancyLogger.replay'.
+        :param keyframe_interval_millis:    [Optional] Minimum time lapse in milliseconds between two snapshots of the
+                                            displayed state in the recorded session, from which replay can seek.
+        :param line_mode:                   [Optional] If True, the console output is append-only instead of being
+                                            redrawn: messages and exceptions are written once, and progress is written
+                                            as summary lines for the tasks that changed. If None, line mode is used
+                                            when stdout is not a terminal, such as in CI jobs, pipes and containers.
+        :param line_progress_interval_millis: [Optional] Used only in line mode. Minimum time lapse in milliseconds
+                                            between two progress summaries.
+        :param coalesce_interval_millis:    [Optional] Identical consecutive messages are displayed as a single line
+                                            ending with '(repeated N times)'. Their count is written to the file
+                                            handlers at most once per this time lapse in milliseconds, or before the
+                                            next different message. Disabled if None or 0.
+        :param rate_limit:                  [Optional] Maximum number of messages per second accepted from each process
+                                            at each level, enforced with a token bucket. Disabled if None.
+        :param rate_limit_burst:            [Optional] The capacity of each token bucket. Defaults to 'rate_limit'.
+        :param rate_limit_interval_millis:  [Optional] Time lapse in milliseconds between two reports of the messages
+                                            suppressed by the rate limit, written to the file handlers and sinks.
+        :param metrics_textfile:            [Optional] Path of a file rewritten atomically with all metrics in the
+                                            Prometheus text format, for the node exporter textfile collector.
+        :param metrics_textfile_interval_millis: [Optional] Minimum time lapse in milliseconds between two rewrites of
+                                            'metrics_textfile'.
+        :param flush_acks:                  [Optional] Shared array in which flush barriers are acknowledged, shared
+                                            with the processes waiting for them.
+        :param flush_condition:             [Optional] Used only with 'flush_acks'. Shared condition notified each time
+                                            a flush barrier is acknowledged.
+        :param reorder_delay_millis:        [Optional] Messages and exceptions are held up to this time lapse in
+                                            milliseconds, then written to the file handlers and sinks in the order of
+                                            their timestamps, with the time at which they were made. Disabled if None
+                                            or 0.
+        :param reorder_capacity:            [Optional] Used only with 'reorder_delay_millis'. The maximum number of
+                                            messages held.
+        :param lanes:                       [Optional] Queues of the priority lanes, the first one being 'queue'. If
+                                            specified, higher lanes are always drained before lower ones and progress
+                                            updates are coalesced.
+        :param lane_wakeup:                 [Optional] Used only with 'lanes'. Event set by producers when they send a
+                                            command while 'lanes_idle' is raised.
+        :param lanes_idle:                  [Optional] Used only with 'lanes'. Shared flag raised by the logger process
+                                            before it waits on 'lane_wakeup'.
         """
         super(MultiprocessingLogger, self).__init__()
 
         self.queue = queue
+        self.tasks = TaskTable()
+        self.to_delete = []
+        self.collector_address = collector_address
+        self.collector_secret = collector_secret
+        self.ring_wakeup = ring_wakeup
+        self.record_filename = record_filename
+        self.keyframe_interval_millis = keyframe_interval_millis
+        self.line_mode = line_mode
+        self.line_progress_interval_millis = line_progress_interval_millis
+        self.coalesce_interval_millis = coalesce_interval_millis
+        self.rate_limit = rate_limit
+        self.rate_limit_burst = rate_limit_burst or rate_limit
+        self.rate_limit_interval_millis = rate_limit_interval_millis
+        self.metrics_textfile = metrics_textfile
+        self.metrics_textfile_interval_millis = metrics_textfile_interval_millis
+        self.flush_acks = flush_acks
+        self.flush_condition = flush_condition
+        self.reorder_delay_millis = reorder_delay_millis
+        self.reorder_capacity = reorder_capacity
+        self.lanes = lanes
+        self.lane_wakeup = lane_wakeup
+        self.lanes_idle = lanes_idle
 
         # We need to serialize objects between process instantiation and process execution because when we call
         # 'start' method on the process, Python tries to copy instance objects between processes which can only be done
@@ -150,7 +391,8 @@ class MultiprocessingLogger(Process):
                                                                      redraw_frequency_millis=redraw_frequency_millis,
                                                                      console_format_strftime=console_format_strftime,
                                                                      console_format=console_format,
-                                                                     file_handlers=file_handlers))
+                                                                     file_handlers=file_handlers,
+                                                                     sinks=sinks or []))
 
     def set_configuration(self, command):
         """
@@ -167,9 +409,19 @@ class MultiprocessingLogger(Process):
         self.console_format = command.console_format
         self.file_handlers = command.file_handlers
 
-        # If the logger has already been initialized, then clear file handlers and add the new ones
+        # Sinks are kept unless new ones are given
+        if command.sinks is not None:
+            for sink in self.sinks:
+                sink.close()
+            self.sinks = command.sinks
+
+        # If the logger has already been initialized, then close file handlers and add the new ones
         if len(self.log.handlers) > 0:
-            self.log.handlers.clear()
+            # Handlers may still hold buffered records, such as the compressed ones writing from a background thread
+            for handler in list(self.log.handlers):
+                self.log.removeHandler(handler)
+                handler.flush()
+                handler.close()
 
             for handler in self.file_handlers:
                 if isinstance(handler, StreamHandler)\
@@ -180,6 +432,8 @@ class MultiprocessingLogger(Process):
                                                     level=logging.CRITICAL))
                     continue
 
+                # Locks do not survive serialization, so give each handler a fresh one
+                handler.createLock()
                 self.log.addHandler(hdlr=handler)
 
         # Do not clear exceptions if the user changes the configuration during runtime
@@ -230,6 +484,29 @@ class MultiprocessingLogger(Process):
         # Initialize the file logger
         self.log = getLogger()
 
+        # A bridge inherited from the parent process would send the records of the logger process back to itself
+        for handler in list(self.log.handlers):
+            if isinstance(handler, BridgeHandler):
+                self.log.removeHandler(handler)
+        self.node_tasks = OrderedDict()
+        self.node_connections = {}
+        self.node_departures = {}
+        self.sinks = []
+        self.changed_tasks = OrderedDict()
+        self.stacktraces = OrderedDict()
+        self.buckets = {}
+        self.suppressed = OrderedDict()
+        self.spans = OrderedDict()
+        self.counters = OrderedDict()
+        self.gauges = OrderedDict()
+
+        if self.reorder_delay_millis:
+            self.reorder = ReorderWindow(delay_millis=self.reorder_delay_millis, capacity=self.reorder_capacity)
+
+        # Redrawing frames is only meaningful on a terminal
+        if self.line_mode is None:
+            self.line_mode = not sys.stdout.isatty()
+
         # Deserialize configuration
         self.set_config_command = dill.loads(self.set_config_command)
         self.set_configuration(self.set_config_command)
@@ -242,54 +519,816 @@ class MultiprocessingLogger(Process):
                                                 level=logging.CRITICAL))
                 continue
 
+            # Locks do not survive serialization, so give each handler a fresh one
+            handler.createLock()
             self.log.addHandler(hdlr=handler)
 
         self.log.setLevel(self.console_level)
 
+        if self.record_filename:
+            self.recorder = SessionRecorder(filename=self.record_filename,
+                                            keyframe_interval_millis=self.keyframe_interval_millis)
+
+        # Start listening to remote nodes
+        if self.collector_address:
+            # With priority lanes, remote nodes must not hold back the control commands of local processes
+            queue = self.queue if self.lanes is None else self.lanes[MESSAGE_LANE]
+            CollectorServer(address=self.collector_address,
+                            queue=queue,
+                            secret=self.collector_secret,
+                            wakeup=self.lane_wakeup).start()
+
+        # Wake up from time to time to write repeat counts, suppressed messages and metrics, and to drop departed nodes
+        timeout = 1. if self.coalesce_interval_millis or self.rate_limit or self.metrics_textfile \
+            or self.collector_address else None
+
+        # Held messages must be written even if no other command comes
+        if self.reorder is not None:
+            timeout = min(timeout or 1., self.reorder_delay_millis / 1000.)
+
+        try:
+            if self.ring_wakeup is not None:
+                self.rings = OrderedDict()
+                self.poll_rings()
+            elif self.lanes is not None:
+                self.barriers = {}
+                self.poll_lanes()
+            else:
+                while True:
+                    try:
+                        serialized = self.queue.get(timeout=timeout)
+                    except Empty:
+                        self.tick()
+                        continue
+
+                    if not self.receive(serialized):
+                        break
+        finally:
+            self.write_repeats()
+            self.write_suppressed()
+            self.release_messages()
+            self.log_stacktrace_summary()
+            self.log_metrics_summary()
+            self.write_metrics_textfile()
+
+            for sink in self.sinks:
+                sink.close()
+
+            # Forked processes do not run exit handlers, so handlers writing from a background thread must be closed
+            for handler in self.log.handlers:
+                handler.close()
+
+            for ring in (self.rings or {}).values():
+                ring.close(unlink=True)
+
+            if self.recorder:
+                self.recorder.close()
+
+    def poll_rings(self):
+        """
+        The main loop when producers send commands through shared memory ring buffers. The queue, which carries ring
+        announcements, and then every ring are polled in round-robin, a few records at a time. When everything is empty,
+        the loop spins, then yields, then waits on the wakeup event with an increasing timeout.
+        """
+        idle = 0
+
+        while True:
+            received = False
+
+            try:
+                serialized = self.queue.get_nowait()
+            except Empty:
+                pass
+            else:
+                received = True
+                if not self.receive(serialized):
+                    return
+
+            for pid, ring in list(self.rings.items()):
+                for _ in range(self.ring_batch_size):
+                    # The last record of a ring unregisters it
+                    if self.rings.get(pid) is not ring:
+                        break
+
+                    serialized = ring.read()
+                    if serialized is None:
+                        break
+
+                    received = True
+                    if not self.receive(serialized):
+                        return
+
+            if received:
+                idle = 0
+                continue
+
+            idle += 1
+            if idle < 100:
+                continue
+            elif idle < 200:
+                time.sleep(0)
+            else:
+                self.tick()
+
+                # Producers only set the event when their ring was empty, so clear it before checking again
+                self.ring_wakeup.clear()
+                if self.queue.empty() and all(r.is_empty() for r in self.rings.values()):
+                    self.ring_wakeup.wait(min(0.05, 0.0001 * 2 ** min(idle - 200, 9)))
+
+    def poll_lanes(self):
+        """
+        The main loop with priority lanes. One command is received from the highest lane that is not empty, then the
+        lanes are checked again from the first one. Progress is only received when all other lanes are empty, a batch
+        at a time. The lanes out of which the oldest pending barrier has come are not read until it has come out of the
+        other ones. When every lane is empty, the loop yields, then waits on the wakeup event with an increasing
+        timeout.
+        """
+        idle = 0
+
         while True:
-            o = dill.loads(self.queue.get())
+            held = self.held_lanes()
+
+            for lane in range(PROGRESS_LANE):
+                if lane in held:
+                    continue
+
+                try:
+                    serialized = self.lanes[lane].get_nowait()
+                except Empty:
+                    continue
+
+                idle = 0
+                if not self.receive_lane(lane=lane, serialized=serialized):
+                    return
+                break
+            else:
+                if PROGRESS_LANE not in held and not self.lanes[PROGRESS_LANE].empty():
+                    idle = 0
+                    if not self.receive_progress():
+                        return
+                    continue
+
+                # Unlike ring buffers, queues are written by the feeder thread of each producer, which spinning would
+                # starve of CPU: the loop only yields for a while
+                idle += 1
+                if idle < 10:
+                    time.sleep(0)
+                else:
+                    self.tick()
+
+                    # A command may be sent before this check yet reach its queue after it: the timeout bounds the delay
+                    self.lane_wakeup.clear()
+                    self.lanes_idle.value = 1
+                    if all(self.lanes[lane].empty() for lane in range(len(self.lanes)) if lane not in held):
+                        self.lane_wakeup.wait(min(0.05, 0.0001 * 2 ** min(idle - 10, 9)))
+
+    def receive_lane(self, lane, serialized):
+        """
+        Deserializes one command received from a priority lane, then applies it, unless it is a barrier that has not
+        come out of every lane yet.
+        :param lane:        The lane the command came out of.
+        :param serialized:  The command as it was sent.
+        :return:            False if the command asks the logger process to exit, True otherwise.
+        """
+        o = self.decode(serialized)
+
+        if is_barrier(o) and not self.gather_barrier(command=o, lane=lane):
+            return True
+
+        result = self.process_command(o)
+        self.tick()
+
+        return result
+
+    def receive_progress(self):
+        """
+        Receives a batch of commands from the progress lane. Consecutive updates are coalesced to the latest one of each
+        task, keeping the new total of earlier ones, before being applied. The batch ends early at a barrier that has
+        not come out of every lane yet.
+        :return: False if a command asks the logger process to exit, True otherwise.
+        """
+        updates = OrderedDict()
+
+        for _ in range(self.progress_batch_size):
+            try:
+                serialized = self.lanes[PROGRESS_LANE].get_nowait()
+            except Empty:
+                break
+
+            o = self.decode(serialized)
+
+            if isinstance(o, UpdateProgressCommand):
+                previous = updates.pop(o.task_id, None)
+                if o.total is None and previous is not None:
+                    o.total = previous.total
+                updates[o.task_id] = o
+                continue
+
+            # Other commands, such as new tasks, must be applied in order with the updates
+            for update in updates.values():
+                self.update(command=update)
+            updates.clear()
+
+            if is_barrier(o) and not self.gather_barrier(command=o, lane=PROGRESS_LANE):
+                break
+
+            if not self.process_command(o):
+                return False
+
+        for update in updates.values():
+            self.update(command=update)
+        self.tick()
+
+        return True
+
+    def gather_barrier(self, command, lane):
+        """
+        Records a barrier coming out of one of the priority lanes.
+        :param command: The ExitCommand, or the FlushCommand, SetLevelCommand or SetConfigurationCommand with a barrier.
+        :param lane:    The lane it came out of.
+        :return:        True once it has come out of every lane, so that it can be applied, False otherwise.
+        """
+        key = getattr(command, 'barrier', None)
+        lanes = self.barriers.setdefault(key, set())
+        lanes.add(lane)
+
+        if len(lanes) < len(self.lanes):
+            return False
+
+        del self.barriers[key]
+        return True
+
+    def held_lanes(self):
+        """
+        Tells which lanes are not read until the oldest pending barrier has come out of the other ones, so that nothing
+        sent after it is applied before it. Only the oldest one holds lanes, so that barriers sent at the same time by
+        different processes, which may come out of the lanes in a different order, cannot hold each other forever.
+        :return: The set of lanes out of which the oldest pending barrier has come.
+        """
+        if not self.barriers:
+            return ()
+
+        # Exit is pending once every other barrier
+        return self.barriers[min(self.barriers, key=lambda key: float('inf') if key is None else key)]
+
+    def register_ring(self, command):
+        """
+        Starts polling the ring buffer announced by a producer process.
+        :param command: The command object that holds all the necessary information from the remote process.
+        """
+        # A new process with the pid of one that has exited
+        self.unregister_ring(pid=command.pid)
+
+        self.rings[command.pid] = RingBuffer.attach(command.name)
+
+    def unregister_ring(self, pid):
+        """
+        Receives what is left in the ring buffer of a process, then stops polling it and destroys it.
+        :param pid: The producer process's pid.
+        :return:    False if a command read from the ring asks the logger process to exit, True otherwise.
+        """
+        ring = self.rings.get(pid) if self.rings else None
+        if ring is None:
+            return True
+
+        result = self.drain_ring(pid, ring)
+
+        if self.rings.get(pid) is ring:
+            del self.rings[pid]
+            ring.close(unlink=True)
+
+        return result
+
+    def drain_ring(self, pid, ring):
+        """
+        Receives every record already written to a ring buffer.
+        :param pid:     The producer process's pid.
+        :param ring:    The RingBuffer.
+        :return:        False if a command read from the ring asks the logger process to exit, True otherwise.
+        """
+        result = True
+
+        # Stop if a command read from the ring unregisters it
+        while self.rings.get(pid) is ring:
+            serialized = ring.read()
+            if serialized is None:
+                break
+
+            result = self.receive(serialized) and result
+
+        return result
+
+    def collect_rings(self):
+        """
+        Destroys the empty rings whose producer process has exited without unregistering them, such as pool workers
+        that have been terminated.
+        """
+        self.ring_check_timer = millis()
+
+        for pid, ring in list(self.rings.items()):
+            if ring.is_empty() and not self.process_exists(pid):
+                del self.rings[pid]
+                ring.close(unlink=True)
+
+    @staticmethod
+    def process_exists(pid):
+        """
+        Tells whether a process is running, or has exited but has not been waited for yet.
+        :param pid: The pid of the process.
+        :return:    True if the process exists.
+        """
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            # Owned by another user, such as a process that reused the pid
+            return True
+
+        return True
+
+    def drain_rings(self):
+        """
+        Receives every record already written to any ring buffer, so that a barrier or an exit comes after everything
+        that other processes sent before it.
+        :return: False if a command read from a ring asks the logger process to exit, True otherwise.
+        """
+        result = True
+
+        for pid, ring in list((self.rings or {}).items()):
+            result = self.drain_ring(pid, ring) and result
+
+        return result
+
+    def receive(self, serialized):
+        """
+        Deserializes one command received from a process, records it if the session is recorded, then applies it.
+        :param serialized:  The command as it was sent.
+        :return:            False if the command asks the logger process to exit, True otherwise.
+        """
+        result = self.process_command(self.decode(serialized))
+        self.tick()
+
+        return result
+
+    def decode(self, serialized):
+        """
+        Deserializes one command received from a process, and records it if the session is recorded.
+        :param serialized:  The command as it was sent.
+        :return:            The ProcessCommand object.
+        """
+        o = decode_command(serialized)
+
+        if self.recorder:
+            if serialized[:1] == PAYLOAD_TAG:
+                # The shared memory block is gone once read
+                serialized = dill.dumps(o)
+            self.recorder.record(serialized=serialized, command=o, logger=self)
+
+        return o
+
+    def tick(self):
+        """
+        Writes repeat counts, suppressed message counts, held messages and metrics whose interval has elapsed.
+        """
+        if self.pending_repeats and millis() - self.repeat_timer >= self.coalesce_interval_millis:
+            self.write_repeats()
+
+        if self.suppressed and millis() - self.rate_limit_timer >= self.rate_limit_interval_millis:
+            self.write_suppressed()
+
+        if self.metrics_changed and millis() - self.metrics_textfile_timer >= self.metrics_textfile_interval_millis:
+            self.write_metrics_textfile()
+
+        if self.reorder is not None:
+            self.release_messages(now=time.time())
+
+        if self.rings and millis() - self.ring_check_timer >= self.ring_check_interval_millis:
+            self.collect_rings()
+
+        if self.node_departures:
+            self.drop_departed_nodes()
+
+    def process_command(self, o):
+        """
+        Applies one command received from a process.
+        :param o:   The deserialized command.
+        :return:    False if the command asks the logger process to exit, True otherwise.
+        """
+        if isinstance(o, LogMessageCommand):
+            self.post_message(command=o)
+
+        elif isinstance(o, LogBatchCommand):
+            for command in o.commands:
+                self.post_message(command=command)
+
+        elif isinstance(o, UpdateProgressCommand):
+            self.update(command=o)
+
+        elif isinstance(o, UpdateProgressBatchCommand):
+            self.update_many(command=o)
+
+        elif isinstance(o, NewTaskCommand):
+            self.set_task(command=o)
+
+        elif isinstance(o, NewTaskBatchCommand):
+            self.set_tasks(command=o)
 
-            if isinstance(o, LogMessageCommand):
-                if o.level == logging.DEBUG:
-                    self.debug(command=o)
-                elif o.level == logging.INFO:
-                    self.info(command=o)
-                elif o.level == logging.WARNING:
-                    self.warning(command=o)
-                elif o.level == logging.ERROR:
-                    self.error(command=o)
-                elif o.level == logging.CRITICAL:
-                    self.critical(command=o)
+        elif isinstance(o, FlushCommand):
+            # Rings are not ordered with each other, so what other processes wrote before the barrier is read first
+            drained = self.drain_rings() if o.barrier is not None else True
 
-            elif isinstance(o, UpdateProgressCommand):
-                self.update(command=o)
+            self.flush()
 
-            elif isinstance(o, NewTaskCommand):
-                self.set_task(command=o)
+            if o.barrier is not None:
+                self.acknowledge(barrier=o.barrier)
 
-            elif isinstance(o, FlushCommand):
-                self.flush()
+            if not drained:
+                return False
 
-            elif isinstance(o, StacktraceCommand):
-                self.throw(command=o)
+        elif isinstance(o, StacktraceCommand):
+            self.throw(command=o)
 
-            elif isinstance(o, SetConfigurationCommand):
-                self.set_configuration(command=o)
+        elif isinstance(o, StacktraceReferenceCommand):
+            self.throw_reference(command=o)
 
-            elif isinstance(o, ExitCommand):
+        elif isinstance(o, SetConfigurationCommand):
+            self.set_configuration(command=o)
+
+        elif isinstance(o, ExitCommand):
+            self.drain_rings()
+            return False
+
+        elif isinstance(o, SetLevelCommand):
+            self.set_level(command=o)
+
+        elif isinstance(o, RemoteCommand):
+            self.remote(command=o)
+
+        elif isinstance(o, NodeConnectionCommand):
+            self.count_connection(command=o)
+
+        elif isinstance(o, RegisterRingCommand):
+            self.register_ring(command=o)
+
+        elif isinstance(o, UnregisterRingCommand):
+            return self.unregister_ring(pid=o.pid)
+
+        elif isinstance(o, MetricsCommand):
+            self.metrics(command=o)
+
+        return True
+
+    def post_message(self, command):
+        """
+        Posts a message received from a process, unless it exceeds the rate limit of its process and level or it repeats
+        the previous message.
+        :param command: The command object that holds all the necessary information from the remote process.
+        """
+        if getattr(command, 'args', None) or getattr(command, 'kwargs', None):
+            # Only messages that some output emits are formatted
+            if not self.is_emitted(command.level):
                 return
+            self.format_text(command)
+
+        if self.rate_limit and not self.take_token(command):
+            return
+
+        if self.coalesce_interval_millis and self.coalesce(command):
+            return
+
+        suffix = ''
+        if command.repeat > 1:
+            # Repeats whose first occurrence was followed by another message
+            suffix = ' (repeated {} times)'.format(command.repeat)
+            command.text = command.text + suffix
+
+        last_display = self.messages[-1] if self.messages else None
+
+        if command.level == logging.DEBUG:
+            self.debug(command=command)
+        elif command.level == logging.INFO:
+            self.info(command=command)
+        elif command.level == logging.WARNING:
+            self.warning(command=command)
+        elif command.level == logging.ERROR:
+            self.error(command=command)
+        elif command.level == logging.CRITICAL:
+            self.critical(command=command)
+
+        # Remember the displayed line, if any, to append the repeat count to it
+        if self.messages and self.messages[-1] is not last_display:
+            self.last_message_display = self.messages[-1]
+            self.last_message_line = self.last_message_display[:len(self.last_message_display) - len(suffix) - 1] + '\n'
+        else:
+            self.last_message_line = self.last_message_display = None
+
+    def write_message(self, level, text, command, exception=False):
+        """
+        Writes a message or an exception to the file handlers and sinks. With a reorder window, it is held until it can
+        be written in the order of the timestamps of all processes.
+        :param level:       The logging level (from standard logging module) of the file record.
+        :param text:        The text of the file record.
+        :param command:     The LogMessageCommand object given to the sinks, or the StacktraceCommand object.
+        :param exception:   [Optional] True if the command is a StacktraceCommand.
+        """
+        if self.reorder is None:
+            self.log.log(level, text)
+
+            for sink in self.sinks:
+                if exception:
+                    sink.emit_exception(command)
+                else:
+                    sink.emit_message(command)
+            return
+
+        # Commands without sequence number, such as exceptions and counts written by this process, keep their order of
+        # arrival
+        sequence = getattr(command, 'sequence', None)
+        timestamp = command.timestamp or time.time()
+        self.reorder.push(stream=command.pid if sequence is not None else None,
+                          sequence=sequence,
+                          timestamp=timestamp,
+                          item=(level, text, command, exception, timestamp))
+
+        if len(self.reorder) > self.reorder_capacity:
+            self.release_messages(now=time.time())
+
+    def release_messages(self, now=None):
+        """
+        Writes the held messages that are due to the file handlers and sinks, each file record taking the time at which
+        its message was made rather than the time it was received.
+        :param now: [Optional] The current time in seconds since the epoch. If None, all held messages are written.
+        """
+        if self.reorder is None:
+            return
+
+        for level, text, command, exception, timestamp in self.reorder.release(now):
+            if self.log.isEnabledFor(level):
+                record = self.log.makeRecord(self.log.name, level, '(unknown file)', 0, text, None, None)
+                record.created = timestamp
+                record.msecs = (timestamp - int(timestamp)) * 1000
+                self.log.handle(record)
+
+            for sink in self.sinks:
+                if exception:
+                    sink.emit_exception(command)
+                else:
+                    sink.emit_message(command)
+
+    def is_emitted(self, level):
+        """
+        Tells whether the messages of a level are displayed by the console or written by some file handler or sink.
+        :param level:   The message level (from standard logging module).
+        :return:        True if some output emits the messages.
+        """
+        return level >= self.console_level \
+            or self.log.isEnabledFor(level) \
+            or any(level >= sink.level for sink in self.sinks)
+
+    @staticmethod
+    def format_text(command):
+        """
+        Formats the text of a message with its arguments, which are then dropped.
+        :param command: The LogMessageCommand object.
+        """
+        command.text = format_message(command.text, getattr(command, 'args', None), getattr(command, 'kwargs', None))
+        command.args = None
+        command.kwargs = None
+
+    def take_token(self, command):
+        """
+        Takes one token from the bucket of the message's process and level, refilled at the rate limit.
+        :param command: The LogMessageCommand object.
+        :return:        True if the message is accepted, False if it is suppressed.
+        """
+        key = (command.pid, command.level)
+        now = time.time()
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [self.rate_limit_burst, now]
+        else:
+            bucket[0] = min(self.rate_limit_burst, bucket[0] + (now - bucket[1]) * self.rate_limit)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True
+
+        self.suppressed[key] = self.suppressed.get(key, 0) + command.repeat
+        return False
 
-            elif isinstance(o, SetLevelCommand):
-                self.set_level(command=o)
+    def write_suppressed(self):
+        """
+        Writes to the file handlers and sinks how many messages each process had suppressed at each level since the last
+        report.
+        """
+        for (pid, level), count in (self.suppressed or {}).items():
+            text = 'Rate limit: {} {} messages suppressed from process {}'.format(count,
+                                                                                  logging.getLevelName(level),
+                                                                                  pid)
+            self.write_message(level=level,
+                               text='\t{}'.format(text),
+                               command=LogMessageCommand(text=text, level=level, pid=pid, timestamp=time.time()))
+
+        if self.suppressed:
+            self.suppressed.clear()
+        self.rate_limit_timer = millis()
+
+    def coalesce(self, command):
+        """
+        Counts a message identical to the previous one instead of posting it, updating its displayed line.
+        :param command: The LogMessageCommand object.
+        :return:        True if the message has been coalesced, False if it differs from the previous one.
+        """
+        key = (command.level, command.text)
+
+        if key != self.last_message:
+            self.write_repeats()
+            self.last_message = key
+            self.last_message_count = command.repeat
+            self.repeat_timer = millis()
+            return False
+
+        self.last_message_count += command.repeat
+        self.pending_repeats += command.repeat
+        self.pending_pid = command.pid
+
+        if self.last_message_line and self.messages and self.messages[-1] is self.last_message_display:
+            self.last_message_display = '{} (repeated {} times)\n'.format(self.last_message_line.rstrip('\n'),
+                                                                          self.last_message_count)
+            self.messages[-1] = self.last_message_display
+
+            # Redraw
+            self.changes_made = True
+            self.redraw()
+
+        if millis() - self.repeat_timer >= self.coalesce_interval_millis:
+            self.write_repeats()
+
+        return True
+
+    def write_repeats(self):
+        """
+        Writes to the file handlers and sinks how many times the last message was repeated since it was last written.
+        """
+        if self.pending_repeats:
+            level, text = self.last_message
+            text = '{} (repeated {} more times)'.format(text, self.pending_repeats)
+            self.write_message(level=level,
+                               text='\t{}'.format(text),
+                               command=LogMessageCommand(text=text, level=level, pid=self.pending_pid,
+                                                         timestamp=time.time(), repeat=self.pending_repeats))
+
+            if self.line_mode and level >= self.console_level:
+                sys.stdout.write('{}\t{}\n'.format(self.get_format().replace('{L}', logging.getLevelName(level)),
+                                                   text))
+                sys.stdout.flush()
+
+        self.pending_repeats = 0
+        self.repeat_timer = millis()
+
+    def remote(self, command):
+        """
+        Applies a command sent by a remote node. Messages and exceptions are prefixed by the node name, while tasks are
+        stored apart from local ones so that identifiers cannot collide between nodes.
+        :param command: The command object that holds the node name and the serialized remote command.
+        """
+        try:
+            o = decode_remote_command(command.command)
+        except Exception as e:
+            # Only data is accepted from other hosts, so commands that only dill can serialize are refused
+            self.warning(LogMessageCommand(text='[{}] Dropped a command that cannot be decoded: {!r}'
+                                           .format(command.node, e),
+                                           level=logging.WARNING))
+            return
+
+        if isinstance(o, LogMessageCommand):
+            # The node name must not be taken for part of a format string
+            self.format_text(o)
+            o.text = '[{}] {}'.format(command.node, o.text)
+            # Sequence numbers of remote processes could collide with local ones
+            o.sequence = None
+            self.process_command(o)
+
+        elif isinstance(o, LogBatchCommand):
+            for message in o.commands:
+                self.format_text(message)
+                message.text = '[{}] {}'.format(command.node, message.text)
+                message.sequence = None
+            self.process_command(o)
+
+        elif isinstance(o, (StacktraceCommand, StacktraceReferenceCommand)):
+            o.process_title = '{} - {}'.format(command.node, o.process_title) if o.process_title else command.node
+            self.process_command(o)
+
+        elif isinstance(o, MetricsCommand):
+            # Spans and counters of the same name are merged across nodes, gauges are kept per node and pid
+            o.pid = '{}:{}'.format(command.node, o.pid)
+            self.process_command(o)
+
+        elif isinstance(o, (NewTaskCommand, NewTaskBatchCommand)):
+            if command.node not in self.node_tasks:
+                self.node_tasks[command.node] = TaskTable()
+                self.longest_bar_prefix_size = self.longest_bar_prefix_value()
+
+            tasks = self.node_tasks[command.node]
+            if isinstance(o, NewTaskCommand):
+                tasks[o.task_id] = o.task
+                if o.handle is not None:
+                    tasks.bind(o.task_id, o.handle)
+            else:
+                for i, task_id in enumerate(o.task_ids):
+                    tasks.define(task_id=task_id,
+                                 total=o.totals[i],
+                                 prefix=o.prefixes[i],
+                                 suffix=o.suffixes[i],
+                                 decimals=o.decimals[i],
+                                 bar_length=o.bar_lengths[i],
+                                 keep_alive=o.keep_alive[i],
+                                 display_time=o.display_time[i])
+                    if o.handles:
+                        tasks.bind(task_id, o.handles[i])
+            self.mark_changed(('node', command.node))
+
+            # Redraw
+            self.changes_made = True
+            self.redraw()
+
+        elif isinstance(o, UpdateProgressCommand):
+            tasks = self.node_tasks.get(command.node)
+            task_id = tasks.resolve(o.task_id) if tasks else None
+            if tasks and task_id in tasks and tasks.set_progress(task_id, o.progress, o.total):
+                self.mark_changed(('node', command.node))
+
+                # Redraw
+                self.changes_made = True
+                self.redraw()
+
+        elif isinstance(o, UpdateProgressBatchCommand):
+            tasks = self.node_tasks.get(command.node)
+            changed = False
+            for i, task_id in enumerate(o.task_ids if tasks else ()):
+                task_id = tasks.resolve(task_id)
+                if task_id in tasks and tasks.set_progress(task_id, o.progresses[i], o.totals[i] if o.totals else None):
+                    changed = True
+
+            if changed:
+                self.mark_changed(('node', command.node))
+
+                # Redraw
+                self.changes_made = True
+                self.redraw()
+
+        elif isinstance(o, FlushCommand):
+            self.flush()
+
+    def count_connection(self, command):
+        """
+        Counts a connection of a remote node that opened or closed.
+        :param command: The NodeConnectionCommand object.
+        """
+        count = self.node_connections.get(command.node, 0) + (1 if command.connected else -1)
+
+        if count > 0:
+            self.node_connections[command.node] = count
+            self.node_departures.pop(command.node, None)
+        else:
+            self.node_connections.pop(command.node, None)
+            self.node_departures[command.node] = millis()
+
+    def drop_departed_nodes(self):
+        """
+        Drops the tasks of the remote nodes whose last connection closed long enough ago.
+        """
+        now = millis()
+
+        for node, departure in list(self.node_departures.items()):
+            if now - departure < self.node_millis_to_removal:
+                continue
+
+            del self.node_departures[node]
+            self.drop_gauges(lambda pid: isinstance(pid, str) and pid.startswith('{}:'.format(node)))
+
+            if self.node_tasks.pop(node, None) is not None:
+                self.longest_bar_prefix_size = self.longest_bar_prefix_value()
+
+                # Redraw
+                self.changes_made = True
+                self.redraw()
 
     def longest_bar_prefix_value(self):
         """
         Calculates the longest progress bar prefix in order to keep all progress bars left-aligned.
         :return: Length of the longest task prefix in character unit.
         """
-        longest = 0
-        for key, t in self.tasks.items():
-            size = len(t.prefix)
+        # Tracked by the task table as tasks are defined and deleted
+        longest = self.tasks.longest_prefix
+
+        # Remote nodes are displayed as '[node]'
+        for node in self.node_tasks or ():
+            size = len(node) + 2
             if size > longest:
                 longest = size
 
@@ -339,15 +1378,31 @@ class MultiprocessingLogger(Process):
 
         return output
 
-    def print_progress_bar(self, task):
+    def print_progress_bar(self, task, percent=None, filled_length=None):
         """
         Draws a progress bar on screen based on the given information using standard output (stdout).
-        :param task: TaskProgress object containing all required information to draw a progress bar at the given state.
+        :param task:            TaskProgress object containing all required information to draw a progress bar at the
+                                given state.
+        :param percent:         [Optional] The completion percentage, if already computed for all tasks at once.
+        :param filled_length:   [Optional] The number of filled characters of the bar, if already computed.
         """
-        str_format = "{0:." + str(task.decimals) + "f}"
-        percents = str_format.format(100 * (task.progress / float(task.total)))
-        filled_length = int(round(task.bar_length * task.progress / float(task.total)))
-        bar = '█' * filled_length + '-' * (task.bar_length - filled_length)
+        if task.total is not None:
+            if percent is None:
+                percent = 100 * (task.progress / float(task.total))
+                filled_length = round(task.bar_length * task.progress / float(task.total))
+            str_format = "{0:." + str(task.decimals) + "f}"
+            percents = str_format.format(percent)
+            amount = '%3s %%' % percents
+            filled_length = int(filled_length)
+            bar = '█' * filled_length + '-' * (task.bar_length - filled_length)
+        else:
+            # Indeterminate bar: a block bouncing from one end to the other, along with the iteration count
+            amount = '{} it'.format(task.progress)
+            block_length = max(1, task.bar_length // 6)
+            course = max(1, task.bar_length - block_length)
+            position = int(millis() / 100) % (2 * course)
+            position = position if position < course else 2 * course - position
+            bar = '-' * position + '█' * block_length + '-' * (task.bar_length - block_length - position)
 
         # Build elapsed time if needed
         elapsed_time = None
@@ -368,19 +1423,148 @@ class MultiprocessingLogger(Process):
         time_container_pattern = '(%s)' if task.display_time and not task.end_time else '[%s]'
 
         if len(task.suffix) > 0 and task.display_time:
-            sys.stdout.write('\n {} |%s| %3s %% {} - %s'.format(prefix_pattern, time_container_pattern)
-                             % (task.prefix, bar, percents, elapsed_time, task.suffix))
+            sys.stdout.write('\n {} |%s| %s {} - %s'.format(prefix_pattern, time_container_pattern)
+                             % (task.prefix, bar, amount, elapsed_time, task.suffix))
         elif len(task.suffix) > 0 and not task.display_time:
-            sys.stdout.write('\n {} |%s| %3s %% - %s'.format(prefix_pattern)
-                             % (task.prefix, bar, percents, task.suffix))
+            sys.stdout.write('\n {} |%s| %s - %s'.format(prefix_pattern)
+                             % (task.prefix, bar, amount, task.suffix))
         elif task.display_time and not len(task.suffix) > 0:
-            sys.stdout.write('\n {} |%s| %3s %% {}'.format(prefix_pattern, time_container_pattern)
-                             % (task.prefix, bar, percents, elapsed_time))
+            sys.stdout.write('\n {} |%s| %s {}'.format(prefix_pattern, time_container_pattern)
+                             % (task.prefix, bar, amount, elapsed_time))
         else:
-            sys.stdout.write('\n {} |%s| %3s %%'.format(prefix_pattern)
-                             % (task.prefix, bar, percents))
+            sys.stdout.write('\n {} |%s| %s'.format(prefix_pattern)
+                             % (task.prefix, bar, amount))
+
+        sys.stdout.write('\n')
+        sys.stdout.flush()
+
+    def print_node_bar(self, node, tasks):
+        """
+        Draws the aggregate progress bar of a remote node, summing progress and totals of all its tasks.
+        :param node:    The name of the remote node.
+        :param tasks:   TaskTable of the tasks received from this node, identified by their remote id.
+        """
+        progress, total, completed = tasks.summary()
+        ratio = progress / float(total) if total else 1.
+
+        filled_length = int(round(60 * ratio))
+        bar = '█' * filled_length + '-' * (60 - filled_length)
+        prefix_pattern = '%{}s'.format(self.longest_bar_prefix_size)
+
+        sys.stdout.write('\n {} |%s| %3s %% - %s/%s tasks\n'.format(prefix_pattern)
+                         % ('[{}]'.format(node), bar, '{0:.0f}'.format(100 * ratio), completed, len(tasks)))
+        sys.stdout.flush()
+
+    def print_metrics_panel(self):
+        """
+        Draws one line per span with its number of calls and its duration percentiles, then one line per counter and
+        gauge with its value summed over all processes, left-aligned with the bars.
+        """
+        if not self.spans and not self.counters and not self.gauges:
+            return
+
+        name_pattern = '%{}s'.format(max([self.longest_bar_prefix_size] +
+                                         [len(name) for name in self.spans] +
+                                         [len(name) for name in self.counters] +
+                                         [len(name) for name in self.gauges]))
 
         sys.stdout.write('\n')
+        for name, (wall, cpu) in self.spans.items():
+            sys.stdout.write('\n {} | %8s calls | p50 %9s | p95 %9s | p99 %9s | cpu p50 %9s'.format(name_pattern)
+                             % (name,
+                                wall.count,
+                                format_duration(wall.percentile(50)),
+                                format_duration(wall.percentile(95)),
+                                format_duration(wall.percentile(99)),
+                                format_duration(cpu.percentile(50))))
+        for name, value in self.counters.items():
+            sys.stdout.write('\n {} | %14s total'.format(name_pattern) % (name, format_value(value)))
+        for name, values in self.gauges.items():
+            sys.stdout.write('\n {} | %14s in %s processes'.format(name_pattern)
+                             % (name, format_value(sum(values.values())), len(values)))
+        sys.stdout.write('\n')
+        sys.stdout.flush()
+
+    def mark_changed(self, key):
+        """
+        Remembers that a task, a remote node or a metric has to appear in the next progress summary of line mode.
+        :param key: Tuple ('task', task id), ('node', node name), ('span', span name), ('counter', counter name) or
+                    ('gauge', gauge name).
+        """
+        if self.line_mode:
+            self.changed_tasks[key] = None
+
+    def print_progress_lines(self):
+        """
+        Writes one summary line per task or remote node that changed since the last summary, if the minimum time
+        elapsed since the last summary is enough. Used in line mode instead of redrawing the whole screen, so that the
+        output grows with the number of changes and not with the number of frames.
+        """
+        if not self.changed_tasks or not millis() - self.refresh_timer > self.line_progress_interval_millis:
+            return
+        self.refresh_timer = millis()
+
+        prefix = self.get_format().replace('{L}', 'PROGRESS')
+
+        for kind, key in self.changed_tasks:
+            if kind == 'span':
+                wall, cpu = self.spans[key]
+                sys.stdout.write('{}\tSpan {}: {}\n'.format(prefix, key, self.span_summary(wall, cpu)))
+                continue
+
+            if kind == 'counter':
+                sys.stdout.write('{}\tCounter {}: {}\n'.format(prefix, key, format_value(self.counters[key])))
+                continue
+
+            if kind == 'gauge':
+                # Dropped since if every process that set it is gone
+                values = self.gauges.get(key, {})
+                sys.stdout.write('{}\tGauge {}: {}\n'.format(prefix, key, format_value(sum(values.values()))))
+                continue
+
+            if kind == 'node':
+                tasks = self.node_tasks.get(key)
+                if not tasks:
+                    continue
+
+                progress, total, completed = tasks.summary()
+                sys.stdout.write('{}\t[{}] {:.0f} % - {}/{} tasks\n'.format(prefix,
+                                                                          key,
+                                                                          100 * progress / float(total) if total
+                                                                          else 100,
+                                                                          completed,
+                                                                          len(tasks)))
+                continue
+
+            task = self.tasks.get(key)
+            if not task:
+                continue
+
+            if not task.begin_time:
+                task.begin_time = millis()
+
+            if task.total is None:
+                line = '{}\t{} {} it'.format(prefix, task.prefix, task.progress)
+            else:
+                str_format = '{0:.' + str(task.decimals) + 'f}'
+                line = '{}\t{} {} % ({}/{})'.format(prefix,
+                                                    task.prefix,
+                                                    str_format.format(100 * min(task.progress, task.total)
+                                                                      / float(task.total)),
+                                                    min(task.progress, task.total),
+                                                    task.total)
+            elapsed_time = self.millis_to_human_readable((task.end_time or millis()) - task.begin_time)
+            if task.display_time and elapsed_time:
+                line = '{} [{}]'.format(line, elapsed_time)
+            if len(task.suffix) > 0:
+                line = '{} - {}'.format(line, task.suffix)
+            sys.stdout.write(line + '\n')
+
+            # Completed tasks have been reported for the last time
+            if task.is_complete() and not task.keep_alive:
+                del self.tasks[key]
+
+        self.changed_tasks.clear()
         sys.stdout.flush()
 
     def redraw(self):
@@ -388,6 +1572,11 @@ class MultiprocessingLogger(Process):
         Clears the console and performs a complete redraw of all progress bars and then awaiting logger messages if the
         minimum time elapsed since the last redraw is enough.
         """
+        # Messages are written as they come in line mode, only progress is left to summarize
+        if self.line_mode:
+            self.changes_made = False
+            self.print_progress_lines()
+            return
 
         # Check if the refresh time lapse has elapsed and if a change requires to redraw
         lapse_since_last_refresh = millis() - self.refresh_timer
@@ -412,11 +1601,14 @@ class MultiprocessingLogger(Process):
             # If a task has been deleted, recalculate the maximum prefix length to keep progress bars aligned
             self.longest_bar_prefix_size = self.longest_bar_prefix_value()
 
-        for task_id, task in self.tasks.items():
+        # Percentages and fill lengths of all bars in one pass
+        percents, fills = self.tasks.completion()
+
+        for (task_id, task), percent, filled_length in zip(self.tasks.items(), percents, fills):
 
             # If a task has completed, force its value to its maximum to prevent progress bar overflow
             # Then start its timeout chrono
-            if task.progress >= task.total and not task.keep_alive:
+            if task.is_complete() and not task.keep_alive:
                 # Prevent bar overflow
                 task.progress = task.total
 
@@ -428,7 +1620,14 @@ class MultiprocessingLogger(Process):
                     self.to_delete.append(task_id)
 
             # Redraw the task's progress bar through standard output
-            self.print_progress_bar(task=task)
+            self.print_progress_bar(task=task, percent=percent, filled_length=filled_length)
+
+        # Draw one aggregate progress bar per remote node
+        for node, tasks in self.node_tasks.items():
+            self.print_node_bar(node=node, tasks=tasks)
+
+        # Draw the span durations below the bars
+        self.print_metrics_panel()
 
         # Keep space for future tasks if needed
         slots = self.permanent_progressbar_slots - len(self.tasks)
@@ -468,6 +1667,10 @@ class MultiprocessingLogger(Process):
         self.messages.append(message)
         self.changes_made = True
 
+        if self.line_mode:
+            sys.stdout.write(message)
+            sys.stdout.flush()
+
         # Redraw
         self.redraw()
 
@@ -485,6 +1688,10 @@ class MultiprocessingLogger(Process):
         self.exceptions.insert(0, stacktrace)
         self.changes_made = True
 
+        if self.line_mode:
+            sys.stderr.write(stacktrace)
+            sys.stderr.flush()
+
         # Redraw
         self.redraw()
 
@@ -494,12 +1701,35 @@ class MultiprocessingLogger(Process):
         to be sure that a message or progress has been updated in display at a given moment in code, like when you are
         exiting an application or doing some kind of synchronized operations.
         """
+        self.write_repeats()
+        self.write_suppressed()
+        self.release_messages()
         self.refresh_timer = 0
 
         # Redraw
         self.changes_made = True
         self.redraw()
 
+        for sink in self.sinks:
+            sink.flush()
+
+    def acknowledge(self, barrier):
+        """
+        Flushes every file handler, then acknowledges a flush barrier so that the process waiting for it resumes.
+        Everything the waiting process sent before the barrier has been applied at this point, since the commands of a
+        process are received in order, through each priority lane.
+        :param barrier: Identifier of the flush barrier.
+        """
+        for handler in self.log.handlers:
+            handler.flush()
+
+        if self.flush_acks is None:
+            return
+
+        with self.flush_condition:
+            self.flush_acks[barrier % len(self.flush_acks)] = barrier
+            self.flush_condition.notify_all()
+
     def now(self):
         """
         Gets the current timestamp.
@@ -530,6 +1760,9 @@ class MultiprocessingLogger(Process):
         :param command: The command object that holds all the necessary information from the remote process.
         """
         self.tasks[command.task_id] = command.task
+        if command.handle is not None:
+            self.tasks.bind(command.task_id, command.handle)
+        self.mark_changed(('task', command.task_id))
 
         self.longest_bar_prefix_size = self.longest_bar_prefix_value()
 
@@ -547,12 +1780,88 @@ class MultiprocessingLogger(Process):
         immediately (may produce flickering) then call 'flush' method.
         :param command: The command object that holds all the necessary information from the remote process.
         """
-        if command.task_id in self.tasks and self.tasks[command.task_id].set_progress(command.progress):
+        # Sinks are given the task id instead of the handle the update may carry
+        command.task_id = self.tasks.resolve(command.task_id)
+
+        if command.task_id in self.tasks and self.tasks.set_progress(command.task_id, command.progress, command.total):
+            self.mark_changed(('task', command.task_id))
+
+            for sink in self.sinks:
+                sink.emit_progress(command=command, task=self.tasks[command.task_id])
+
+            # Redraw
+            self.changes_made = True
+            self.redraw()
+
+    def set_tasks(self, command):
+        """
+        Defines many progress bars at once, recomputing the layout and deciding to redraw only once.
+        :param command: The command object that holds all the necessary information from the remote process.
+        """
+        for i, task_id in enumerate(command.task_ids):
+            self.tasks.define(task_id=task_id,
+                              total=command.totals[i],
+                              prefix=command.prefixes[i],
+                              suffix=command.suffixes[i],
+                              decimals=command.decimals[i],
+                              bar_length=command.bar_lengths[i],
+                              keep_alive=command.keep_alive[i],
+                              display_time=command.display_time[i])
+            if command.handles:
+                self.tasks.bind(task_id, command.handles[i])
+            self.mark_changed(('task', task_id))
 
+        self.longest_bar_prefix_size = self.longest_bar_prefix_value()
+
+        # Redraw
+        self.changes_made = True
+        self.redraw()
+
+    def update_many(self, command):
+        """
+        Defines the current progress of many progress bars at once, deciding to redraw only once. Unknown ids and
+        unchanged progress are ignored.
+        :param command: The command object that holds all the necessary information from the remote process.
+        """
+        changed = False
+
+        for i, task_id in enumerate(command.task_ids):
+            task_id = self.tasks.resolve(task_id)
+            total = command.totals[i] if command.totals else None
+
+            if task_id not in self.tasks or not self.tasks.set_progress(task_id, command.progresses[i], total):
+                continue
+
+            changed = True
+            self.mark_changed(('task', task_id))
+
+            if self.sinks:
+                # Sinks receive each change as a regular update
+                update = UpdateProgressCommand(task_id=task_id,
+                                               progress=command.progresses[i],
+                                               pid=command.pid,
+                                               timestamp=command.timestamp,
+                                               total=total)
+                for sink in self.sinks:
+                    sink.emit_progress(command=update, task=self.tasks[task_id])
+
+        if changed:
             # Redraw
             self.changes_made = True
             self.redraw()
 
+    @staticmethod
+    def sampling_note(command):
+        """
+        Tells how many messages a sampled message stands for in files.
+        :param command: The LogMessageCommand object.
+        :return:        The text to append to the message, empty if it has not been sampled.
+        """
+        if command.file_weight == 1:
+            return ''
+
+        return ' (sampled, weight {:g})'.format(command.file_weight)
+
     def debug(self, command):
         """
         Posts a debug message adding a timestamp and logging level to it for both file and console handlers.
@@ -562,7 +1871,7 @@ class MultiprocessingLogger(Process):
         immediately (may produce flickering) then call 'flush' method.
         :param command: The command object that holds all the necessary information from the remote process.
         """
-        if self.console_level == logging.DEBUG:
+        if command.console_weight and self.console_level == logging.DEBUG:
 
             message = self.get_format()
             message = message.replace('{L}', 'DEBUG')
@@ -574,7 +1883,10 @@ class MultiprocessingLogger(Process):
             self.changes_made = True
             self.redraw()
 
-        self.log.debug('\t{}'.format(command.text))
+        if command.file_weight:
+            self.write_message(level=logging.DEBUG,
+                               text='\t{}{}'.format(command.text, self.sampling_note(command)),
+                               command=command)
 
     def info(self, command):
         """
@@ -585,7 +1897,7 @@ class MultiprocessingLogger(Process):
         immediately (may produce flickering) then call 'flush' method.
         :param command: The command object that holds all the necessary information from the remote process.
         """
-        if (self.console_level == logging.DEBUG
+        if command.console_weight and (self.console_level == logging.DEBUG
                 or self.console_level == logging.INFO):
 
             message = self.get_format()
@@ -598,7 +1910,10 @@ class MultiprocessingLogger(Process):
             self.changes_made = True
             self.redraw()
 
-        self.log.info('\t\t{}'.format(command.text))
+        if command.file_weight:
+            self.write_message(level=logging.INFO,
+                               text='\t\t{}{}'.format(command.text, self.sampling_note(command)),
+                               command=command)
 
     def warning(self, command):
         """
@@ -609,7 +1924,7 @@ class MultiprocessingLogger(Process):
         immediately (may produce flickering) then call 'flush' method.
         :param command: The command object that holds all the necessary information from the remote process.
         """
-        if (self.console_level == logging.DEBUG
+        if command.console_weight and (self.console_level == logging.DEBUG
                 or self.console_level == logging.INFO
                 or self.console_level == logging.WARNING):
 
@@ -623,7 +1938,10 @@ class MultiprocessingLogger(Process):
             self.changes_made = True
             self.redraw()
 
-        self.log.warning('\t{}'.format(command.text))
+        if command.file_weight:
+            self.write_message(level=logging.WARNING,
+                               text='\t{}{}'.format(command.text, self.sampling_note(command)),
+                               command=command)
 
     def error(self, command):
         """
@@ -634,7 +1952,7 @@ class MultiprocessingLogger(Process):
         immediately (may produce flickering) then call 'flush' method.
         :param command: The command object that holds all the necessary information from the remote process.
         """
-        if (self.console_level == logging.DEBUG
+        if command.console_weight and (self.console_level == logging.DEBUG
                 or self.console_level == logging.INFO
                 or self.console_level == logging.WARNING
                 or self.console_level == logging.ERROR):
@@ -649,7 +1967,10 @@ class MultiprocessingLogger(Process):
             self.changes_made = True
             self.redraw()
 
-        self.log.error('\t{}'.format(command.text))
+        if command.file_weight:
+            self.write_message(level=logging.ERROR,
+                               text='\t{}{}'.format(command.text, self.sampling_note(command)),
+                               command=command)
 
     def critical(self, command):
         """
@@ -660,7 +1981,7 @@ class MultiprocessingLogger(Process):
         immediately (may produce flickering) then call 'flush' method.
         :param command: The command object that holds all the necessary information from the remote process.
         """
-        if (self.console_level == logging.DEBUG
+        if command.console_weight and (self.console_level == logging.DEBUG
                 or self.console_level == logging.INFO
                 or self.console_level == logging.WARNING
                 or self.console_level == logging.ERROR
@@ -676,25 +1997,224 @@ class MultiprocessingLogger(Process):
             self.changes_made = True
             self.redraw()
 
-        self.log.critical('\t{}'.format(command.text))
+        if command.file_weight:
+            self.write_message(level=logging.CRITICAL,
+                               text='\t{}{}'.format(command.text, self.sampling_note(command)),
+                               command=command)
 
     def throw(self, command):
         """
-        Posts an exception's stacktrace string as returned by 'traceback.format_exc()' in an 'except' block.
+        Posts an exception's stacktrace string as returned by 'traceback.format_exc()' in an 'except' block. Occurrences
+        of an already known stacktrace only update its displayed count.
+        :param command: The command object that holds all the necessary information from the remote process.
+        """
+        digest = command.digest or stacktrace_digest(command.stacktrace)
+        entry = self.stacktraces.get(digest)
+        if entry is None:
+            entry = self.stacktraces[digest] = UniqueStacktrace(digest=digest)
+
+        entry.add_occurrence(pid=command.pid, timestamp=command.timestamp or time.time())
+
+        if entry.stacktrace is not None:
+            # Sent in full by a process that did not know it yet
+            self.log_stacktrace_occurrence(entry=entry, pid=command.pid, process_title=command.process_title,
+                                           timestamp=command.timestamp)
+        else:
+            # References may have arrived first, they are counted in this first display
+            entry.stacktrace = command.stacktrace
+            entry.process_title = command.process_title
+            entry.pid = command.pid
+
+            self.write_message(level=logging.CRITICAL,
+                               text='\t[Process {}{}] #{:016x}:\n{}'.format(command.pid,
+                                                                          ' - {}'.format(command.process_title)
+                                                                          if command.process_title else '',
+                                                                          digest,
+                                                                          command.stacktrace),
+                               command=command,
+                               exception=True)
+
+        self.display_stacktrace(entry=entry)
+
+    def throw_reference(self, command):
+        """
+        Counts one more occurrence of a stacktrace whose full text has already been sent by some process. If the full
+        text has not been received yet, the occurrence is counted when it is.
         :param command: The command object that holds all the necessary information from the remote process.
         """
-        exception_message = '[Process {}{}]:\n{}'.format(command.pid, ' - {}'
-                                                        .format(command.process_title) if command.process_title else '',
-                                                        command.stacktrace)
+        entry = self.stacktraces.get(command.digest)
+        if entry is None:
+            entry = self.stacktraces[command.digest] = UniqueStacktrace(digest=command.digest)
+
+        entry.add_occurrence(pid=command.pid, timestamp=command.timestamp or time.time())
+        self.log_stacktrace_occurrence(entry=entry, pid=command.pid, process_title=command.process_title,
+                                       timestamp=command.timestamp)
+
+        if entry.stacktrace is not None:
+            self.display_stacktrace(entry=entry)
+
+    def log_stacktrace_occurrence(self, entry, pid, process_title, timestamp=None):
+        """
+        Writes a short line to the file handlers and sinks for a repeated occurrence of a stacktrace, referring to the
+        full text by its digest.
+        :param entry:           The UniqueStacktrace object.
+        :param pid:             The pid of the process that threw the exception.
+        :param process_title:   The title of the process that threw the exception.
+        :param timestamp:       [Optional] The time of the exception in seconds since the epoch.
+        """
+        text = '[Process {}{}]: stacktrace #{:016x} (occurrence {})'.format(pid, ' - {}'.format(process_title)
+                                                                            if process_title else '',
+                                                                            entry.digest,
+                                                                            entry.count)
+        self.write_message(level=logging.CRITICAL,
+                           text='\t{}'.format(text),
+                           command=LogMessageCommand(text=text, level=logging.CRITICAL, pid=pid, timestamp=timestamp))
+
+    def display_stacktrace(self, entry):
+        """
+        Displays a unique stacktrace below the messages, or updates its occurrence count if it is still displayed.
+        :param entry: The UniqueStacktrace object.
+        """
+        exception_message = '[Process {}{}]'.format(entry.pid, ' - {}'.format(entry.process_title)
+                                                    if entry.process_title else '')
+        if entry.count > 1:
+            exception_message = '{} ({} times in {} processes, last at {})'.format(exception_message,
+                                                                                  entry.count,
+                                                                                  len(entry.pids),
+                                                                                  time.strftime(
+                                                                                      '%H:%M:%S',
+                                                                                      time.localtime(entry.last_seen)))
+        exception_message = '{}:\n{}'.format(exception_message, entry.stacktrace)
 
         message = self.get_format()
         message = message.replace('{L}', 'EXCEPTION')
         message = '{}\t{}\n'.format(message, exception_message)
 
-        self.append_exception(message)
+        if entry.message in self.exceptions:
+            # Update in place rather than pushing other exceptions away
+            self.exceptions[self.exceptions.index(entry.message)] = message
+            entry.message = message
+        elif entry.message is None or not self.line_mode:
+            # In line mode, the full text is written only once
+            entry.message = message
+            self.append_exception(message)
+
+        # Redraw
+        self.changes_made = True
+        self.redraw()
+
+    def log_stacktrace_summary(self):
+        """
+        Writes to the file handlers how many times each repeated stacktrace occurred, referring to it by its digest.
+        """
+        for digest, entry in (self.stacktraces or {}).items():
+            if entry.count > 1:
+                self.log.warning('\tStacktrace #{:016x} occurred {} times in {} processes from {} to {}'
+                                 .format(digest,
+                                         entry.count,
+                                         len(entry.pids),
+                                         time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.first_seen)),
+                                         time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.last_seen))))
+
+    def metrics(self, command):
+        """
+        Merges the spans and counters aggregated by a process into those of all processes, and stores its gauges.
+        :param command: The command object that holds all the necessary information from the remote process.
+        """
+        for name, (wall, cpu) in command.spans.items():
+            if name not in self.spans:
+                self.spans[name] = (Histogram(), Histogram())
+
+            self.spans[name][0].merge(wall)
+            self.spans[name][1].merge(cpu)
+            self.mark_changed(('span', name))
+
+        for name, delta in command.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + delta
+            self.mark_changed(('counter', name))
+
+        for name, value in command.gauges.items():
+            if name not in self.gauges:
+                self.gauges[name] = OrderedDict()
+
+            self.gauges[name][command.pid] = value
+            self.mark_changed(('gauge', name))
+
+        # Commands of older remote nodes and sessions have no such attribute
+        if getattr(command, 'exited', False):
+            self.drop_gauges(lambda pid: pid == command.pid)
+
+        self.metrics_changed = True
 
         # Redraw
         self.changes_made = True
         self.redraw()
 
-        self.log.critical('\t{}'.format(exception_message))
+    def drop_gauges(self, dropped):
+        """
+        Drops the gauge values of processes that are gone, then the gauges left without any value.
+        :param dropped: Function telling whether the values set by a pid, or by a 'node:pid' string for the processes of
+                        remote nodes, are dropped.
+        """
+        for name, values in list(self.gauges.items()):
+            pids = [pid for pid in values if dropped(pid)]
+            if not pids:
+                continue
+
+            for pid in pids:
+                del values[pid]
+            if not values:
+                del self.gauges[name]
+
+            self.mark_changed(('gauge', name))
+            self.metrics_changed = True
+
+    @staticmethod
+    def span_summary(wall, cpu):
+        """
+        Describes the durations of a span in one line.
+        :param wall:    Histogram of the wall durations.
+        :param cpu:     Histogram of the CPU durations.
+        :return:        Summary string such as '120 calls, p50 1.2 ms, p95 3.4 ms, p99 8.0 ms, cpu p50 1.1 ms'.
+        """
+        return '{} calls, p50 {}, p95 {}, p99 {}, cpu p50 {}'.format(wall.count,
+                                                                       format_duration(wall.percentile(50)),
+                                                                       format_duration(wall.percentile(95)),
+                                                                       format_duration(wall.percentile(99)),
+                                                                       format_duration(cpu.percentile(50)))
+
+    def log_metrics_summary(self):
+        """
+        Writes to the file handlers the final durations of each span: percentiles, totals and histogram buckets. Then
+        the final value of each counter and gauge.
+        """
+        for name, (wall, cpu) in (self.spans or {}).items():
+            self.log.info('\tSpan {}: {}, max {}, total {}, cpu total {}'.format(name,
+                                                                                  self.span_summary(wall, cpu),
+                                                                                  format_duration(wall.max),
+                                                                                  format_duration(wall.sum),
+                                                                                  format_duration(cpu.sum)))
+            self.log.info('\tSpan {} wall histogram: {}'.format(name, ', '.join('<= {}: {}'.format(
+                format_duration(bound), bucket_count) for bound, bucket_count in wall.items())))
+        for name, value in (self.counters or {}).items():
+            self.log.info('\tCounter {}: {}'.format(name, format_value(value)))
+        for name, values in (self.gauges or {}).items():
+            self.log.info('\tGauge {}: {} in {} processes'.format(name,
+                                                                   format_value(sum(values.values())),
+                                                                   len(values)))
+
+    def write_metrics_textfile(self):
+        """
+        Rewrites the Prometheus textfile with the current metrics, if it is configured.
+        """
+        self.metrics_textfile_timer = millis()
+
+        if not self.metrics_textfile or not self.metrics_changed:
+            return
+        self.metrics_changed = False
+
+        try:
+            write_textfile(filename=self.metrics_textfile,
+                           text=prometheus_text(counters=self.counters, gauges=self.gauges, spans=self.spans))
+        except OSError as e:
+            self.log.error('\tCannot write metrics to \'{}\': {}'.format(self.metrics_textfile, e))
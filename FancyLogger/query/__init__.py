@@ -0,0 +1,219 @@
+#!/bin/env/python
+# coding: utf-8
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import sys
+import time
+from datetime import datetime
+
+from ..sinks import INDEX_VERSION, RECORD_HEADER, segment_filenames
+
+
+class Segment(object):
+    """
+    Memory-mapped binary log segment written by BinaryIndexedSink, along with its sidecar index. Records written after
+    the index, or all of them if the segment has no index of the current version yet, are indexed by reading their
+    headers only.
+    """
+
+    def __init__(self, filename):
+        """
+        Maps a segment and loads its index.
+        :param filename: Path of the segment.
+        """
+        super(Segment, self).__init__()
+
+        self.filename = filename
+        self.file = open(filename, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+        try:
+            with open('{}.idx'.format(filename)) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = None
+
+        if not isinstance(self.index, dict) or self.index.get('version') != INDEX_VERSION:
+            self.index = {'version': INDEX_VERSION, 'size': 0, 'records': 0, 'time_index': []}
+
+        self.index_tail(size)
+
+    def index_tail(self, size):
+        """
+        Indexes the complete records found after the indexed ones, by reading their headers only.
+        :param size: The size in bytes of the segment.
+        """
+        offset = self.index['size']
+
+        while offset + RECORD_HEADER.size <= size:
+            record_size, timestamp, level, pid, _ = RECORD_HEADER.unpack_from(self.data, offset)
+            if not record_size or offset + record_size > size:
+                break
+
+            # One tail block per record keeps the index exact
+            self.index['time_index'].append([offset, timestamp, timestamp, [level], [pid]])
+            offset += record_size
+
+        self.index['size'] = offset
+
+    def header(self, offset):
+        """
+        Reads a record header.
+        :param offset:  The offset of the record.
+        :return:        Tuple (size, timestamp, level, pid, task id size).
+        """
+        return RECORD_HEADER.unpack_from(self.data, offset)
+
+    def decode(self, offset):
+        """
+        Decodes a whole record.
+        :param offset:  The offset of the record.
+        :return:        Tuple (timestamp, level, pid, task id, text).
+        """
+        size, timestamp, level, pid, task_id_size = self.header(offset)
+        start = offset + RECORD_HEADER.size
+        task_id = bytes(self.data[start:start + task_id_size]).decode('utf8') if task_id_size else None
+        text = bytes(self.data[start + task_id_size:offset + size]).decode('utf8', 'replace')
+
+        return timestamp, level, pid, task_id, text
+
+    def candidates(self, start=None, end=None, levels=None, pids=None):
+        """
+        Gives the offsets of the records of the blocks that may match, skipping the blocks whose time range does not
+        overlap the given one, or in which none of the given levels or pids appears.
+        :param start:   [Optional] Minimum timestamp.
+        :param end:     [Optional] Maximum timestamp.
+        :param levels:  [Optional] Iterable of accepted levels.
+        :param pids:    [Optional] Iterable of accepted pids.
+        :return:        Sorted list of offsets.
+        """
+        levels = None if levels is None else set(levels)
+        pids = None if pids is None else set(pids)
+
+        blocks = self.index['time_index']
+        offsets = []
+        for i, (offset, block_start, block_end, block_levels, block_pids) in enumerate(blocks):
+            if (start is not None and block_end < start) or (end is not None and block_start > end):
+                continue
+            if (levels is not None and levels.isdisjoint(block_levels)) \
+                    or (pids is not None and pids.isdisjoint(block_pids)):
+                continue
+
+            block_limit = blocks[i + 1][0] if i + 1 < len(blocks) else self.index['size']
+            while offset < block_limit:
+                offsets.append(offset)
+                offset += self.header(offset)[0]
+
+        return offsets
+
+    def query(self, start=None, end=None, levels=None, pids=None):
+        """
+        Decodes the records matching all the given criteria. Other records only have their header read.
+        :param start:   [Optional] Minimum timestamp.
+        :param end:     [Optional] Maximum timestamp.
+        :param levels:  [Optional] Iterable of accepted levels.
+        :param pids:    [Optional] Iterable of accepted pids.
+        :return:        Generator of tuples (timestamp, level, pid, task id, text).
+        """
+        levels = None if levels is None else set(levels)
+        pids = None if pids is None else set(pids)
+
+        for offset in self.candidates(start=start, end=end, levels=levels, pids=pids):
+            _, timestamp, level, pid, _ = self.header(offset)
+            if (start is None or timestamp >= start) and (end is None or timestamp <= end) \
+                    and (levels is None or level in levels) and (pids is None or pid in pids):
+                yield self.decode(offset)
+
+    def close(self):
+        """
+        Unmaps the segment.
+        """
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+
+def query(filename, start=None, end=None, levels=None, pids=None):
+    """
+    Queries all the segments of a binary log, oldest first.
+    :param filename:    The base path given to BinaryIndexedSink.
+    :param start:       [Optional] Minimum timestamp in seconds since the epoch.
+    :param end:         [Optional] Maximum timestamp in seconds since the epoch.
+    :param levels:      [Optional] Iterable of accepted levels (from standard logging module).
+    :param pids:        [Optional] Iterable of accepted pids.
+    :return:            Generator of tuples (timestamp, level, pid, task id, text).
+    """
+    for filename in segment_filenames(filename):
+        segment = Segment(filename)
+        try:
+            for record in segment.query(start=start, end=end, levels=levels, pids=pids):
+                yield record
+        finally:
+            segment.close()
+
+
+def parse_time(value):
+    """
+    Parses a command line time.
+    :param value:   Seconds since the epoch, or an ISO 8601 date and time in local time.
+    :return:        Seconds since the epoch.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def parse_level(value):
+    """
+    Parses a command line level.
+    :param value:   A level name such as ERROR, or a level number.
+    :return:        The level number.
+    """
+    if value.isdigit():
+        return int(value)
+
+    level = logging.getLevelName(value.upper())
+    if not isinstance(level, int):
+        raise argparse.ArgumentTypeError('unknown level: {}'.format(value))
+
+    return level
+
+
+def main(arguments=None):
+    """
+    Command line entry point: 'python -m FancyLogger.query'.
+    :param arguments: [Optional] The command line arguments, defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(prog='python -m FancyLogger.query',
+                                     description='Queries binary logs written by BinaryIndexedSink.')
+    parser.add_argument('filename', help='base path given to BinaryIndexedSink')
+    parser.add_argument('--start', type=parse_time, help='minimum time, epoch seconds or ISO 8601')
+    parser.add_argument('--end', type=parse_time, help='maximum time, epoch seconds or ISO 8601')
+    parser.add_argument('--level', type=parse_level, action='append', help='accepted level, may be repeated')
+    parser.add_argument('--min-level', type=parse_level, help='minimum level')
+    parser.add_argument('--pid', type=int, action='append', help='accepted pid, may be repeated')
+    parser.add_argument('--time-format', default='%Y-%m-%d %H:%M:%S', help='strftime format of the output')
+    args = parser.parse_args(arguments)
+
+    levels = args.level
+    if args.min_level is not None:
+        levels = [level for level in (levels or range(256)) if level >= args.min_level]
+
+    for timestamp, level, pid, task_id, text in query(filename=args.filename,
+                                                      start=args.start,
+                                                      end=args.end,
+                                                      levels=levels,
+                                                      pids=args.pid):
+        sys.stdout.write('{}.{:03d} [{}] [{}]{}\t{}\n'.format(time.strftime(args.time_format,
+                                                                           time.localtime(timestamp)),
+                                                             int(timestamp * 1000) % 1000,
+                                                             logging.getLevelName(level),
+                                                             pid,
+                                                             ' [{}]'.format(task_id) if task_id else '',
+                                                             text))
@@ -0,0 +1,106 @@
+#!/bin/env/python
+# coding: utf-8
+
+import copy
+import struct
+import time
+import zlib
+
+import dill
+
+from ..commands import *
+
+RECORD_HEADER = struct.Struct('<BdI')
+"Header of every session record: its kind, the time it was recorded in seconds since the epoch and its size in bytes."
+COMMAND = 0
+"Kind of the records holding a command, serialized as it was received by the logger process."
+KEYFRAME = 1
+"Kind of the records holding the compressed state of the logger process."
+SKIPPED_COMMANDS = (ExitCommand, RegisterRingCommand)
+"Commands that have nothing to do with what is displayed."
+STATE_ATTRIBUTES = ('tasks',
+                    'to_delete',
+                    'node_tasks',
+                    'messages',
+                    'exceptions',
+                    'stacktraces',
+                    'spans',
+                    'counters',
+                    'gauges',
+                    'longest_bar_prefix_size',
+                    'permanent_progressbar_slots',
+                    'redraw_frequency_millis',
+                    'console_level',
+                    'task_millis_to_removal',
+                    'console_format_strftime',
+                    'console_format')
+"Attributes of the logger process that are enough to draw a frame."
+
+
+class SessionRecorder(object):
+    """
+    Records the commands received by the logger process into a compact timestamped file, along with periodic keyframes
+    of the displayed state, so that a session can be replayed from any point in time without replaying it from the
+    start.
+    """
+
+    def __init__(self, filename, keyframe_interval_millis=10000):
+        """
+        Opens the session file. Must be done from the logger process.
+        :param filename:                    Path of the session file.
+        :param keyframe_interval_millis:    [Optional] Minimum time lapse in milliseconds between two keyframes.
+        """
+        super(SessionRecorder, self).__init__()
+
+        self.stream = open(filename, 'wb')
+        self.keyframe_interval_millis = keyframe_interval_millis
+        self.last_keyframe = None
+
+    def write(self, kind, payload):
+        """
+        Appends a record.
+        :param kind:    Either COMMAND or KEYFRAME.
+        :param payload: The record bytes.
+        """
+        self.stream.write(RECORD_HEADER.pack(kind, time.time(), len(payload)))
+        self.stream.write(payload)
+
+    def keyframe(self, logger):
+        """
+        Records the state of the logger process.
+        :param logger: The MultiprocessingLogger instance.
+        """
+        self.last_keyframe = time.time() * 1000
+        self.write(KEYFRAME, zlib.compress(dill.dumps({name: getattr(logger, name) for name in STATE_ATTRIBUTES})))
+        self.stream.flush()
+
+    def record(self, serialized, command, logger):
+        """
+        Records a command before it is applied, preceded by a keyframe if the last one is old enough.
+        :param serialized:  The command as it was received.
+        :param command:     The deserialized command.
+        :param logger:      The MultiprocessingLogger instance.
+        """
+        if isinstance(command, SKIPPED_COMMANDS):
+            return
+
+        if self.last_keyframe is None or time.time() * 1000 - self.last_keyframe >= self.keyframe_interval_millis:
+            self.keyframe(logger)
+
+        if isinstance(command, SetConfigurationCommand) and (command.file_handlers or command.sinks):
+            # Outputs are not replayed, and may not even be deserializable elsewhere
+            command = copy.copy(command)
+            command.file_handlers = []
+            command.sinks = None
+            serialized = dill.dumps(command)
+
+        self.write(COMMAND, serialized)
+
+        if isinstance(command, FlushCommand):
+            self.stream.flush()
+
+    def close(self):
+        """
+        Writes the buffered records and closes the file.
+        """
+        self.stream.close()
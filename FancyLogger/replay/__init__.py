@@ -0,0 +1,220 @@
+#!/bin/env/python
+# coding: utf-8
+
+import argparse
+import bisect
+import logging
+import mmap
+import os
+import sys
+import time
+import zlib
+from collections import OrderedDict
+
+import dill
+
+from ..commands import decode_command
+from ..processing import MultiprocessingLogger
+from ..recording import KEYFRAME, RECORD_HEADER
+from ..tasks import TaskTable
+
+
+class ReplayLogger(MultiprocessingLogger):
+    """
+    Renders a recorded session in the current process, using the regular drawing code of the logger process.
+    """
+
+    def __init__(self):
+        super(ReplayLogger, self).__init__(queue=None,
+                                           message_number=0,
+                                           exception_number=0,
+                                           permanent_progressbar_slots=0,
+                                           redraw_frequency_millis=0,
+                                           console_level=logging.INFO,
+                                           task_millis_to_removal=0,
+                                           console_format_strftime='',
+                                           console_format='',
+                                           file_handlers=[])
+
+        # Nothing is written to files while replaying
+        self.log = logging.Logger('FancyLogger.replay')
+        self.log.disabled = True
+        self.sinks = []
+        self.node_tasks = OrderedDict()
+        self.node_connections = {}
+        self.node_departures = {}
+        self.stacktraces = OrderedDict()
+        self.spans = OrderedDict()
+        self.counters = OrderedDict()
+        self.gauges = OrderedDict()
+        self.seeking = False
+
+    def restore(self, state):
+        """
+        Restores the state recorded in a keyframe.
+        :param state: The keyframe state.
+        """
+        for name, value in state.items():
+            setattr(self, name, value)
+
+        # Sessions recorded before tasks were stored in a table
+        if not isinstance(self.tasks, TaskTable):
+            tasks = TaskTable()
+            for task_id, task in self.tasks.items():
+                tasks[task_id] = task
+            self.tasks = tasks
+
+        self.refresh_timer = 0
+
+    def redraw(self):
+        # Intermediate frames are not drawn while seeking
+        if not self.seeking:
+            super(ReplayLogger, self).redraw()
+
+
+class SessionPlayer(object):
+    """
+    Reads a session file written by SessionRecorder. The file is memory-mapped and only record headers are read
+    upfront; keyframes are decoded when seeking and commands when they are applied.
+    """
+
+    def __init__(self, filename):
+        """
+        Maps a session file and indexes its records.
+        :param filename: Path of the session file.
+        """
+        super(SessionPlayer, self).__init__()
+
+        self.file = open(filename, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+        self.records = []
+        self.keyframes = []
+
+        offset = 0
+        while offset + RECORD_HEADER.size <= size:
+            kind, timestamp, record_size = RECORD_HEADER.unpack_from(self.data, offset)
+            start = offset + RECORD_HEADER.size
+            if start + record_size > size:
+                # Last record of a session that has not been closed
+                break
+
+            if kind == KEYFRAME:
+                self.keyframes.append(len(self.records))
+            self.records.append((kind, timestamp, start, record_size))
+            offset = start + record_size
+
+        self.keyframe_times = [self.records[i][1] for i in self.keyframes]
+        self.start_time = self.records[0][1] if self.records else 0
+        self.end_time = self.records[-1][1] if self.records else 0
+
+    def payload(self, index):
+        """
+        Gives the bytes of a record.
+        :param index:   The index of the record.
+        :return:        The record bytes.
+        """
+        kind, timestamp, start, size = self.records[index]
+
+        return bytes(self.data[start:start + size])
+
+    def close(self):
+        """
+        Unmaps the session file.
+        """
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def seek(self, logger, timestamp):
+        """
+        Brings a logger to its state at a given time, from the closest keyframe before it, without drawing.
+        :param logger:      The ReplayLogger instance.
+        :param timestamp:   Time in seconds since the epoch.
+        :return:            The index of the first record after that time.
+        """
+        keyframe = bisect.bisect_right(self.keyframe_times, timestamp) - 1
+        index = self.keyframes[max(keyframe, 0)] if self.keyframes else 0
+
+        logger.seeking = True
+        try:
+            while index < len(self.records) and (self.records[index][1] <= timestamp or index == 0):
+                self.apply(logger, index)
+                index += 1
+        finally:
+            logger.seeking = False
+
+        return index
+
+    def apply(self, logger, index):
+        """
+        Applies a record to a logger.
+        :param logger:  The ReplayLogger instance.
+        :param index:   The index of the record.
+        """
+        if self.records[index][0] == KEYFRAME:
+            logger.restore(dill.loads(zlib.decompress(self.payload(index))))
+        else:
+            logger.process_command(decode_command(self.payload(index)))
+
+    def frame(self, offset):
+        """
+        Draws the frame displayed at a given time.
+        :param offset: Time in seconds since the beginning of the session.
+        """
+        logger = ReplayLogger()
+        self.seek(logger, self.start_time + offset)
+        logger.flush()
+
+    def play(self, speed=1., offset=0.):
+        """
+        Replays the session, drawing frames as the logger process did.
+        :param speed:   [Optional] Playback speed factor.
+        :param offset:  [Optional] Time in seconds since the beginning of the session to start from.
+        """
+        logger = ReplayLogger()
+        start_time = self.start_time + offset
+        index = self.seek(logger, start_time)
+        logger.flush()
+
+        clock = time.time()
+        while index < len(self.records):
+            delay = (self.records[index][1] - start_time) / speed - (time.time() - clock)
+            if delay > 0:
+                time.sleep(delay)
+
+            self.apply(logger, index)
+            index += 1
+
+        logger.flush()
+
+
+def main(arguments=None):
+    """
+    Command line entry point: 'python -m FancyLogger.replay'.
+    :param arguments: [Optional] The command line arguments, defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(prog='python -m FancyLogger.replay',
+                                     description='Replays sessions recorded by the logger process.')
+    parser.add_argument('filename', help='session file given as \'record_filename\'')
+    parser.add_argument('--speed', type=float, default=1., help='playback speed factor')
+    parser.add_argument('--start', type=float, default=0., help='seconds since the beginning of the session to '
+                                                               'start from')
+    parser.add_argument('--at', type=float, help='only draw the frame displayed at this many seconds since the '
+                                                 'beginning of the session')
+    parser.add_argument('--info', action='store_true', help='only print the session duration and record counts')
+    args = parser.parse_args(arguments)
+
+    player = SessionPlayer(args.filename)
+    try:
+        if args.info:
+            sys.stdout.write('{} records, {} keyframes, {:.3f} seconds\n'.format(len(player.records),
+                                                                                 len(player.keyframes),
+                                                                                 player.end_time - player.start_time))
+        elif args.at is not None:
+            player.frame(offset=args.at)
+        else:
+            player.play(speed=args.speed, offset=args.start)
+    finally:
+        player.close()
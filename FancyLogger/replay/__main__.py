@@ -0,0 +1,6 @@
+#!/bin/env/python
+# coding: utf-8
+
+from . import main
+
+main()
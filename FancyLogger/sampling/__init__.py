@@ -0,0 +1,71 @@
+#!/bin/env/python
+# coding: utf-8
+
+import logging
+from multiprocessing import Array
+
+SAMPLED_LEVELS = (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR, logging.CRITICAL)
+"Levels that can be sampled, in the order of their slots in the shared array."
+
+
+def is_kept(rate, count):
+    """
+    Tells whether the n-th message of a call site is kept at a given rate. Exactly one message out of 1/rate is kept, at
+    the same positions from one run to the next, without any random number.
+    :param rate:    The sampling rate between 0 and 1.
+    :param count:   The number of messages seen at the call site so far, this one included.
+    :return:        True if the message is kept.
+    """
+    return rate >= 1. or int(count * rate) > int((count - 1) * rate)
+
+
+class SamplingRates(object):
+    """
+    Sampling rates of each level, for console output and for file output, held by a shared array so that a change
+    made by any process applies to all of them.
+    """
+
+    def __init__(self, console_rates=None, file_rates=None):
+        """
+        Allocates the shared rates. Must be done before producer processes are started so that they inherit them.
+        :param console_rates:   [Optional] Dictionary of sampling rates between 0 and 1 for console output, identified by
+                                level (from standard logging module). Missing levels are not sampled.
+        :param file_rates:      [Optional] Dictionary of sampling rates for file handlers and sinks, same as above.
+        """
+        super(SamplingRates, self).__init__()
+
+        # Each rate is written at once by a single store, so readers do not need the lock
+        self.rates = Array('d', [1.] * 2 * len(SAMPLED_LEVELS), lock=False)
+        self.update(console_rates=console_rates, file_rates=file_rates)
+
+    def update(self, console_rates=None, file_rates=None):
+        """
+        Changes some of the rates for all processes.
+        :param console_rates:   [Optional] Dictionary of sampling rates for console output, identified by level.
+        :param file_rates:      [Optional] Dictionary of sampling rates for file handlers and sinks, identified by level.
+        """
+        for level in list(console_rates or {}) + list(file_rates or {}):
+            if level not in SAMPLED_LEVELS:
+                raise ValueError('cannot sample level {}'.format(level))
+
+        for offset, rates in ((0, console_rates), (len(SAMPLED_LEVELS), file_rates)):
+            for level, rate in (rates or {}).items():
+                self.rates[offset + SAMPLED_LEVELS.index(level)] = min(max(float(rate), 0.), 1.)
+
+    def weights(self, level, count):
+        """
+        Samples the n-th message of a call site.
+        :param level:   The message level (from standard logging module).
+        :param count:   The number of messages seen at the call site so far, this one included.
+        :return:        Tuple (console weight, file weight). A weight is 0 if the message is dropped for that output,
+                        otherwise the number of messages it stands for, that is the inverse of the rate.
+        """
+        if level not in SAMPLED_LEVELS:
+            return 1., 1.
+
+        index = SAMPLED_LEVELS.index(level)
+        console_rate = self.rates[index]
+        file_rate = self.rates[len(SAMPLED_LEVELS) + index]
+
+        return (1. / console_rate if console_rate > 0 and is_kept(console_rate, count) else 0.,
+                1. / file_rate if file_rate > 0 and is_kept(file_rate, count) else 0.)
@@ -0,0 +1,445 @@
+#!/bin/env/python
+# coding: utf-8
+
+import glob
+import json
+import logging
+import os
+import struct
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_line(record):
+    """
+    Serializes a record into one JSON line, using orjson when it is installed.
+    :param record:  Dictionary of JSON-compatible values.
+    :return:        The UTF-8 encoded line, line feed included.
+    """
+    if orjson:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+
+    return (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf8')
+
+
+def json_value(value):
+    """
+    Converts identifiers that JSON cannot represent, such as UUIDs, into strings.
+    :param value:   Any value.
+    :return:        The value itself if JSON can represent it, its string representation otherwise.
+    """
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+
+    return str(value)
+
+
+class Sink(object):
+    """
+    Defines an output fed directly from command fields by the logger process, as opposed to file handlers which receive
+    formatted logging records. Sinks are serialized along with the configuration, so they must only open their files
+    from the logger process.
+    """
+
+    def __init__(self, level=logging.DEBUG):
+        """
+        Defines the minimum level of the messages to output.
+        :param level: [Optional] The logging level (from standard logging module).
+        """
+        super(Sink, self).__init__()
+
+        self.level = level
+
+    def emit_message(self, command):
+        """
+        Outputs a log message.
+        :param command: The LogMessageCommand object received by the logger process.
+        """
+        pass
+
+    def emit_exception(self, command):
+        """
+        Outputs an exception's stacktrace.
+        :param command: The StacktraceCommand object received by the logger process.
+        """
+        pass
+
+    def emit_progress(self, command, task):
+        """
+        Outputs a progress update that has changed a task.
+        :param command: The UpdateProgressCommand object received by the logger process.
+        :param task:    The TaskProgress object after the update.
+        """
+        pass
+
+    def flush(self):
+        """
+        Writes everything that has been buffered so far.
+        """
+        pass
+
+    def close(self):
+        """
+        Flushes and releases the sink resources. Called when the logger process exits or when the sink is replaced.
+        """
+        self.flush()
+
+
+class JsonLinesSink(Sink):
+    """
+    Writes one JSON object per line, with the fields: time, level, pid, process_title, task_id, progress, total, text
+    and weight, which is the number of messages a line stands for after sampling and coalescing. Lines are buffered and
+    written in batches. Progress updates can be recorded too, so downstream tools can rebuild job timelines.
+    """
+
+    def __init__(self,
+                 filename,
+                 level=logging.DEBUG,
+                 batch_size=512,
+                 flush_interval_millis=1000,
+                 progress_mode=None,
+                 progress_interval_millis=1000):
+        """
+        Defines a new JSON Lines output file. The file is opened in append mode by the logger process on first write.
+        :param filename:                    Path of the output file.
+        :param level:                       [Optional] The logging level (from standard logging module).
+        :param batch_size:                  [Optional] Number of buffered lines that triggers a write.
+        :param flush_interval_millis:       [Optional] Maximum time lapse in milliseconds a line stays buffered. It
+                                            may be more as the sink is only checked when something is emitted or
+                                            flushed.
+        :param progress_mode:               [Optional] How progress updates are recorded. None records nothing,
+                                            'sample' records at most one update per task and interval, plus completion,
+                                            'coalesce' records the latest state of every updated task once per
+                                            interval.
+        :param progress_interval_millis:    [Optional] The interval used by 'progress_mode'.
+        """
+        super(JsonLinesSink, self).__init__(level=level)
+
+        if progress_mode not in (None, 'sample', 'coalesce'):
+            raise ValueError('progress_mode must be None, \'sample\' or \'coalesce\'')
+
+        self.filename = filename
+        self.batch_size = batch_size
+        self.flush_interval_millis = flush_interval_millis
+        self.progress_mode = progress_mode
+        self.progress_interval_millis = progress_interval_millis
+
+        self.stream = None
+        self.buffer = []
+        self.last_flush = 0
+        self.last_progress = {}
+        self.pending_progress = {}
+        self.last_coalesce = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['stream'] = None
+        state['buffer'] = []
+
+        return state
+
+    def append(self, record):
+        """
+        Buffers a record and writes the buffer if it is full or old enough.
+        :param record: Dictionary of JSON-compatible values.
+        """
+        self.buffer.append(json_line(record))
+
+        if len(self.buffer) >= self.batch_size or time.time() * 1000 - self.last_flush >= self.flush_interval_millis:
+            self.flush()
+
+    def emit_message(self, command):
+        if command.level < self.level:
+            return
+
+        self.append({'time': command.timestamp or time.time(),
+                     'level': logging.getLevelName(command.level),
+                     'pid': command.pid,
+                     'process_title': None,
+                     'task_id': None,
+                     'progress': None,
+                     'total': None,
+                     'text': command.text,
+                     'weight': command.file_weight * command.repeat})
+
+    def emit_exception(self, command):
+        self.append({'time': command.timestamp or time.time(),
+                     'level': 'EXCEPTION',
+                     'pid': command.pid,
+                     'process_title': command.process_title,
+                     'task_id': None,
+                     'progress': None,
+                     'total': None,
+                     'text': command.stacktrace,
+                     'weight': 1})
+
+    def progress_record(self, command, task):
+        """
+        Builds the record of a progress update.
+        :param command: The UpdateProgressCommand object received by the logger process.
+        :param task:    The TaskProgress object after the update.
+        :return:        Dictionary of JSON-compatible values.
+        """
+        return {'time': command.timestamp or time.time(),
+                'level': 'PROGRESS',
+                'pid': command.pid,
+                'process_title': None,
+                'task_id': json_value(command.task_id),
+                'progress': task.progress,
+                'total': task.total,
+                'text': task.prefix,
+                'weight': 1}
+
+    def emit_progress(self, command, task):
+        if not self.progress_mode:
+            return
+
+        now = time.time() * 1000
+
+        if self.progress_mode == 'sample':
+            completed = task.total is not None and task.progress >= task.total
+            if completed or now - self.last_progress.get(command.task_id, 0) >= self.progress_interval_millis:
+                self.last_progress[command.task_id] = now
+                self.append(self.progress_record(command=command, task=task))
+
+                if completed:
+                    del self.last_progress[command.task_id]
+        else:
+            # Keep the latest state only. The task may be deleted by then, so its values are read now
+            self.pending_progress[command.task_id] = self.progress_record(command=command, task=task)
+
+            if now - self.last_coalesce >= self.progress_interval_millis:
+                self.coalesce()
+
+    def coalesce(self):
+        """
+        Buffers the latest state of every task updated since the last interval.
+        """
+        self.last_coalesce = time.time() * 1000
+
+        pending = self.pending_progress
+        self.pending_progress = {}
+
+        for record in pending.values():
+            self.buffer.append(json_line(record))
+
+    def flush(self):
+        self.last_flush = time.time() * 1000
+
+        if not self.buffer:
+            return
+
+        if not self.stream:
+            self.stream = open(self.filename, 'ab')
+
+        self.stream.write(b''.join(self.buffer))
+        self.stream.flush()
+        self.buffer = []
+
+    def close(self):
+        if self.pending_progress:
+            self.coalesce()
+
+        self.flush()
+
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+
+RECORD_HEADER = struct.Struct('<IdBIH')
+"""
+Header of every binary record: the record size in bytes (header included), the timestamp in seconds since the epoch,
+the level, the pid and the size in bytes of the task id. Followed by the UTF-8 task id and the UTF-8 text.
+"""
+SEGMENT_EXTENSION = 'flb'
+"Extension of binary log segments. Each segment has a sidecar index named after it, followed by '.idx'."
+INDEX_VERSION = 2
+"Version of the sidecar index layout. Readers index the segments whose sidecar has another version from their headers."
+
+
+def segment_filenames(filename):
+    """
+    Lists the binary log segments of a base path, oldest first.
+    :param filename:    The base path given to BinaryIndexedSink.
+    :return:            List of segment paths.
+    """
+    return sorted(glob.glob('{}.*.{}'.format(glob.escape(filename), SEGMENT_EXTENSION)))
+
+
+class BinaryIndexedSink(Sink):
+    """
+    Writes length-prefixed binary records (timestamp, level, pid, task id, text) into segments. Each segment gets a
+    sidecar index with one entry per block of records: its offset, its time range, and the levels and pids found in it,
+    so that the query tool ('python -m FancyLogger.query') can answer time-range, level and pid queries by skipping the
+    blocks that cannot match. Indexes are replaced atomically from time to time while a segment is written, and when it
+    is complete or the sink is closed; the reader scans the headers of the records that are not indexed yet.
+    """
+
+    def __init__(self,
+                 filename,
+                 level=logging.DEBUG,
+                 segment_bytes=67108864,
+                 index_interval=256,
+                 batch_size=512,
+                 flush_interval_millis=1000,
+                 index_write_interval_millis=5000):
+        """
+        Defines a new binary log. Segments are named after the base path followed by a sequence number, a new sequence
+        being started each time the logger process starts.
+        :param filename:                    The base path of the segments.
+        :param level:                       [Optional] The logging level (from standard logging module).
+        :param segment_bytes:               [Optional] The size in bytes at which a new segment is started. Defaults to
+                                            64 MB.
+        :param index_interval:              [Optional] Number of records per entry of the sparse index.
+        :param batch_size:                  [Optional] Number of buffered records that triggers a write.
+        :param flush_interval_millis:       [Optional] Maximum time lapse in milliseconds a record stays buffered. It
+                                            may be more as the sink is only checked when something is emitted or
+                                            flushed.
+        :param index_write_interval_millis: [Optional] Minimum time lapse in milliseconds between two writes of the
+                                            index of the current segment, so that it survives a crash. Records written
+                                            since are scanned by the reader.
+        """
+        super(BinaryIndexedSink, self).__init__(level=level)
+
+        self.filename = os.path.abspath(filename)
+        self.segment_bytes = segment_bytes
+        self.index_interval = index_interval
+        self.batch_size = batch_size
+        self.flush_interval_millis = flush_interval_millis
+        self.index_write_interval_millis = index_write_interval_millis
+
+        self.stream = None
+        self.segment_filename = None
+        self.buffer = bytearray()
+        self.buffered = 0
+        self.last_flush = 0
+        self.last_index_write = 0
+        self.index = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['stream'] = None
+        state['buffer'] = bytearray()
+        state['buffered'] = 0
+
+        return state
+
+    def open_segment(self):
+        """
+        Starts a new segment following the existing ones.
+        """
+        segments = segment_filenames(self.filename)
+        number = int(segments[-1].rsplit('.', 2)[-2]) + 1 if segments else 0
+
+        self.segment_filename = '{}.{:06d}.{}'.format(self.filename, number, SEGMENT_EXTENSION)
+        self.stream = open(self.segment_filename, 'wb')
+        self.index = {'version': INDEX_VERSION,
+                      'size': 0,
+                      'records': 0,
+                      'time_index': []}
+
+    def write_index(self):
+        """
+        Replaces the sidecar index of the current segment, which must describe only records already written.
+        """
+        self.last_index_write = time.time() * 1000
+
+        temporary = '{}.idx.tmp'.format(self.segment_filename)
+        with open(temporary, 'w') as f:
+            json.dump(self.index, f, separators=(',', ':'))
+        os.replace(temporary, '{}.idx'.format(self.segment_filename))
+
+    def close_segment(self):
+        """
+        Writes the sidecar index of the current segment, then closes it.
+        """
+        self.stream.close()
+        self.stream = None
+
+        self.write_index()
+
+    def append(self, timestamp, level, pid, task_id, text):
+        """
+        Buffers a record and indexes it, then writes the buffer if it is full or old enough.
+        :param timestamp:   Time of the record in seconds since the epoch.
+        :param level:       The logging level of the record.
+        :param pid:         The pid of the process that sent the record.
+        :param task_id:     The task the record relates to, or None.
+        :param text:        The text of the record.
+        """
+        if not self.stream:
+            self.open_segment()
+
+        task_id = b'' if task_id is None else str(task_id).encode('utf8')
+        text = text.encode('utf8', 'replace')
+        size = RECORD_HEADER.size + len(task_id) + len(text)
+        offset = self.index['size']
+
+        # Sparse index entry: [offset, min time, max time, levels, pids] of every block of 'index_interval' records, as
+        # timestamps given by several processes are not strictly ordered
+        if self.index['records'] % self.index_interval == 0:
+            self.index['time_index'].append([offset, timestamp, timestamp, [level], [pid or 0]])
+        else:
+            block = self.index['time_index'][-1]
+            block[1] = min(block[1], timestamp)
+            block[2] = max(block[2], timestamp)
+            if level not in block[3]:
+                block[3].append(level)
+            if (pid or 0) not in block[4]:
+                block[4].append(pid or 0)
+
+        self.index['records'] += 1
+        self.index['size'] += size
+
+        self.buffer += RECORD_HEADER.pack(size, timestamp, level, pid or 0, len(task_id))
+        self.buffer += task_id
+        self.buffer += text
+        self.buffered += 1
+
+        if self.buffered >= self.batch_size or time.time() * 1000 - self.last_flush >= self.flush_interval_millis:
+            self.flush()
+
+    def emit_message(self, command):
+        if command.level < self.level:
+            return
+
+        self.append(timestamp=command.timestamp or time.time(),
+                    level=command.level,
+                    pid=command.pid,
+                    task_id=None,
+                    text=command.text)
+
+    def emit_exception(self, command):
+        self.append(timestamp=command.timestamp or time.time(),
+                    level=logging.CRITICAL,
+                    pid=command.pid,
+                    task_id=None,
+                    text='[{}]:\n{}'.format(command.process_title, command.stacktrace) if command.process_title
+                    else command.stacktrace)
+
+    def flush(self):
+        self.last_flush = time.time() * 1000
+
+        if not self.buffer:
+            return
+
+        self.stream.write(self.buffer)
+        self.stream.flush()
+        self.buffer = bytearray()
+        self.buffered = 0
+
+        if self.index['size'] >= self.segment_bytes:
+            self.close_segment()
+        elif self.last_flush - self.last_index_write >= self.index_write_interval_millis:
+            self.write_index()
+
+    def close(self):
+        self.flush()
+
+        if self.stream:
+            self.close_segment()
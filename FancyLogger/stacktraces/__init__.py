@@ -0,0 +1,112 @@
+#!/bin/env/python
+# coding: utf-8
+
+import hashlib
+import re
+from multiprocessing import Array
+
+NOISE_PATTERNS = ((re.compile(r'0x[0-9a-fA-F]+'), '0x?'),
+                  (re.compile(r'\b(pid|process|thread|tid)([ =:#]+)\d+', re.IGNORECASE), r'\1\2?'),
+                  (re.compile(r'/tmp/[^\s\'"]+'), '/tmp/?'))
+"Patterns of the stacktrace parts that differ between processes hitting the same bug, and their replacement."
+
+
+def normalize_stacktrace(stacktrace):
+    """
+    Removes memory addresses, pids and temporary paths from a stacktrace, so that the same bug hit by different
+    processes gives the same text.
+    :param stacktrace:  Stacktrace string as returned by 'traceback.format_exc()'.
+    :return:            The normalized stacktrace.
+    """
+    for pattern, replacement in NOISE_PATTERNS:
+        stacktrace = pattern.sub(replacement, stacktrace)
+
+    return stacktrace
+
+
+def stacktrace_digest(stacktrace):
+    """
+    Hashes a normalized stacktrace.
+    :param stacktrace:  Stacktrace string as returned by 'traceback.format_exc()'.
+    :return:            A non-zero 64 bits integer.
+    """
+    digest = int.from_bytes(hashlib.blake2b(normalize_stacktrace(stacktrace).encode('utf8', 'replace'),
+                                            digest_size=8).digest(), 'little')
+
+    # Zero marks the empty slots of the shared table
+    return digest or 1
+
+
+class StacktraceTable(object):
+    """
+    Set of stacktrace digests shared by all processes, in an open-addressing hash table held by a shared array. It tells
+    a process whether the full text of a stacktrace has already been sent to the logger process by any process.
+    """
+
+    def __init__(self, size=4096):
+        """
+        Allocates the shared table. Must be done before producer processes are started so that they inherit it.
+        :param size: [Optional] The number of slots. Once they are all used, stacktraces are always sent in full.
+        """
+        super(StacktraceTable, self).__init__()
+
+        self.slots = Array('Q', size)
+        self.size = size
+
+    def add(self, digest):
+        """
+        Adds a digest to the table.
+        :param digest:  The stacktrace digest, as given by 'stacktrace_digest'.
+        :return:        True if the digest was not in the table and has been added, meaning that the full text must be
+                        sent, which is also the case when the table is full. False if it was already there.
+        """
+        with self.slots.get_lock():
+            index = digest % self.size
+
+            for _ in range(self.size):
+                slot = self.slots[index]
+                if slot == digest:
+                    return False
+                elif slot == 0:
+                    self.slots[index] = digest
+                    return True
+                index = (index + 1) % self.size
+
+        # The table is full, keep sending full texts rather than risking references that cannot be resolved
+        return True
+
+
+class UniqueStacktrace(object):
+    """
+    Aggregates all the occurrences of one stacktrace in the logger process.
+    """
+
+    def __init__(self, digest):
+        """
+        Creates an entry with no occurrence yet.
+        :param digest: The stacktrace digest.
+        """
+        super(UniqueStacktrace, self).__init__()
+
+        self.digest = digest
+        self.stacktrace = None
+        self.pid = None
+        self.process_title = None
+        self.count = 0
+        self.pids = set()
+        self.first_seen = None
+        self.last_seen = None
+
+        # The formatted text currently displayed in the exception list, to find and update it in place
+        self.message = None
+
+    def add_occurrence(self, pid, timestamp):
+        """
+        Counts one more occurrence.
+        :param pid:         The pid of the process that threw the exception.
+        :param timestamp:   The time of the exception in seconds since the epoch.
+        """
+        self.count += 1
+        self.pids.add(pid)
+        self.first_seen = timestamp if self.first_seen is None else min(self.first_seen, timestamp)
+        self.last_seen = timestamp if self.last_seen is None else max(self.last_seen, timestamp)
@@ -0,0 +1,422 @@
+#!/bin/env/python
+# coding: utf-8
+
+import math
+import time
+from array import array
+
+from ..commands import TaskHandle
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TaskView(object):
+    """
+    Reads and writes the row of one task in a TaskTable through the attributes of a TaskProgress object, so that
+    drawing code works the same on both.
+    """
+
+    __slots__ = ('table', 'slot')
+
+    def __init__(self, table, slot):
+        """
+        Points to a row.
+        :param table:   The TaskTable holding the row.
+        :param slot:    The index of the row in the table columns.
+        """
+        self.table = table
+        self.slot = slot
+
+    @property
+    def progress(self):
+        value = self.table.progress[self.slot]
+        return int(value) if value.is_integer() else value
+
+    @progress.setter
+    def progress(self, value):
+        self.table.progress[self.slot] = value
+
+    @property
+    def total(self):
+        value = self.table.total[self.slot]
+        if math.isnan(value):
+            return None
+        return int(value) if value.is_integer() else value
+
+    @property
+    def prefix(self):
+        return self.table.prefix[self.slot]
+
+    @property
+    def suffix(self):
+        return self.table.suffix[self.slot]
+
+    @property
+    def decimals(self):
+        return self.table.decimals[self.slot]
+
+    @property
+    def bar_length(self):
+        return self.table.bar_length[self.slot]
+
+    @property
+    def keep_alive(self):
+        return bool(self.table.keep_alive[self.slot])
+
+    @property
+    def display_time(self):
+        return bool(self.table.display_time[self.slot])
+
+    @property
+    def begin_time(self):
+        return self.table.begin_time[self.slot] or None
+
+    @begin_time.setter
+    def begin_time(self, value):
+        self.table.begin_time[self.slot] = value or 0
+
+    @property
+    def end_time(self):
+        return self.table.end_time[self.slot] or None
+
+    @property
+    def timeout_chrono(self):
+        return self.table.timeout_chrono[self.slot] or None
+
+    @timeout_chrono.setter
+    def timeout_chrono(self, value):
+        self.table.timeout_chrono[self.slot] = value or 0
+
+    @property
+    def elapsed_time_at_end(self):
+        return self.table.elapsed_time_at_end[self.slot]
+
+    @elapsed_time_at_end.setter
+    def elapsed_time_at_end(self, value):
+        self.table.elapsed_time_at_end[self.slot] = value
+
+    def is_complete(self):
+        """
+        Tells whether the progress has reached the total. Indeterminate bars are never complete.
+        :return: True if the task has completed.
+        """
+        # A NaN total, that is an indeterminate bar, is never reached
+        return self.table.progress[self.slot] >= self.table.total[self.slot]
+
+
+class TaskTable(object):
+    """
+    Progress bars of the logger process stored column by column: numbers in typed arrays, flags in byte arrays, texts
+    in lists, one row per task. Rows of deleted tasks are reused. Tasks keep the order in which they were defined. The
+    width of the longest prefix is tracked on each change instead of rescanning all tasks, and the completion of all
+    tasks is computed in one pass per frame, with NumPy when it is installed. Tasks may also be found by the TaskHandle
+    bound to them.
+    """
+
+    def __init__(self):
+        super(TaskTable, self).__init__()
+
+        # Rows identified by task id, in the order tasks were defined
+        self.slots = {}
+        self.free = []
+        # Task ids identified by TaskHandle, and the handle of each row
+        self.handles = {}
+        self.handle = []
+
+        self.progress = array('d')
+        # NaN for indeterminate bars
+        self.total = array('d')
+        # Times in milliseconds, 0 when not set
+        self.begin_time = array('d')
+        self.end_time = array('d')
+        self.timeout_chrono = array('d')
+        self.decimals = array('i')
+        self.bar_length = array('i')
+        self.keep_alive = bytearray()
+        self.display_time = bytearray()
+        self.prefix = []
+        self.suffix = []
+        self.elapsed_time_at_end = []
+
+        # Number of tasks per prefix width, so the longest one is known when a task is deleted
+        self.prefix_widths = {}
+        self.longest_prefix = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, task_id):
+        return task_id in self.slots
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def __getitem__(self, task_id):
+        return TaskView(self, self.slots[task_id])
+
+    def __setitem__(self, task_id, task):
+        """
+        Defines a task from a TaskProgress object. A task that already exists is replaced and keeps its position.
+        :param task_id: Unique identifier of the task.
+        :param task:    TaskProgress object holding the progress bar information.
+        """
+        slot = self.define(task_id=task_id,
+                           total=task.total,
+                           prefix=task.prefix,
+                           suffix=task.suffix,
+                           decimals=task.decimals,
+                           bar_length=task.bar_length,
+                           keep_alive=task.keep_alive,
+                           display_time=task.display_time)
+
+        self.progress[slot] = task.progress
+        self.begin_time[slot] = task.begin_time or 0
+        self.end_time[slot] = task.end_time or 0
+        self.timeout_chrono[slot] = task.timeout_chrono or 0
+        self.elapsed_time_at_end[slot] = task.elapsed_time_at_end
+
+    def define(self,
+               task_id,
+               total,
+               prefix,
+               suffix='',
+               decimals=0,
+               bar_length=60,
+               keep_alive=False,
+               display_time=False):
+        """
+        Defines a task that has not started yet, from the same fields as a TaskProgress object. A task that already
+        exists is replaced and keeps its position.
+        :param task_id:         Unique identifier of the task.
+        :param total:           The total number of iterations, or None for an indeterminate bar.
+        :param prefix:          The text displayed at the left side of the progress bar.
+        :param suffix:          [Optional] The text displayed at the right side of the progress bar.
+        :param decimals:        [Optional] The number of decimals to display for the percentage.
+        :param bar_length:      [Optional] The graphical bar size displayed on screen. Unit is character.
+        :param keep_alive:      [Optional] Whether the progress bar stays displayed once completed.
+        :param display_time:    [Optional] Whether the duration since the progress has begun is displayed.
+        :return:                The row of the task.
+        """
+        slot = self.slots.get(task_id)
+
+        if slot is not None:
+            self.remove_prefix(self.prefix[slot])
+        elif self.free:
+            slot = self.free.pop()
+        else:
+            slot = len(self.prefix)
+            self.progress.append(0)
+            self.total.append(0)
+            self.begin_time.append(0)
+            self.end_time.append(0)
+            self.timeout_chrono.append(0)
+            self.decimals.append(0)
+            self.bar_length.append(0)
+            self.keep_alive.append(0)
+            self.display_time.append(0)
+            self.prefix.append(None)
+            self.suffix.append(None)
+            self.elapsed_time_at_end.append(None)
+            self.handle.append(None)
+
+        self.slots[task_id] = slot
+        self.progress[slot] = 0
+        self.total[slot] = math.nan if total is None else total
+        self.begin_time[slot] = 0
+        self.end_time[slot] = 0
+        self.timeout_chrono[slot] = 0
+        self.decimals[slot] = decimals
+        self.bar_length[slot] = bar_length
+        self.keep_alive[slot] = 1 if keep_alive else 0
+        self.display_time[slot] = 1 if display_time else 0
+        self.prefix[slot] = prefix
+        self.suffix[slot] = suffix
+        self.elapsed_time_at_end[slot] = None
+
+        self.add_prefix(prefix)
+
+        return slot
+
+    def __delitem__(self, task_id):
+        slot = self.slots.pop(task_id)
+
+        self.remove_prefix(self.prefix[slot])
+
+        # Release the texts, the numbers are overwritten when the row is reused
+        self.prefix[slot] = None
+        self.suffix[slot] = None
+        self.elapsed_time_at_end[slot] = None
+        self.free.append(slot)
+
+        if self.handle[slot] is not None:
+            del self.handles[self.handle[slot]]
+            self.handle[slot] = None
+
+    def bind(self, task_id, handle):
+        """
+        Maps a TaskHandle to a task, until the task is deleted.
+        :param task_id: Unique identifier of the task, which must exist.
+        :param handle:  The TaskHandle allocated for the task by the process that defined it.
+        """
+        slot = self.slots[task_id]
+
+        if self.handle[slot] is not None:
+            self.handles.pop(self.handle[slot], None)
+
+        self.handles[handle] = task_id
+        self.handle[slot] = handle
+
+    def resolve(self, task_id):
+        """
+        Finds the task id a TaskHandle stands for.
+        :param task_id: Unique identifier of a task, or its TaskHandle.
+        :return:        The task id, or None for a handle that is not mapped.
+        """
+        if isinstance(task_id, TaskHandle):
+            return self.handles.get(task_id)
+
+        return task_id
+
+    def get(self, task_id, default=None):
+        slot = self.slots.get(task_id)
+        return default if slot is None else TaskView(self, slot)
+
+    def items(self):
+        """
+        Lists the tasks in the order they were defined.
+        :return: List of tuples (task id, TaskView).
+        """
+        return [(task_id, TaskView(self, slot)) for task_id, slot in self.slots.items()]
+
+    def add_prefix(self, prefix):
+        """
+        Counts the width of a new prefix.
+        :param prefix: The prefix of a task that is added.
+        """
+        width = len(prefix)
+        self.prefix_widths[width] = self.prefix_widths.get(width, 0) + 1
+        if width > self.longest_prefix:
+            self.longest_prefix = width
+
+    def remove_prefix(self, prefix):
+        """
+        Uncounts the width of a prefix, and finds the longest remaining one if it was the only longest.
+        :param prefix: The prefix of a task that is removed.
+        """
+        width = len(prefix)
+        self.prefix_widths[width] -= 1
+        if not self.prefix_widths[width]:
+            del self.prefix_widths[width]
+
+            # There are far fewer distinct widths than tasks
+            if width == self.longest_prefix:
+                self.longest_prefix = max(self.prefix_widths) if self.prefix_widths else 0
+
+    def set_progress(self, task_id, progress, total=None):
+        """
+        Defines the current progress of a task, the same way as 'TaskProgress.set_progress'.
+        :param task_id:     Unique identifier of the task.
+        :param progress:    Current progress in iteration units regarding its total (not percent).
+        :param total:       [Optional] New total number of iterations, such as the final count of an indeterminate bar.
+        :return:            True if the progress or the total has changed.
+        """
+        slot = self.slots[task_id]
+
+        total_changed = total is not None and total != self.total[slot]
+        if total_changed:
+            self.total[slot] = total
+
+        # Comparisons with a NaN total, that is an indeterminate bar, are always false
+        _progress = progress
+        if _progress > self.total[slot]:
+            _progress = self.total[slot]
+        elif _progress < 0:
+            _progress = 0
+
+        # Stop task chrono if needed
+        if _progress == self.total[slot] and self.display_time[slot]:
+            self.end_time[slot] = time.time() * 1000
+
+            # If the task has completed instantly then define its begin_time too
+            if not self.begin_time[slot]:
+                self.begin_time[slot] = self.end_time[slot]
+
+        has_changed = self.progress[slot] != _progress
+
+        if has_changed:
+            self.progress[slot] = _progress
+
+        return has_changed or total_changed
+
+    def summary(self):
+        """
+        Sums up all tasks, such as those of a remote node displayed as one aggregate progress bar.
+        :return: Tuple (progress, total, completed), where progress and total are summed over tasks that have a total,
+                 and completed is the number of tasks that reached their total. Indeterminate tasks only count as not
+                 completed.
+        """
+        progress = 0
+        total = 0
+        completed = 0
+
+        for slot in self.slots.values():
+            slot_total = self.total[slot]
+
+            # NaN is the only value different from itself
+            if slot_total == slot_total:
+                progress += self.progress[slot]
+                total += slot_total
+                if self.progress[slot] >= slot_total:
+                    completed += 1
+
+        return progress, total, completed
+
+    def completion(self):
+        """
+        Computes the completion of all tasks in one pass.
+        :return: Tuple (percents, fill lengths) of lists in the order tasks were defined. The percent is between 0 and
+                 100, and the fill length is the number of filled characters of the bar. Both are NaN for indeterminate
+                 bars.
+        """
+        if not self.slots:
+            return [], []
+
+        if numpy is not None:
+            slots = numpy.fromiter(self.slots.values(), dtype=numpy.intp, count=len(self.slots))
+
+            # Views on the columns: they must be released before any row is added
+            progress = numpy.frombuffer(self.progress, dtype=numpy.float64)[slots]
+            total = numpy.frombuffer(self.total, dtype=numpy.float64)[slots]
+            bar_length = numpy.frombuffer(self.bar_length, dtype=numpy.intc)[slots]
+
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                ratio = numpy.where(total > 0, numpy.minimum(progress / total, 1.), 1.)
+            ratio[numpy.isnan(total)] = numpy.nan
+
+            return (ratio * 100).tolist(), numpy.round(ratio * bar_length).tolist()
+
+        percents = []
+        fills = []
+        progress = self.progress
+        total = self.total
+        bar_length = self.bar_length
+
+        for slot in self.slots.values():
+            slot_total = total[slot]
+
+            # NaN is the only value different from itself
+            if slot_total != slot_total:
+                percents.append(math.nan)
+                fills.append(math.nan)
+                continue
+
+            ratio = progress[slot] / slot_total if slot_total > 0 else 1.
+            if ratio > 1.:
+                ratio = 1.
+            percents.append(ratio * 100)
+            fills.append(round(ratio * bar_length[slot]))
+
+        return percents, fills
@@ -0,0 +1,261 @@
+#!/bin/env/python
+# coding: utf-8
+
+import pickle
+import struct
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+import dill
+
+POSITION = struct.Struct('Q')
+"""
+Read and write positions are ever-increasing byte counters. Each one is written by a single process. Native format so
+that they are copied in one aligned store, but readers never rely on that: a position read while being written can only
+be lower than its new value, so it is compared with '>' and a torn value at worst delays a read.
+"""
+RECORD_HEADER = struct.Struct('<I')
+"Every fragment is prefixed by its size in bytes. The highest bit tells that more fragments of the record follow."
+MORE_FRAGMENTS = 0x80000000
+"Flag of the fragment header telling that the record continues in the next fragment."
+PAYLOAD_TAG = b'P'
+"First byte of a reference to a serialized command passed through shared memory, followed by its size and block name."
+PAYLOAD_REFERENCE = struct.Struct('<cQ')
+"Tag and size in bytes of a payload reference. The name of the shared memory block follows."
+
+
+def share_payload(serialized):
+    """
+    Copies a large serialized command into a shared memory block of its own, so that only a small reference goes
+    through the transport. The block is unlinked by the process that reads it.
+    :param serialized:  The serialized command.
+    :return:            The reference to send instead, or None if no shared memory block can be allocated.
+    """
+    try:
+        shared_memory = SharedMemory(create=True, size=len(serialized))
+    except OSError:
+        return None
+
+    shared_memory.buf[:len(serialized)] = serialized
+    reference = PAYLOAD_REFERENCE.pack(PAYLOAD_TAG, len(serialized)) + shared_memory.name.encode('ascii')
+    shared_memory.close()
+
+    return reference
+
+
+def load_payload(reference):
+    """
+    Deserializes a command passed through shared memory, straight from the shared memory block, then destroys the block.
+    :param reference:   The reference returned by 'share_payload'.
+    :return:            The ProcessCommand object.
+    """
+    _, size = PAYLOAD_REFERENCE.unpack_from(reference)
+    shared_memory = SharedMemory(name=bytes(reference[PAYLOAD_REFERENCE.size:]).decode('ascii'))
+
+    view = shared_memory.buf[:size]
+    try:
+        try:
+            return pickle.loads(view)
+        except (pickle.UnpicklingError, ImportError, AttributeError):
+            # Commands that only dill can serialize refer to names that only its unpickler resolves, from a copy
+            return dill.loads(view)
+    finally:
+        view.release()
+        shared_memory.close()
+        shared_memory.unlink()
+
+
+class RingBuffer(object):
+    """
+    Single-producer/single-consumer ring buffer of variable-sized records in shared memory. The producer only writes the
+    write position and the consumer only writes the read position, so no lock is needed between them. Both positions
+    sit on their own cache line. Each side must be used by one thread at a time: threads of a producer process sharing
+    a ring must hold a lock while writing.
+    """
+
+    write_position_offset = 0
+    "Offset of the write position, owned by the producer."
+    read_position_offset = 64
+    "Offset of the read position, owned by the consumer."
+    data_offset = 128
+    "Offset of the first data byte."
+
+    def __init__(self, shared_memory):
+        """
+        Wraps an existing shared memory block. Use 'create' or 'attach' instead.
+        :param shared_memory: The SharedMemory object holding the ring.
+        """
+        super(RingBuffer, self).__init__()
+
+        self.shared_memory = shared_memory
+        self.name = shared_memory.name
+        self.buffer = shared_memory.buf
+        self.capacity = shared_memory.size - self.data_offset
+
+        # Records larger than this are split so that the producer never waits for the whole ring to be empty
+        self.fragment_size = max(1, self.capacity // 4 - RECORD_HEADER.size)
+
+        # Each side caches the position it owns
+        self.write_position = POSITION.unpack_from(self.buffer, self.write_position_offset)[0]
+        self.read_position = POSITION.unpack_from(self.buffer, self.read_position_offset)[0]
+        self.fragments = []
+
+    @classmethod
+    def create(cls, size):
+        """
+        Allocates a new ring in shared memory, to be used by the producer.
+        :param size:    The size in bytes of the shared memory block, header included.
+        :return:        The new RingBuffer.
+        """
+        shared_memory = SharedMemory(create=True, size=size)
+        shared_memory.buf[:cls.data_offset] = bytes(cls.data_offset)
+
+        return cls(shared_memory)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Maps an existing ring, to be used by the consumer, which is then in charge of unlinking it.
+        :param name:    The shared memory block name given by the producer.
+        :return:        The attached RingBuffer.
+        """
+        return cls(SharedMemory(name=name))
+
+    def copy_in(self, position, data):
+        """
+        Copies bytes into the ring at the given position, wrapping around its end.
+        :param position:    Ever-increasing position of the first byte.
+        :param data:        Bytes-like object to copy.
+        """
+        start = position % self.capacity
+        first = min(len(data), self.capacity - start)
+        begin = self.data_offset + start
+
+        self.buffer[begin:begin + first] = data[:first]
+        if first < len(data):
+            self.buffer[self.data_offset:self.data_offset + len(data) - first] = data[first:]
+
+    def copy_out(self, position, size):
+        """
+        Copies bytes out of the ring from the given position, wrapping around its end.
+        :param position:    Ever-increasing position of the first byte.
+        :param size:        The number of bytes to copy.
+        :return:            The copied bytes.
+        """
+        start = position % self.capacity
+        first = min(size, self.capacity - start)
+        begin = self.data_offset + start
+
+        if first == size:
+            return bytes(self.buffer[begin:begin + size])
+
+        return bytes(self.buffer[begin:begin + first]) + bytes(self.buffer[self.data_offset:
+                                                                           self.data_offset + size - first])
+
+    def write_fragment(self, data, more_fragments=False):
+        """
+        Appends one fragment. Must only be called by the producer.
+        :param data:            The fragment bytes.
+        :param more_fragments:  [Optional] Tells that the record continues in the next fragment.
+        :return:                None if there is not enough free space, otherwise True if the ring was empty before this
+                                write, meaning the consumer may be waiting and should be woken up.
+        """
+        needed = RECORD_HEADER.size + len(data)
+        read_position = POSITION.unpack_from(self.buffer, self.read_position_offset)[0]
+
+        if needed > self.capacity - (self.write_position - read_position):
+            return None
+
+        self.copy_in(self.write_position, RECORD_HEADER.pack(len(data) | MORE_FRAGMENTS if more_fragments
+                                                             else len(data)))
+        self.copy_in(self.write_position + RECORD_HEADER.size, data)
+
+        was_empty = read_position >= self.write_position
+
+        # Publish the fragment only once it has been completely copied
+        self.write_position += needed
+        POSITION.pack_into(self.buffer, self.write_position_offset, self.write_position)
+
+        return was_empty
+
+    def write(self, data, timeout=1.):
+        """
+        Appends a record, split into fragments if it is large, waiting with an increasing delay while the ring is full.
+        Must only be called by the producer.
+        :param data:    The record bytes.
+        :param timeout: [Optional] Maximum time in seconds to wait for free space for the first fragment. Once it has
+                        been written, the remaining fragments are always waited for so that the ring stays consistent.
+        :return:        None if the record could not be written in time, otherwise True if the ring was empty before
+                        this write.
+        """
+        view = memoryview(data)
+        was_empty = False
+
+        for start in range(0, max(len(view), 1), self.fragment_size):
+            fragment = view[start:start + self.fragment_size]
+            more_fragments = start + self.fragment_size < len(view)
+
+            delay = 0.00001
+            deadline = None
+
+            while True:
+                written = self.write_fragment(fragment, more_fragments)
+                if written is not None:
+                    was_empty = was_empty or written
+                    break
+
+                if deadline is None:
+                    deadline = time.time() + timeout
+                elif start == 0 and time.time() > deadline:
+                    return None
+
+                time.sleep(delay)
+                delay = min(delay * 2, 0.01)
+
+        return was_empty
+
+    def is_empty(self):
+        """
+        Tells whether all records have been read. Must only be called by the consumer.
+        :return: True if there is no record to read.
+        """
+        return POSITION.unpack_from(self.buffer, self.write_position_offset)[0] <= self.read_position
+
+    def read(self):
+        """
+        Pops the oldest record, joining its fragments. Must only be called by the consumer.
+        :return: The record bytes, or None if the ring is empty or the record has not been completely written yet.
+        """
+        while not self.is_empty():
+            header = RECORD_HEADER.unpack(self.copy_out(self.read_position, RECORD_HEADER.size))[0]
+            size = header & ~MORE_FRAGMENTS
+            data = self.copy_out(self.read_position + RECORD_HEADER.size, size)
+
+            self.read_position += RECORD_HEADER.size + size
+            POSITION.pack_into(self.buffer, self.read_position_offset, self.read_position)
+
+            if header & MORE_FRAGMENTS:
+                self.fragments.append(data)
+            elif self.fragments:
+                self.fragments.append(data)
+                data = b''.join(self.fragments)
+                self.fragments = []
+                return data
+            else:
+                return data
+
+        return None
+
+    def close(self, unlink=False):
+        """
+        Unmaps the ring.
+        :param unlink: [Optional] Also destroys the shared memory block. Must only be done by the consumer.
+        """
+        self.buffer = None
+
+        try:
+            self.shared_memory.close()
+            if unlink:
+                self.shared_memory.unlink()
+        except (OSError, BufferError):
+            pass
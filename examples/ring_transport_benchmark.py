@@ -0,0 +1,64 @@
+#!/bin/env/python
+# coding: utf-8
+
+import logging
+import sys
+import time
+from multiprocessing import Array, Process
+
+from FancyLogger import FancyLogger
+
+TRANSPORTS = [('queue', {}),
+              ('priority lanes', {'priority_lanes': True}),
+              ('ring', {'transport': 'ring'}),
+              ('ring, 64 KB', {'transport': 'ring', 'ring_buffer_size': 65536})]
+"FancyLogger options of each benchmarked transport."
+
+
+def produce(logger, worker, count, send_times):
+    start = time.perf_counter()
+    for i in range(count):
+        logger.info('worker {} message {}'.format(worker, i))
+    send_times[worker] = time.perf_counter() - start
+
+    logger.flush(wait=True)
+
+
+def run(options, producers, count):
+    # Records are formatted by the logger process, but not written anywhere
+    logger = FancyLogger(file_handlers=[logging.NullHandler()], line_mode=True, **options)
+    logger.set_level(logging.DEBUG)
+    logger.set_level(logging.CRITICAL, console_only=True)
+    logger.flush(wait=True)
+
+    send_times = Array('d', producers)
+    processes = [Process(target=produce, args=(logger, worker, count, send_times)) for worker in range(producers)]
+
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    logger.flush(wait=True)
+    elapsed = time.perf_counter() - start
+
+    logger.terminate()
+
+    return elapsed, max(send_times)
+
+
+class App(object):
+
+    @classmethod
+    def benchmark(cls, producers, count):
+        print('{} producer processes, {} messages each'.format(producers, count))
+
+        for name, options in TRANSPORTS:
+            elapsed, send_time = run(options, producers, count)
+            print('{}: {:.0f} messages/s end to end, {:.2f} us per call in producers'
+                  .format(name, producers * count / elapsed, send_time / count * 1e6))
+
+
+if __name__ == '__main__':
+    App.benchmark(producers=int(sys.argv[1]) if len(sys.argv) > 1 else 4,
+                  count=int(sys.argv[2]) if len(sys.argv) > 2 else 50000)
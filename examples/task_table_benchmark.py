@@ -0,0 +1,86 @@
+#!/bin/env/python
+# coding: utf-8
+
+import gc
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from FancyLogger import TaskProgress
+from FancyLogger.tasks import TaskTable, numpy
+
+
+def make_tasks(count):
+    return [TaskProgress(total=1000 if i % 10 else None,
+                         prefix='Task {}'.format(i),
+                         display_time=True) for i in range(count)]
+
+
+def measure_memory(build):
+    gc.collect()
+    tracemalloc.start()
+    store = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return store, size
+
+
+def time_it(function, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def objects_frame(tasks):
+    # What a frame used to compute, one object at a time
+    for task in tasks.values():
+        if task.total is not None:
+            percent = 100 * (task.progress / float(task.total))
+            filled_length = int(round(task.bar_length * task.progress / float(task.total)))
+
+
+def objects_prefix(tasks):
+    longest = 0
+    for task in tasks.values():
+        if len(task.prefix) > longest:
+            longest = len(task.prefix)
+
+
+class App(object):
+
+    @classmethod
+    def benchmark(cls, count):
+        print('{} tasks, numpy {}'.format(count, numpy.__version__ if numpy else 'not installed'))
+
+        objects, objects_size = measure_memory(lambda: OrderedDict(enumerate(make_tasks(count))))
+
+        def build_table():
+            table = TaskTable()
+            for i, task in enumerate(make_tasks(count)):
+                table[i] = task
+            return table
+
+        # The TaskProgress objects are only needed while they are copied into the table
+        table, table_size = measure_memory(build_table)
+
+        for i in range(count):
+            objects[i].set_progress(i % 1000)
+            table.set_progress(i, i % 1000)
+
+        print('memory: objects {:.1f} MB, table {:.1f} MB'.format(objects_size / 1e6, table_size / 1e6))
+        print('frame completion: objects {:.2f} ms, table {:.2f} ms'
+              .format(time_it(lambda: objects_frame(objects)) * 1000, time_it(table.completion) * 1000))
+        print('longest prefix after a deletion: rescan {:.3f} ms, table {:.3f} ms'
+              .format(time_it(lambda: objects_prefix(objects)) * 1000,
+                      time_it(lambda: (table.remove_prefix('Task 1'), table.add_prefix('Task 1'))) * 1000))
+
+
+if __name__ == '__main__':
+    App.benchmark(count=int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -57,6 +57,9 @@ setup(
         'Programming Language :: Python :: 3'
     ],
 
+    # Shared memory ring buffers require multiprocessing.shared_memory
+    python_requires='>=3.8',
+
     # What does your project relate to?
     keywords='logging progress bar debug logger info task multiprocess',
 
@@ -0,0 +1,147 @@
+#!/bin/env/python
+# coding: utf-8
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from logging import FileHandler, Formatter
+from multiprocessing import Process
+
+from FancyLogger import FancyLogger
+
+WORKERS = 4
+"Number of producer processes of each round trip."
+COUNT = 2000
+"Number of messages sent by each producer process."
+FLUSH_TIMEOUT = 30
+"Maximum time in seconds a flush barrier may take before the round trip is considered stuck."
+
+
+def produce(logger, worker, count, padding=0, errors=False, level_change=False):
+    """
+    Sends numbered messages, then waits for all of them to be applied.
+    :param logger:          The FancyLogger instance.
+    :param worker:          The number of the producer.
+    :param count:           The number of messages to send.
+    :param padding:         [Optional] Number of characters appended to each message.
+    :param errors:          [Optional] If True, every other message is an ERROR one.
+    :param level_change:    [Optional] If True, the level is raised to WARNING once every message has been sent,
+                            followed by an INFO message that must not be written.
+    :return:                True if the flush barrier was acknowledged.
+    """
+    for i in range(count):
+        text = 'worker {} message {} {}'.format(worker, i, 'x' * padding)
+        if errors and i % 2:
+            logger.error(text)
+        else:
+            logger.info(text)
+
+    if level_change:
+        logger.set_level(logging.WARNING)
+        logger.info('worker {} filtered'.format(worker))
+
+    return logger.flush(wait=True, timeout=FLUSH_TIMEOUT) is not None
+
+
+def run_producer(*args, **kwargs):
+    """
+    Runs 'produce' in a producer process, whose exit code tells whether the flush barrier was acknowledged.
+    """
+    sys.exit(0 if produce(*args, **kwargs) else 1)
+
+
+class StallingHandler(FileHandler):
+    """
+    File handler that stalls the logger process on its first record, for longer than a producer waits for free space in
+    its ring buffer.
+    """
+
+    stalled = False
+    "Whether the first record has been written."
+
+    def emit(self, record):
+        if not self.stalled:
+            self.stalled = True
+            time.sleep(1.5)
+
+        FileHandler.emit(self, record)
+
+
+class RoundTripTest(unittest.TestCase):
+    """
+    Base of the round trip tests: several processes send numbered messages to the logger process, which writes them to a
+    file. Every message must be written once, in the order its process sent it, and every flush barrier must be
+    acknowledged.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'round_trip.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def round_trip(self, logger_options=None, level_change=False, stall=False, **produce_options):
+        """
+        Runs the producer processes against a new logger, then reads the file it wrote.
+        :param logger_options:  [Optional] Dictionary of additional FancyLogger parameters.
+        :param level_change:    [Optional] If True, once the producer processes have exited, the current process sends
+                                numbered messages too as producer number WORKERS, then changes the level.
+        :param stall:           [Optional] If True, the logger process stalls on the first record it writes.
+        :param produce_options: Additional 'produce' parameters.
+        :return:                List of tuples (level name, text) of the written records.
+        """
+        handler = (StallingHandler if stall else FileHandler)(self.filename, encoding='utf8')
+        handler.setFormatter(Formatter('%(levelname)s %(message)s'))
+
+        logger = FancyLogger(file_handlers=[handler], line_mode=True, **(logger_options or {}))
+        try:
+            # Everything goes to the file, nothing to the console
+            logger.set_level(logging.DEBUG)
+            logger.set_level(logging.CRITICAL, console_only=True)
+
+            processes = [Process(target=run_producer, args=(logger, worker, COUNT), kwargs=produce_options)
+                         for worker in range(WORKERS)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+            self.assertEqual([process.exitcode for process in processes], [0] * WORKERS)
+
+            if level_change:
+                self.assertTrue(produce(logger, WORKERS, COUNT, level_change=True, **produce_options))
+            self.assertIsNotNone(logger.flush(wait=True, timeout=FLUSH_TIMEOUT))
+        finally:
+            logger.terminate()
+
+        with open(self.filename, encoding='utf8') as f:
+            return [tuple(line.rstrip('\n').split(' ', 1)) for line in f]
+
+    def assertInOrder(self, records, workers=WORKERS, errors=False, padding=0):
+        """
+        Checks that the messages of each producer were all written once, in the order they were sent.
+        :param records: The records as returned by 'round_trip'.
+        :param workers: [Optional] The number of producers.
+        :param errors:  [Optional] If True, ERROR messages are only ordered with each other, and so are INFO ones.
+        :param padding: [Optional] Number of characters appended to each message.
+        """
+        received = {}
+        for level, text in records:
+            words = text.split()
+            if words[:1] != ['worker'] or words[2:3] != ['message']:
+                continue
+            self.assertEqual(len(words[4]) if len(words) > 4 else 0, padding)
+            received.setdefault((int(words[1]), level if errors else None), []).append(int(words[3]))
+
+        sent = {}
+        for worker in range(workers):
+            for i in range(COUNT):
+                level = ('ERROR' if i % 2 else 'INFO') if errors else None
+                sent.setdefault((worker, level), []).append(i)
+
+        self.assertEqual(received, sent)
@@ -0,0 +1,97 @@
+#!/bin/env/python
+# coding: utf-8
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from logging import FileHandler, Formatter
+from multiprocessing import Process
+
+from FancyLogger import FancyLogger
+
+
+def repeat(logger, count):
+    """
+    Sends the same message several times from a producer process, which exits without flushing.
+    :param logger:  The FancyLogger instance.
+    :param count:   The number of messages.
+    """
+    for _ in range(count):
+        logger.info('same')
+
+
+class CoalescingTest(unittest.TestCase):
+    """
+    Repeated messages and rate limits.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'coalescing.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def lines(self, send, **logger_options):
+        """
+        Runs a logger writing plain messages to a file.
+        :param send:            Function called with the logger to send messages.
+        :param logger_options:  Additional FancyLogger parameters.
+        :return:                The lines of the file.
+        """
+        handler = FileHandler(self.filename, encoding='utf8')
+        handler.setFormatter(Formatter('%(message)s'))
+
+        logger = FancyLogger(file_handlers=[handler], line_mode=True, **logger_options)
+        try:
+            logger.set_level(logging.DEBUG)
+            logger.set_level(logging.CRITICAL, console_only=True)
+            send(logger)
+            self.assertIsNotNone(logger.flush(wait=True, timeout=30))
+        finally:
+            logger.terminate()
+
+        with open(self.filename, encoding='utf8') as f:
+            return [line.strip() for line in f]
+
+    def repeat_in_process(self, logger):
+        process = Process(target=repeat, args=(logger, 5))
+        process.start()
+        process.join()
+
+    def test_disabled(self):
+        self.assertEqual(self.lines(self.repeat_in_process), ['same'] * 5)
+
+    def test_process_exit(self):
+        # The repeats counted by the producer process are sent when it exits
+        lines = self.lines(self.repeat_in_process, coalesce_interval_millis=60000)
+        self.assertEqual(lines, ['same', 'same (repeated 4 more times)'])
+
+    def test_different_message(self):
+        def send(logger):
+            repeat(logger, 3)
+            logger.info('other')
+            repeat(logger, 2)
+
+        lines = self.lines(send, coalesce_interval_millis=60000)
+        self.assertEqual(lines, ['same', 'same (repeated 2 more times)', 'other', 'same', 'same (repeated 1 more times)'])
+
+    def test_rate_limit(self):
+        def send(logger):
+            for i in range(50):
+                logger.warning('message %d', i)
+
+        lines = self.lines(send, rate_limit=5)
+
+        # The burst goes through, the count of the other messages is written instead
+        self.assertEqual(lines[:5], ['message {}'.format(i) for i in range(5)])
+        written = [line for line in lines if line.startswith('message ')]
+        suppressed = sum(int(line.split()[2]) for line in lines if line.startswith('Rate limit: '))
+        self.assertGreater(suppressed, 0)
+        self.assertEqual(len(written) + suppressed, 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/bin/env/python
+# coding: utf-8
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from logging import FileHandler, Formatter
+from multiprocessing import Process
+
+from FancyLogger import FancyLogger
+from FancyLogger.handlers import DirectFileWriter
+
+WORKERS = 3
+"Number of producer processes of each test."
+
+
+def produce(logger, worker):
+    """
+    Sends file-only messages from a producer process.
+    :param logger: The FancyLogger instance.
+    :param worker: The number of the producer.
+    """
+    for i in range(100):
+        logger.debug('worker {} message {}'.format(worker, i))
+
+
+class DirectFileTest(unittest.TestCase):
+    """
+    Log file to which producer processes append file-only messages themselves.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'direct.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def read(self):
+        """
+        :return: The messages written to the file, without their time, level and indentation.
+        """
+        with open(self.filename, encoding='utf8') as f:
+            return [line.split(']', 1)[1].strip() for line in f]
+
+    def test_processes(self):
+        logger = FancyLogger(direct_filename=self.filename, line_mode=True)
+        try:
+            logger.set_level(logging.DEBUG)
+            logger.set_level(logging.CRITICAL + 1, console_only=True)
+
+            processes = [Process(target=produce, args=(logger, worker)) for worker in range(WORKERS)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+            # Messages displayed by the console still go through the logger process, which writes them to the same file
+            logger.set_level(logging.INFO, console_only=True)
+            logger.debug('direct')
+            logger.critical('through the logger process')
+            self.assertIsNotNone(logger.flush(wait=True, timeout=30))
+        finally:
+            logger.terminate()
+
+        lines = self.read()
+        for worker in range(WORKERS):
+            self.assertEqual([line for line in lines if line.startswith('worker {} '.format(worker))],
+                             ['worker {} message {}'.format(worker, i) for i in range(100)])
+        self.assertEqual(lines[-2:], ['direct', 'through the logger process'])
+
+    def test_moved_file(self):
+        writer = DirectFileWriter(filename=self.filename,
+                                  levels=[logging.INFO, logging.DEBUG],
+                                  formatter=Formatter('%(levelname)s %(message)s'),
+                                  check_interval_millis=0)
+        self.assertTrue(writer.accepts(logging.DEBUG))
+        self.assertFalse(writer.accepts(logging.INFO))
+
+        writer.write(text='first', level=logging.DEBUG, timestamp=time.time())
+        os.rename(self.filename, self.filename + '.1')
+
+        # The file moved away, such as by logrotate, is opened again
+        writer.write(text='second', level=logging.DEBUG, timestamp=time.time(), weight=4.)
+        os.close(writer.fd)
+
+        with open(self.filename, encoding='utf8') as f:
+            self.assertEqual(f.read(), 'DEBUG \tsecond (sampled, weight 4)\n')
+
+    def test_refused_configuration(self):
+        with self.assertRaises(ValueError):
+            FancyLogger(direct_filename=self.filename, file_handlers=[FileHandler(self.filename, delay=True)])
+
+        logger = FancyLogger(direct_filename=self.filename, line_mode=True, console_level=logging.CRITICAL + 1)
+        try:
+            rates = list(logger.sampling_rates.rates)
+            other = FileHandler(os.path.join(self.directory, 'other.log'), delay=True)
+
+            # A refused configuration changes nothing, not even the levels or rates shared with producer processes
+            with self.assertRaises(ValueError):
+                logger.set_configuration(file_handlers=[other],
+                                         console_level=logging.DEBUG,
+                                         console_sampling_rates={logging.INFO: 0.5})
+            self.assertEqual(logger.levels[0], logging.CRITICAL + 1)
+            self.assertEqual(list(logger.sampling_rates.rates), rates)
+        finally:
+            logger.terminate()
+
+
+if __name__ == '__main__':
+    unittest.main()
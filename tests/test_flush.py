@@ -0,0 +1,77 @@
+#!/bin/env/python
+# coding: utf-8
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from logging import FileHandler, Formatter
+
+from FancyLogger import FancyLogger
+from roundtrip import FLUSH_TIMEOUT, StallingHandler
+
+
+class FlushBarrierTest(unittest.TestCase):
+    """
+    Flush barriers acknowledged by the logger process.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'flush.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def logger(self, handler_class=FileHandler):
+        """
+        :param handler_class:   [Optional] Class of the file handler of the logger.
+        :return:                A new logger writing every message to the file, and nothing to the console.
+        """
+        handler = handler_class(self.filename, encoding='utf8')
+        handler.setFormatter(Formatter('%(message)s'))
+
+        logger = FancyLogger(file_handlers=[handler], line_mode=True)
+        logger.set_level(logging.DEBUG)
+        logger.set_level(logging.CRITICAL, console_only=True)
+        return logger
+
+    def read(self):
+        """
+        :return: The lines written to the file so far.
+        """
+        with open(self.filename, encoding='utf8') as f:
+            return [line.strip() for line in f]
+
+    def test_barrier(self):
+        logger = self.logger()
+        try:
+            for i in range(100):
+                logger.info('message {}'.format(i))
+
+            self.assertIsNone(logger.flush())
+
+            # Every message sent before the barrier is in the file once it is acknowledged, before the logger exits
+            duration = logger.flush(wait=True, timeout=FLUSH_TIMEOUT)
+            self.assertIsNotNone(duration)
+            self.assertGreaterEqual(duration, 0)
+            self.assertEqual(self.read(), ['message {}'.format(i) for i in range(100)])
+        finally:
+            logger.terminate()
+
+    def test_timeout(self):
+        logger = self.logger(StallingHandler)
+        try:
+            logger.info('stalled')
+
+            # The logger process is still writing the first record when the timeout expires
+            self.assertIsNone(logger.flush(wait=True, timeout=0.1))
+            self.assertIsNotNone(logger.flush(wait=True, timeout=FLUSH_TIMEOUT))
+            self.assertEqual(self.read(), ['stalled'])
+        finally:
+            logger.terminate()
+
+
+if __name__ == '__main__':
+    unittest.main()
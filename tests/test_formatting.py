@@ -0,0 +1,101 @@
+#!/bin/env/python
+# coding: utf-8
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from logging import FileHandler, Formatter
+
+from FancyLogger import FancyLogger, LazyArg
+from FancyLogger.commands import format_message
+
+
+class Point(object):
+    """
+    Object that is not sent as an argument, so its message is formatted by the process that logs it.
+    """
+
+    def __init__(self, x, y):
+        super(Point, self).__init__()
+
+        self.x = x
+        self.y = y
+
+    def __str__(self):
+        return '({}, {})'.format(self.x, self.y)
+
+
+class FormatMessageTest(unittest.TestCase):
+    """
+    Messages formatted with their arguments the same way as the standard logging module does.
+    """
+
+    def test_conversions(self):
+        self.assertEqual(format_message('100%'), '100%')
+        self.assertEqual(format_message('rows=%d ratio=%.1f', (3, 0.5)), 'rows=3 ratio=0.5')
+        self.assertEqual(format_message('%(rows)s rows', ({'rows': 3},)), '3 rows')
+        self.assertEqual(format_message('%(rows)s rows', kwargs={'rows': 3}), '3 rows')
+        self.assertEqual(format_message('%s', ({},)), '{}')
+
+    def test_failures(self):
+        # The format string is kept along with the arguments instead of raising
+        self.assertTrue(format_message('%s %s', (1,)).startswith('%s %s (cannot format (1,) {}: TypeError('))
+        self.assertIn('cannot mix', format_message('%s %(rows)s', (1,), {'rows': 3}))
+
+
+class DeferredFormattingTest(unittest.TestCase):
+    """
+    Messages formatted by the logger process, with arguments computed only when some output emits them.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'formatting.log')
+
+        handler = FileHandler(self.filename, encoding='utf8')
+        handler.setFormatter(Formatter('%(message)s'))
+
+        self.logger = FancyLogger(file_handlers=[handler], line_mode=True)
+        self.logger.set_level(logging.INFO)
+        self.logger.set_level(logging.CRITICAL + 1, console_only=True)
+
+        self.calls = 0
+
+    def tearDown(self):
+        self.logger.terminate()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def expensive(self):
+        """
+        :return: The value of a LazyArg, counting the calls.
+        """
+        self.calls += 1
+        return 'x' * 3
+
+    def test_messages(self):
+        self.logger.info('rows=%d of %s', 3, 'table')
+        self.logger.info('%(rows)s rows', {'rows': 4})
+        self.logger.info('%(rows)s rows', rows=5)
+        self.logger.info('point %s', Point(1, 2))
+        self.logger.info('lazy %s', LazyArg(self.expensive))
+
+        # Filtered messages do not compute their arguments
+        self.logger.debug('lazy %s', LazyArg(self.expensive))
+        self.assertEqual(self.calls, 1)
+
+        self.assertIsNotNone(self.logger.flush(wait=True, timeout=30))
+        with open(self.filename, encoding='utf8') as f:
+            self.assertEqual([line.strip() for line in f], ['rows=3 of table', '4 rows', '5 rows', 'point (1, 2)',
+                                                            'lazy xxx'])
+
+    def test_deferred_arguments(self):
+        # Primitive values are sent as they are, other objects are formatted now
+        self.assertEqual(self.logger.defer_arguments('%s %s', (1, LazyArg(self.expensive)), {}),
+                         ('%s %s', (1, 'xxx'), None))
+        self.assertEqual(self.logger.defer_arguments('%s', (Point(1, 2),), {}), ('(1, 2)', None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/bin/env/python
+# coding: utf-8
+
+import threading
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from FancyLogger import FuturesTracker
+
+
+class RecordingLogger(object):
+    """
+    Stands for a FancyLogger instance, recording the progress updates and exceptions it is given.
+    """
+
+    def __init__(self):
+        super(RecordingLogger, self).__init__()
+
+        self.tasks = []
+        self.updates = []
+        self.stacktraces = []
+        self.lock = threading.Lock()
+
+    def set_task_object(self, task_id, task_progress_object):
+        self.tasks.append(task_progress_object)
+        return len(self.tasks)
+
+    def update(self, task_id, progress, total=None):
+        with self.lock:
+            self.updates.append(progress)
+
+    def throw(self, stacktrace, process_title=None):
+        with self.lock:
+            self.stacktraces.append(stacktrace)
+
+
+def divide(value):
+    """
+    :param value:   A number.
+    :return:        The inverse of the number.
+    """
+    return 1. / value
+
+
+class FuturesTrackerTest(unittest.TestCase):
+    """
+    Progress bars driven by futures.
+    """
+
+    def setUp(self):
+        self.logger = RecordingLogger()
+
+    def test_executor(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(divide, value) for value in range(100)]
+            tracker = FuturesTracker(self.logger, futures, update_interval_millis=60000)
+            self.assertTrue(tracker.wait(timeout=30))
+
+        self.assertEqual(self.logger.tasks[0].total, 100)
+
+        # The first completion and the last one are sent, the others are throttled
+        self.assertEqual(self.logger.updates[-1], 100)
+        self.assertLessEqual(len(self.logger.updates), 2)
+
+        # Division by zero
+        self.assertEqual(len(tracker.failed_futures), 1)
+        self.assertIn('ZeroDivisionError', self.logger.stacktraces[0])
+
+    def test_cancelled(self):
+        futures = [Future() for _ in range(3)]
+        tracker = FuturesTracker(self.logger, futures, update_interval_millis=0)
+
+        futures[0].set_result(None)
+        futures[1].cancel()
+        futures[1].set_running_or_notify_cancel()
+        self.assertFalse(tracker.wait(timeout=0))
+
+        futures[2].set_result(None)
+        self.assertTrue(tracker.wait(timeout=0))
+        self.assertEqual(self.logger.updates, [1, 2, 3])
+        self.assertFalse(self.logger.stacktraces)
+
+    def test_empty(self):
+        self.assertTrue(FuturesTracker(self.logger, []).wait(timeout=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
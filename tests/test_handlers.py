@@ -0,0 +1,171 @@
+#!/bin/env/python
+# coding: utf-8
+
+import glob
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from logging import FileHandler, Formatter
+from multiprocessing import Process
+
+from FancyLogger import FancyLogger
+from FancyLogger.handlers import BridgeHandler, CompressedRotatingFileHandler
+
+
+def bridge(logger):
+    """
+    Forwards a record of the standard logging module from a producer process, which exits before its batch is sent.
+    :param logger: The FancyLogger instance.
+    """
+    logger.bridge_logging(logger_name='library', batch_millis=60000)
+    logging.getLogger('library').info('from worker %d', os.getpid())
+
+
+class CompressedRotatingFileHandlerTest(unittest.TestCase):
+    """
+    Files written by the compressed rotating handler.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'compressed.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def lines(self):
+        """
+        :return: The lines of all compressed files, oldest file first.
+        """
+        lines = []
+        for filename in sorted(glob.glob(self.filename + '.*.gz'), key=os.path.getmtime):
+            with gzip.open(filename, 'rt', encoding='utf8') as f:
+                lines.extend(line.rstrip('\n') for line in f)
+
+        return lines
+
+    def handler(self, **kwargs):
+        """
+        :return: A new handler writing plain messages, which only writes a frame when flushed or closed.
+        """
+        handler = CompressedRotatingFileHandler(self.filename, flush_interval_seconds=60, **kwargs)
+        handler.setFormatter(Formatter('%(message)s'))
+
+        return handler
+
+    def test_flush(self):
+        handler = self.handler()
+        log = logging.getLogger('compressed')
+        log.addHandler(handler)
+        try:
+            log.warning('first')
+            handler.flush()
+
+            # Each flush writes a complete gzip member, readable while the file is still open
+            self.assertEqual(self.lines(), ['first'])
+
+            log.warning('second')
+        finally:
+            log.removeHandler(handler)
+            handler.close()
+
+        self.assertEqual(self.lines(), ['first', 'second'])
+
+    def test_rotation(self):
+        handler = self.handler(max_bytes=1, max_total_bytes=0)
+        log = logging.getLogger('rotated')
+        log.addHandler(handler)
+        try:
+            for i in range(3):
+                log.warning('message %d', i)
+                handler.flush()
+        finally:
+            log.removeHandler(handler)
+            handler.close()
+
+        self.assertEqual(len(glob.glob(self.filename + '.*.gz')), 3)
+        self.assertEqual(self.lines(), ['message 0', 'message 1', 'message 2'])
+
+    def test_replaced_handler(self):
+        logger = FancyLogger(file_handlers=[self.handler()], line_mode=True)
+        try:
+            logger.set_level(logging.INFO)
+            logger.set_level(logging.CRITICAL, console_only=True)
+            logger.info('before')
+
+            # The records buffered by the replaced handler are written when it is closed
+            other = FileHandler(os.path.join(self.directory, 'other.log'))
+            logger.set_configuration(file_handlers=[other], console_level=logging.CRITICAL)
+            logger.info('after')
+            self.assertIsNotNone(logger.flush(wait=True, timeout=30))
+
+            self.assertEqual([line.strip() for line in self.lines()], ['before'])
+        finally:
+            logger.terminate()
+
+
+class BridgeHandlerTest(unittest.TestCase):
+    """
+    Records of the standard logging module forwarded to the logger process.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'bridge.log')
+
+        handler = FileHandler(self.filename, encoding='utf8')
+        handler.setFormatter(Formatter('%(message)s'))
+
+        self.logger = FancyLogger(file_handlers=[handler], line_mode=True)
+        self.logger.set_level(logging.DEBUG)
+        self.logger.set_level(logging.CRITICAL, console_only=True)
+
+    def tearDown(self):
+        standard_logger = logging.getLogger('library')
+        for handler in [h for h in standard_logger.handlers if isinstance(h, BridgeHandler)]:
+            standard_logger.removeHandler(handler)
+            handler.close()
+
+        self.logger.terminate()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def read(self):
+        """
+        :return: The lines written to the file once every command sent so far has been applied.
+        """
+        self.assertIsNotNone(self.logger.flush(wait=True, timeout=30))
+
+        with open(self.filename, encoding='utf8') as f:
+            return [line.strip() for line in f]
+
+    def test_batch_interval(self):
+        handler = self.logger.bridge_logging(logger_name='library', batch_millis=50)
+        logging.getLogger('library').info('first')
+        logging.getLogger('library').debug('filtered')
+
+        # The background thread sends the batch once the interval has elapsed, without any flush
+        deadline = time.time() + 30
+        while handler.batch and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(handler.batch, [])
+
+        logging.getLogger('library').info('second')
+        self.assertEqual(self.read(), ['[library] first', '[library] second'])
+
+    def test_process_exit(self):
+        processes = [Process(target=bridge, args=(self.logger,)) for _ in range(3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        # The batch of each producer process is sent when it exits
+        self.assertEqual(sorted(self.read()), sorted('[library] from worker {}'.format(p.pid) for p in processes))
+
+
+if __name__ == '__main__':
+    unittest.main()
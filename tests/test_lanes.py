@@ -0,0 +1,50 @@
+#!/bin/env/python
+# coding: utf-8
+
+import logging
+import unittest
+
+from FancyLogger.commands import CONTROL_LANE, ERROR_LANE, MESSAGE_LANE, PROGRESS_LANE, ExitCommand, FlushCommand, \
+    LogMessageCommand, SetLevelCommand, StacktraceCommand, UpdateProgressCommand, command_lane, is_barrier
+from roundtrip import WORKERS, RoundTripTest
+
+
+class CommandLaneTest(unittest.TestCase):
+    """
+    Priority lanes through which commands are sent.
+    """
+
+    def test_lanes(self):
+        self.assertEqual(command_lane(StacktraceCommand(pid=1, stacktrace='Traceback', process_title=None)),
+                         ERROR_LANE)
+        self.assertEqual(command_lane(LogMessageCommand(text='failed', level=logging.ERROR)), ERROR_LANE)
+        self.assertEqual(command_lane(LogMessageCommand(text='done', level=logging.INFO)), MESSAGE_LANE)
+        self.assertEqual(command_lane(UpdateProgressCommand(task_id='task', progress=1)), PROGRESS_LANE)
+        self.assertEqual(command_lane(SetLevelCommand(level=logging.INFO)), CONTROL_LANE)
+
+    def test_barriers(self):
+        # Configuration commands wait for the other lanes only when given a barrier identifier
+        self.assertTrue(is_barrier(ExitCommand()))
+        self.assertTrue(is_barrier(FlushCommand(barrier=1)))
+        self.assertTrue(is_barrier(SetLevelCommand(level=logging.INFO, barrier=2)))
+        self.assertFalse(is_barrier(FlushCommand()))
+        self.assertFalse(is_barrier(SetLevelCommand(level=logging.INFO)))
+
+
+class PriorityLanesRoundTripTest(RoundTripTest):
+    """
+    Round trips through the priority lanes.
+    """
+
+    def test_priority_lanes(self):
+        records = self.round_trip(logger_options={'priority_lanes': True}, level_change=True, errors=True)
+
+        # Errors and other messages go through different lanes, so they are only ordered with each other
+        self.assertInOrder(records, workers=WORKERS + 1, errors=True)
+
+        # The level change is applied after the messages sent before it, and before the ones sent after it
+        self.assertFalse([text for _, text in records if text.strip().endswith('filtered')])
+
+
+if __name__ == '__main__':
+    unittest.main()
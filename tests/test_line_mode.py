@@ -0,0 +1,60 @@
+#!/bin/env/python
+# coding: utf-8
+
+import os
+import subprocess
+import sys
+import unittest
+
+SCRIPT = '''
+from FancyLogger import FancyLogger
+
+logger = FancyLogger(line_progress_interval_millis={interval})
+logger.set_task(task_id='task', total=10, prefix='task')
+for i in range(1, 11):
+    logger.update(task_id='task', progress=i)
+    logger.info('message %d', i)
+logger.flush(wait=True)
+logger.terminate()
+'''
+"Program whose output is piped, so that the logger process falls back to line mode."
+
+
+class LineModeTest(unittest.TestCase):
+    """
+    Output of the logger process when its standard output is not a terminal.
+    """
+
+    def output(self, interval):
+        """
+        Runs the program with its output piped.
+        :param interval:    The minimum time lapse in milliseconds between two progress summaries.
+        :return:            The lines written by the program.
+        """
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, '-c', SCRIPT.format(interval=interval)],
+                                stdout=subprocess.PIPE,
+                                env=dict(os.environ, PYTHONPATH=root),
+                                timeout=60,
+                                check=True)
+
+        return result.stdout.decode('utf8').splitlines()
+
+    def test_lines(self):
+        lines = self.output(interval=0)
+
+        # Appended lines only, without cursor movements nor screen clearing
+        self.assertFalse([line for line in lines if '\033' in line])
+        self.assertEqual([line.split('\t')[1] for line in lines if '[INFO]' in line],
+                         ['message {}'.format(i) for i in range(1, 11)])
+        self.assertIn('task 100 % (10/10)', [line.split('\t')[1] for line in lines if '[PROGRESS]' in line])
+
+    def test_progress_interval(self):
+        progress = [line.split('\t')[1] for line in self.output(interval=60000) if '[PROGRESS]' in line]
+
+        # Updates within an interval are summarized by the latest state
+        self.assertEqual(progress, ['task 100 % (10/10)'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/bin/env/python
+# coding: utf-8
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from FancyLogger import FancyLogger, MapFailure
+from FancyLogger.mapping import ChunkSizer
+from FancyLogger.sinks import JsonLinesSink
+
+
+def square(value):
+    """
+    Squares a number, failing on multiples of 5.
+    :param value:   The number.
+    :return:        Its square.
+    """
+    if value % 5 == 0:
+        raise ValueError('multiple of 5: {}'.format(value))
+
+    return value * value
+
+
+class ProgressMapTest(unittest.TestCase):
+    """
+    Results and progress of 'progress_map'.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'progress.jsonl')
+
+        # The sink records the first update and the completion of each bar
+        self.logger = FancyLogger(sinks=[JsonLinesSink(self.filename, progress_mode='sample',
+                                                       progress_interval_millis=60000)],
+                                  line_mode=True,
+                                  console_level=logging.CRITICAL + 1)
+
+    def tearDown(self):
+        self.logger.terminate()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def final_progress(self):
+        """
+        :return: The last recorded state (progress, total) of the bar of the map.
+        """
+        self.assertIsNotNone(self.logger.flush(wait=True, timeout=30))
+        self.logger.terminate()
+
+        with open(self.filename, encoding='utf8') as f:
+            records = [json.loads(line) for line in f]
+
+        return [(r['progress'], r['total']) for r in records if r['level'] == 'PROGRESS'][-1]
+
+    def test_results(self):
+        results = list(self.logger.progress_map(square, range(1, 21), processes=2, chunksize=3))
+
+        # Failed items are replaced, so results stay aligned with the items
+        self.assertEqual([r for r in results if not isinstance(r, MapFailure)],
+                         [i * i for i in range(1, 21) if i % 5])
+        self.assertEqual([i for i, r in enumerate(results, 1) if isinstance(r, MapFailure)], [5, 10, 15, 20])
+        self.assertIn('ValueError: multiple of 5: 10', results[9].stacktrace)
+        self.assertEqual(self.final_progress(), (20, 20))
+
+    def test_unordered(self):
+        results = self.logger.progress_map(square, iter(range(1, 21)), processes=2, chunksize=3, ordered=False)
+
+        self.assertEqual(sorted(r for r in results if not isinstance(r, MapFailure)),
+                         [i * i for i in range(1, 21) if i % 5])
+        self.assertEqual(self.final_progress(), (20, 20))
+
+    def test_unpicklable_function(self):
+        # Every chunk fails before reaching a worker
+        results = list(self.logger.progress_map(lambda value: value, range(10), processes=2, chunksize=4))
+
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(isinstance(r, MapFailure) for r in results))
+        self.assertEqual(self.final_progress(), (10, 10))
+
+
+class ChunkSizerTest(unittest.TestCase):
+    """
+    Sizes of the chunks given to workers.
+    """
+
+    def test_sizes(self):
+        sizer = ChunkSizer(target_millis=100, max_size=1000)
+        self.assertEqual(sizer.size, 1)
+
+        sizer.measure(items=10, duration=0.01)
+        self.assertEqual(sizer.size, 100)
+
+        sizer.measure(items=10, duration=0.)
+        self.assertEqual(sizer.size, 125)
+
+        sizer.measure(items=1, duration=0.)
+        sizer.measure(items=0, duration=1.)
+        self.assertLessEqual(sizer.size, 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
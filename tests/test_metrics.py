@@ -0,0 +1,122 @@
+#!/bin/env/python
+# coding: utf-8
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from logging import FileHandler, Formatter
+from multiprocessing import Process
+
+from FancyLogger import FancyLogger
+from FancyLogger.metrics import Histogram
+
+WORKERS = 3
+"Number of producer processes of each test."
+
+
+def work(logger):
+    """
+    Records spans from a producer process, which exits before the metrics interval elapses and without flushing.
+    :param logger: The FancyLogger instance.
+    """
+    for _ in range(10):
+        with logger.span('work'):
+            pass
+
+
+def count(logger):
+    """
+    Increments a counter and sets a gauge from a producer process, which exits without flushing.
+    :param logger: The FancyLogger instance.
+    """
+    for _ in range(5):
+        logger.counter('rows written').inc()
+    logger.gauge('queue').set(7)
+
+
+class MetricsTest(unittest.TestCase):
+    """
+    Metrics aggregated across processes by the logger process.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'metrics.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def summary(self, target, gauge_owner=None, **logger_options):
+        """
+        Runs producer processes, then reads the metrics summary written by the logger process when it exits.
+        :param target:          The function run by each producer process with the logger.
+        :param gauge_owner:     [Optional] Function run by the current process with the logger once the producer
+                                processes have exited.
+        :param logger_options:  Additional FancyLogger parameters.
+        :return:                The lines of the summary.
+        """
+        handler = FileHandler(self.filename, encoding='utf8')
+        handler.setFormatter(Formatter('%(message)s'))
+
+        logger = FancyLogger(file_handlers=[handler], line_mode=True, metrics_interval_millis=60000, **logger_options)
+        try:
+            logger.set_level(logging.INFO)
+            logger.set_level(logging.CRITICAL, console_only=True)
+
+            processes = [Process(target=target, args=(logger,)) for _ in range(WORKERS)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+            if gauge_owner:
+                gauge_owner(logger)
+        finally:
+            logger.terminate()
+
+        with open(self.filename, encoding='utf8') as f:
+            return [line.strip() for line in f]
+
+    def test_process_exit(self):
+        # The spans aggregated by each producer process are sent when it exits
+        lines = self.summary(work)
+        self.assertTrue([line for line in lines if line.startswith('Span work: {} calls'.format(WORKERS * 10))])
+
+    def test_counters_and_gauges(self):
+        textfile = os.path.join(self.directory, 'metrics.prom')
+
+        def run(logger):
+            count(logger)
+            logger.gauge('queue').set(1)
+
+        # The gauges of the producer processes are dropped when they exit, only the current process is left
+        lines = self.summary(count, metrics_textfile=textfile, gauge_owner=run)
+        self.assertIn('Counter rows written: {}'.format(WORKERS * 5 + 5), lines)
+        self.assertIn('Gauge queue: 1 in 1 processes', lines)
+
+        with open(textfile, encoding='utf8') as f:
+            text = f.read()
+        self.assertIn('# TYPE rows_written counter\nrows_written {}\n'.format(WORKERS * 5 + 5), text)
+        self.assertIn('queue{{pid="{}"}} 1\n'.format(os.getpid()), text)
+
+    def test_histogram(self):
+        first = Histogram()
+        second = Histogram()
+        for i in range(1, 101):
+            (first if i % 2 else second).add(i / 1000.)
+        first.merge(second)
+
+        self.assertEqual((first.count, first.min, first.max), (100, 0.001, 0.1))
+        self.assertAlmostEqual(first.sum, 5.05)
+
+        # Percentiles are known within the bucket precision
+        self.assertAlmostEqual(first.percentile(50), 0.05, delta=0.05 * 0.1)
+        self.assertAlmostEqual(first.percentile(99), 0.099, delta=0.099 * 0.1)
+        self.assertEqual(sum(count for _, count in first.items()), 100)
+        self.assertIsNone(Histogram().percentile(50))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+#!/bin/env/python
+# coding: utf-8
+
+import logging
+import os
+import pickle
+import queue
+import socket
+import threading
+import unittest
+
+import dill
+
+from FancyLogger.commands import LogMessageCommand, NodeConnectionCommand, RemoteCommand
+from FancyLogger.network import CollectorServer, decode_frame, decode_remote_command, encode_frame
+from FancyLogger.processing import MultiprocessingLogger
+from FancyLogger.tasks import TaskTable
+
+SECRET = b'shared secret'
+"Secret shared by the collector and the remote nodes of the tests."
+
+
+class Exploit(object):
+    """
+    Object whose unpickling runs a shell command.
+    """
+
+    def __reduce__(self):
+        return os.system, ('true',)
+
+
+class FrameTest(unittest.TestCase):
+    """
+    Frames exchanged between remote nodes and the collector.
+    """
+
+    def exchange(self, frame, secret=SECRET):
+        """
+        Sends a frame through a socket pair, then decodes it on the other end.
+        :param frame:   The frame bytes.
+        :param secret:  [Optional] The secret the receiving end checks the signature with.
+        :return:        The decoded frame, or None if it has been refused.
+        """
+        sender, receiver = socket.socketpair()
+        try:
+            sender.sendall(frame)
+            sender.close()
+            return decode_frame(receiver, secret)
+        finally:
+            receiver.close()
+
+    def test_signed_frame(self):
+        commands = [pickle.dumps(LogMessageCommand(text='hello', level=logging.INFO))]
+        node, session, sequence, received = self.exchange(encode_frame(SECRET, 'node', 'session', 3, commands))
+
+        self.assertEqual((node, session, sequence), ('node', 'session', 3))
+        self.assertEqual(decode_remote_command(received[0]).text, 'hello')
+
+    def test_wrong_secret(self):
+        frame = encode_frame(b'other secret', 'node', 'session', 0, [])
+        self.assertIsNone(self.exchange(frame))
+
+    def test_tampered_frame(self):
+        frame = bytearray(encode_frame(SECRET, 'node', 'session', 0, []))
+        frame[-1] ^= 1
+        self.assertIsNone(self.exchange(bytes(frame)))
+
+    def test_refused_globals(self):
+        with self.assertRaises(pickle.UnpicklingError):
+            decode_remote_command(pickle.dumps(Exploit()))
+
+        with self.assertRaises(pickle.UnpicklingError):
+            decode_remote_command(pickle.dumps(threading.Thread))
+
+
+class CollectorTest(unittest.TestCase):
+    """
+    Batches received by the collector and connections of remote nodes.
+    """
+
+    def setUp(self):
+        self.queue = queue.Queue()
+        self.server = CollectorServer(address=('127.0.0.1', 0), queue=self.queue, secret=SECRET)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def received(self):
+        """
+        :return: The next command pushed into the logger queue.
+        """
+        return dill.loads(self.queue.get(timeout=5))
+
+    def test_connection(self):
+        commands = [pickle.dumps(LogMessageCommand(text='hello', level=logging.INFO))]
+        with socket.create_connection(self.server.server_address) as connection:
+            connection.sendall(encode_frame(SECRET, 'node', 'session', 0, commands))
+
+            opened = self.received()
+            self.assertIsInstance(opened, NodeConnectionCommand)
+            self.assertEqual((opened.node, opened.connected), ('node', True))
+
+            command = self.received()
+            self.assertIsInstance(command, RemoteCommand)
+            self.assertEqual(command.node, 'node')
+
+        closed = self.received()
+        self.assertIsInstance(closed, NodeConnectionCommand)
+        self.assertEqual((closed.node, closed.connected), ('node', False))
+
+    def test_unsigned_connection(self):
+        with socket.create_connection(self.server.server_address) as connection:
+            connection.sendall(encode_frame(b'other secret', 'node', 'session', 0, []))
+            self.assertEqual(connection.recv(1), b'')
+
+        self.assertTrue(self.queue.empty())
+
+
+class NodeRemovalTest(unittest.TestCase):
+    """
+    Tasks of remote nodes once their connections have closed.
+    """
+
+    def setUp(self):
+        self.logger = MultiprocessingLogger.__new__(MultiprocessingLogger)
+        self.logger.tasks = TaskTable()
+        self.logger.node_tasks = {'node': TaskTable()}
+        self.logger.node_connections = {}
+        self.logger.node_departures = {}
+        self.logger.gauges = {'queue': {'node:1': 2, 'other:1': 3}}
+        self.logger.line_mode = False
+        self.logger.redraw = lambda: None
+
+    def test_departed_node(self):
+        self.logger.count_connection(NodeConnectionCommand(node='node', connected=True))
+        self.logger.count_connection(NodeConnectionCommand(node='node', connected=True))
+        self.logger.count_connection(NodeConnectionCommand(node='node', connected=False))
+
+        # One connection is still open
+        self.logger.node_millis_to_removal = 0
+        self.logger.drop_departed_nodes()
+        self.assertIn('node', self.logger.node_tasks)
+
+        self.logger.count_connection(NodeConnectionCommand(node='node', connected=False))
+        self.logger.drop_departed_nodes()
+        self.assertNotIn('node', self.logger.node_tasks)
+        self.assertFalse(self.logger.node_departures)
+
+        # So are the gauges set by its processes
+        self.assertEqual(self.logger.gauges, {'queue': {'other:1': 3}})
+
+    def test_reconnected_node(self):
+        self.logger.count_connection(NodeConnectionCommand(node='node', connected=True))
+        self.logger.count_connection(NodeConnectionCommand(node='node', connected=False))
+        self.logger.count_connection(NodeConnectionCommand(node='node', connected=True))
+
+        self.logger.node_millis_to_removal = 0
+        self.logger.drop_departed_nodes()
+        self.assertIn('node', self.logger.node_tasks)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/bin/env/python
+# coding: utf-8
+
+import unittest
+
+from FancyLogger.ordering import ReorderWindow
+from roundtrip import RoundTripTest
+
+
+class ReorderWindowTest(unittest.TestCase):
+    """
+    Records of many processes merged in timestamp order.
+    """
+
+    def test_merge(self):
+        window = ReorderWindow(delay_millis=100)
+        window.push(stream=1, sequence=0, timestamp=10., item='a0')
+        window.push(stream=2, sequence=0, timestamp=9., item='b0')
+        window.push(stream=1, sequence=1, timestamp=11., item='a1')
+        window.push(stream=2, sequence=1, timestamp=10.5, item='b1')
+
+        self.assertEqual(len(window), 4)
+        self.assertEqual(window.release(), ['b0', 'a0', 'b1', 'a1'])
+        self.assertEqual(len(window), 0)
+        self.assertIsNone(window.pop())
+
+    def test_sequences(self):
+        window = ReorderWindow(delay_millis=100)
+
+        # The records of a process keep their order even if its clock goes backwards, or if they arrive out of order
+        window.push(stream=1, sequence=0, timestamp=10., item='a0')
+        window.push(stream=1, sequence=2, timestamp=8., item='a2')
+        window.push(stream=1, sequence=1, timestamp=9., item='a1')
+        window.push(stream=2, sequence=None, timestamp=9.5, item='b0')
+        window.push(stream=2, sequence=None, timestamp=9.5, item='b1')
+
+        self.assertEqual(window.release(), ['b0', 'b1', 'a0', 'a1', 'a2'])
+
+    def test_delay_and_capacity(self):
+        window = ReorderWindow(delay_millis=100, capacity=2)
+        for i in range(3):
+            window.push(stream=i, sequence=0, timestamp=10. + i / 100., item=i)
+
+        # The oldest record is released at once beyond the capacity, the others once they have waited the delay
+        self.assertEqual(window.release(now=10.), [0])
+        self.assertEqual(window.release(now=10.05), [])
+        self.assertEqual(window.release(now=10.115), [1])
+        self.assertEqual(window.release(now=10.2), [2])
+
+
+class ReorderRoundTripTest(RoundTripTest):
+    """
+    Round trips through the reorder window of the logger process.
+    """
+
+    def test_reorder(self):
+        self.assertInOrder(self.round_trip(logger_options={'reorder_delay_millis': 20}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/bin/env/python
+# coding: utf-8
+
+import pickle
+import unittest
+from multiprocessing.shared_memory import SharedMemory
+
+from FancyLogger.commands import LogMessageCommand, decode_command
+from FancyLogger.transport import PAYLOAD_REFERENCE, share_payload
+from roundtrip import RoundTripTest
+
+
+class SharedPayloadTest(unittest.TestCase):
+    """
+    Large commands passed through shared memory blocks of their own.
+    """
+
+    def test_reference(self):
+        command = LogMessageCommand(text='x' * 100000, level=20)
+        reference = share_payload(pickle.dumps(command))
+
+        # Only the reference goes through the transport
+        self.assertLess(len(reference), 100)
+        name = reference[PAYLOAD_REFERENCE.size:].decode('ascii')
+
+        self.assertEqual(decode_command(reference).text, command.text)
+
+        # The block is destroyed once read
+        with self.assertRaises(FileNotFoundError):
+            SharedMemory(name=name)
+
+
+class SharedPayloadRoundTripTest(RoundTripTest):
+    """
+    Round trips of messages larger than the shared payload size, through each transport.
+    """
+
+    def test_queue(self):
+        records = self.round_trip(logger_options={'large_payload_size': 256}, padding=1024)
+        self.assertInOrder(records, padding=1024)
+
+    def test_ring(self):
+        records = self.round_trip(logger_options={'transport': 'ring', 'large_payload_size': 256}, padding=1024)
+        self.assertInOrder(records, padding=1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/bin/env/python
+# coding: utf-8
+
+import gc
+import unittest
+
+from FancyLogger import ProgressIterator
+
+
+class RecordingLogger(object):
+    """
+    Stands for a FancyLogger instance, recording the progress updates it is given.
+    """
+
+    def __init__(self):
+        super(RecordingLogger, self).__init__()
+
+        self.tasks = []
+        self.updates = []
+
+    def set_task_object(self, task_id, task_progress_object):
+        self.tasks.append(task_progress_object)
+        return len(self.tasks)
+
+    def update(self, task_id, progress, total=None):
+        self.updates.append((task_id, progress, total))
+
+
+def items(count):
+    """
+    Generator of unknown length.
+    :param count: The number of items.
+    """
+    for i in range(count):
+        yield i
+
+
+class ProgressIteratorTest(unittest.TestCase):
+    """
+    Progress bars driven by iterations.
+    """
+
+    def setUp(self):
+        self.logger = RecordingLogger()
+
+    def test_known_length(self):
+        self.assertEqual(list(ProgressIterator(self.logger, range(5), update_interval_millis=0)), list(range(5)))
+
+        self.assertEqual(self.logger.tasks[0].total, 5)
+        self.assertEqual(self.logger.updates, [(1, i, None) for i in range(1, 6)] + [(1, 5, 5)])
+
+    def test_unknown_length(self):
+        self.assertEqual(list(ProgressIterator(self.logger, items(5), update_interval_millis=60000)), list(range(5)))
+
+        # Updates are throttled, the final count becomes the total
+        self.assertIsNone(self.logger.tasks[0].total)
+        self.assertEqual(self.logger.updates, [(1, 5, 5)])
+
+    def test_nested(self):
+        for _ in ProgressIterator(self.logger, range(2), update_interval_millis=60000):
+            for _ in ProgressIterator(self.logger, items(3), update_interval_millis=60000):
+                pass
+
+        self.assertEqual(len(self.logger.tasks), 3)
+        self.assertEqual(self.logger.updates, [(2, 3, 3), (3, 3, 3), (1, 2, 2)])
+
+    def test_break(self):
+        for i in ProgressIterator(self.logger, items(10), update_interval_millis=60000):
+            if i == 3:
+                break
+        gc.collect()
+
+        # The iterator dropped by the loop completes its indeterminate bar
+        self.assertEqual(self.logger.updates, [(1, 4, 4)])
+
+    def test_break_known_length(self):
+        for i in ProgressIterator(self.logger, range(10), update_interval_millis=60000):
+            if i == 3:
+                break
+        gc.collect()
+
+        self.assertEqual(self.logger.updates, [(1, 4, None)])
+
+    def test_with(self):
+        with ProgressIterator(self.logger, items(10), update_interval_millis=60000) as iterator:
+            for i in iterator:
+                if i == 3:
+                    break
+
+            self.assertEqual(self.logger.updates, [])
+
+        self.assertEqual(self.logger.updates, [(1, 4, 4)])
+        del iterator
+        gc.collect()
+        self.assertEqual(len(self.logger.updates), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/bin/env/python
+# coding: utf-8
+
+import contextlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from FancyLogger.commands import LogMessageCommand
+from FancyLogger.query import Segment, main, query
+from FancyLogger.sinks import BinaryIndexedSink, segment_filenames
+
+START = 1500000000.
+"Timestamp of the first record of the tests."
+
+
+class BinaryIndexedSinkTest(unittest.TestCase):
+    """
+    Binary logs written by BinaryIndexedSink and read back by the query tool.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'binary')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, count, close=True, **kwargs):
+        """
+        Writes records one second apart, alternately INFO and ERROR, from pids 1 to 4.
+        :param count:   The number of records.
+        :param close:   [Optional] If False, the sink is flushed but its segment is left open.
+        :param kwargs:  Additional BinaryIndexedSink parameters.
+        :return:        The sink.
+        """
+        sink = BinaryIndexedSink(self.filename, index_interval=16, **kwargs)
+        for i in range(count):
+            sink.emit_message(LogMessageCommand(text='message {}'.format(i),
+                                                level=logging.ERROR if i % 2 else logging.INFO,
+                                                pid=i % 4 + 1,
+                                                timestamp=START + i))
+        if close:
+            sink.close()
+        else:
+            sink.flush()
+
+        return sink
+
+    def test_round_trip(self):
+        self.write(100)
+
+        records = list(query(self.filename))
+        self.assertEqual(len(records), 100)
+        self.assertEqual(records[7], (START + 7, logging.ERROR, 4, None, 'message 7'))
+
+    def test_filters(self):
+        self.write(100)
+
+        records = list(query(self.filename, start=START + 10, end=START + 19, levels=[logging.ERROR], pids=[2, 4]))
+        self.assertEqual([text for _, _, _, _, text in records], ['message {}'.format(i) for i in range(11, 20, 2)])
+
+    def test_sparse_index(self):
+        self.write(100)
+
+        segment = Segment(segment_filenames(self.filename)[0])
+        try:
+            self.assertEqual(len(segment.index['time_index']), 7)
+
+            # Only the block holding the time range is read
+            self.assertEqual(len(segment.candidates(start=START + 20, end=START + 25)), 16)
+        finally:
+            segment.close()
+
+    def test_segments(self):
+        self.write(100, segment_bytes=1024, batch_size=8)
+
+        self.assertGreater(len(segment_filenames(self.filename)), 1)
+        self.assertEqual([text for _, _, _, _, text in query(self.filename)],
+                         ['message {}'.format(i) for i in range(100)])
+
+    def test_open_segment(self):
+        # The index is written once, the records flushed since are scanned by the reader
+        sink = self.write(40, close=False, batch_size=1, index_write_interval_millis=0)
+        sink.index_write_interval_millis = 3600000
+        for i in range(40, 50):
+            sink.emit_message(LogMessageCommand(text='message {}'.format(i), level=logging.INFO, timestamp=START + i))
+        sink.flush()
+
+        with open('{}.idx'.format(sink.segment_filename)) as f:
+            self.assertLess(json.load(f)['records'], 50)
+        self.assertEqual(len(list(query(self.filename))), 50)
+
+        sink.close()
+
+    def test_stale_index(self):
+        self.write(20)
+
+        # Indexes of another version are rebuilt from the record headers
+        filename = '{}.idx'.format(segment_filenames(self.filename)[0])
+        with open(filename, 'w') as f:
+            json.dump({'version': 1, 'time_index': [], 'levels': {}}, f)
+
+        self.assertEqual(len(list(query(self.filename, levels=[logging.INFO]))), 10)
+
+    def test_command_line(self):
+        self.write(10)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            main([self.filename, '--min-level', 'WARNING', '--pid', '2', '--time-format', '%Y'])
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].endswith('[ERROR] [2]\tmessage 1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/bin/env/python
+# coding: utf-8
+
+import contextlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from FancyLogger import FancyLogger
+from FancyLogger.replay import ReplayLogger, SessionPlayer, main
+
+
+class ReplayTest(unittest.TestCase):
+    """
+    Sessions recorded by the logger process and read back by the replay tool.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'session.rec')
+
+        logger = FancyLogger(record_filename=self.filename, line_mode=True, console_level=logging.CRITICAL)
+        try:
+            logger.set_task(task_id='task', total=10, prefix='task')
+            logger.update(task_id='task', progress=4)
+            logger.critical('recorded message')
+            self.assertIsNotNone(logger.flush(wait=True, timeout=30))
+        finally:
+            logger.terminate()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def state(self, player):
+        """
+        Applies a whole session to a new replay logger, without drawing.
+        :param player:  The SessionPlayer object.
+        :return:        The ReplayLogger object.
+        """
+        logger = ReplayLogger()
+        player.seek(logger, player.end_time)
+
+        return logger
+
+    def test_seek(self):
+        player = SessionPlayer(self.filename)
+        try:
+            self.assertTrue(player.keyframes)
+            logger = self.state(player)
+        finally:
+            player.close()
+
+        self.assertEqual(logger.tasks['task'].progress, 4)
+        self.assertTrue(logger.messages[-1].rstrip().endswith('recorded message'))
+
+    def test_unfinished_session(self):
+        player = SessionPlayer(self.filename)
+        count = len(player.records)
+        player.close()
+
+        # The last record of a session whose logger process was killed may be incomplete
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        with open(self.filename, 'wb') as f:
+            f.write(data[:-1])
+
+        player = SessionPlayer(self.filename)
+        try:
+            self.assertEqual(len(player.records), count - 1)
+            self.assertEqual(self.state(player).tasks['task'].progress, 4)
+        finally:
+            player.close()
+
+    def test_empty_session(self):
+        open(self.filename, 'wb').close()
+
+        player = SessionPlayer(self.filename)
+        try:
+            self.assertEqual((player.records, player.start_time, player.end_time), ([], 0, 0))
+        finally:
+            player.close()
+
+    def test_command_line(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            main([self.filename, '--info'])
+
+        self.assertRegex(output.getvalue(), r'^\d+ records, [1-9]\d* keyframes, [\d.]+ seconds\n$')
+
+
+if __name__ == '__main__':
+    unittest.main()
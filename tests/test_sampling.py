@@ -0,0 +1,68 @@
+#!/bin/env/python
+# coding: utf-8
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from FancyLogger import FancyLogger
+from FancyLogger.sampling import SamplingRates, is_kept
+from FancyLogger.sinks import JsonLinesSink
+
+
+class SamplingTest(unittest.TestCase):
+    """
+    Deterministic sampling of the messages of each call site.
+    """
+
+    def test_positions(self):
+        kept = [count for count in range(1, 21) if is_kept(0.25, count)]
+
+        # Exactly one message out of four, at the same positions every time
+        self.assertEqual(kept, [4, 8, 12, 16, 20])
+        self.assertEqual([count for count in range(1, 21) if is_kept(0.25, count)], kept)
+        self.assertTrue(all(is_kept(1., count) for count in range(1, 21)))
+
+    def test_weights(self):
+        rates = SamplingRates(console_rates={logging.DEBUG: 0.}, file_rates={logging.DEBUG: 0.5})
+
+        self.assertEqual([rates.weights(logging.DEBUG, count) for count in (1, 2)], [(0., 0.), (0., 2.)])
+        self.assertEqual(rates.weights(logging.ERROR, 1), (1., 1.))
+
+        # Rates are clamped, and only standard levels can be sampled
+        rates.update(file_rates={logging.DEBUG: 2})
+        self.assertEqual(rates.weights(logging.DEBUG, 1), (0., 1.))
+        with self.assertRaises(ValueError):
+            rates.update(console_rates={15: 0.5})
+
+    def test_sink_weights(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'sampled.jsonl')
+            logger = FancyLogger(sinks=[JsonLinesSink(filename)], line_mode=True,
+                                 file_sampling_rates={logging.INFO: 0.1})
+            try:
+                logger.set_level(logging.DEBUG)
+                logger.set_level(logging.CRITICAL, console_only=True)
+                for i in range(100):
+                    logger.info('message %d', i)
+                logger.error('not sampled')
+            finally:
+                logger.terminate()
+
+            with open(filename, encoding='utf8') as f:
+                records = [json.loads(line) for line in f]
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        # Each kept message stands for the ones dropped at its call site
+        self.assertEqual([r['text'] for r in records[:-1]], ['message {}'.format(i) for i in range(9, 100, 10)])
+        self.assertEqual({r['weight'] for r in records[:-1]}, {10.})
+        self.assertEqual((records[-1]['text'], records[-1]['weight']), ('not sampled', 1.))
+
+
+if __name__ == '__main__':
+    unittest.main()
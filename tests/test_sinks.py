@@ -0,0 +1,95 @@
+#!/bin/env/python
+# coding: utf-8
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from FancyLogger import FancyLogger
+from FancyLogger.sinks import JsonLinesSink
+
+
+class JsonLinesSinkTest(unittest.TestCase):
+    """
+    Records written by the JSON Lines sink of a logger process.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'records.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def records(self, sink, send):
+        """
+        Runs a logger feeding the given sink, then reads the file it wrote.
+        :param sink:    The JsonLinesSink object.
+        :param send:    Function called with the logger to send commands.
+        :return:        List of the records as dictionaries.
+        """
+        logger = FancyLogger(sinks=[sink], line_mode=True)
+        try:
+            logger.set_level(logging.DEBUG)
+            logger.set_level(logging.CRITICAL, console_only=True)
+            send(logger)
+        finally:
+            logger.terminate()
+
+        with open(self.filename, encoding='utf8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_messages(self):
+        def send(logger):
+            logger.debug('debug message')
+            logger.info('info message')
+            logger.error('error message')
+            logger.throw('Traceback: error', process_title='worker')
+
+        records = self.records(JsonLinesSink(self.filename, level=logging.INFO), send)
+
+        self.assertEqual([(r['level'], r['text']) for r in records], [('INFO', 'info message'),
+                                                                      ('ERROR', 'error message'),
+                                                                      ('EXCEPTION', 'Traceback: error')])
+        self.assertEqual({r['pid'] for r in records}, {os.getpid()})
+        self.assertEqual(records[2]['process_title'], 'worker')
+        self.assertEqual(set(records[0]), {'time', 'level', 'pid', 'process_title', 'task_id', 'progress', 'total',
+                                           'text', 'weight'})
+
+    def test_sampled_progress(self):
+        def send(logger):
+            logger.set_task(task_id='task', total=10, prefix='task')
+            for i in range(1, 11):
+                logger.update(task_id='task', progress=i)
+
+        records = self.records(JsonLinesSink(self.filename, progress_mode='sample', progress_interval_millis=60000),
+                               send)
+
+        # The first update and the completion
+        self.assertEqual([(r['task_id'], r['progress'], r['total']) for r in records], [('task', 1, 10),
+                                                                                       ('task', 10, 10)])
+
+    def test_coalesced_progress(self):
+        def send(logger):
+            for task_id in ('a', 'b'):
+                logger.set_task(task_id=task_id, total=10, prefix=task_id)
+            for i in range(1, 6):
+                logger.update(task_id='a', progress=i)
+                logger.update(task_id='b', progress=i * 2)
+
+        records = self.records(JsonLinesSink(self.filename, progress_mode='coalesce', progress_interval_millis=60000),
+                               send)
+
+        # The first updates open an interval, the latest states are written when the sink is closed
+        self.assertEqual([(r['task_id'], r['progress']) for r in records], [('a', 1), ('b', 10), ('a', 5)])
+
+    def test_invalid_progress_mode(self):
+        with self.assertRaises(ValueError):
+            JsonLinesSink(self.filename, progress_mode='all')
+
+
+if __name__ == '__main__':
+    unittest.main()
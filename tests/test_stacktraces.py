@@ -0,0 +1,84 @@
+#!/bin/env/python
+# coding: utf-8
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from logging import FileHandler, Formatter
+from multiprocessing import Process
+
+from FancyLogger import FancyLogger
+from FancyLogger.stacktraces import StacktraceTable, normalize_stacktrace, stacktrace_digest
+
+STACKTRACE = '''Traceback (most recent call last):
+  File "/tmp/job-{pid}/worker.py", line 3, in <module>
+ValueError: <Worker object at 0x{address:x}> failed in process {pid}
+'''
+"Stacktrace of the same bug hit by several processes, given their pid and the address of an object."
+
+
+def throw(logger):
+    """
+    Throws the common stacktrace from a producer process.
+    :param logger: The FancyLogger instance.
+    """
+    logger.throw(STACKTRACE.format(pid=os.getpid(), address=id(logger)), process_title='worker')
+    logger.flush(wait=True, timeout=30)
+
+
+class StacktraceTest(unittest.TestCase):
+    """
+    Deduplication of the stacktraces thrown by many processes.
+    """
+
+    def test_normalization(self):
+        first = STACKTRACE.format(pid=1234, address=0x7f00beef)
+        second = STACKTRACE.format(pid=5678, address=0x7f00cafe)
+
+        self.assertEqual(normalize_stacktrace(first), normalize_stacktrace(second))
+        self.assertEqual(stacktrace_digest(first), stacktrace_digest(second))
+        self.assertNotEqual(stacktrace_digest(first), stacktrace_digest(first.replace('ValueError', 'KeyError')))
+
+    def test_table(self):
+        table = StacktraceTable(size=2)
+
+        self.assertTrue(table.add(3))
+        self.assertFalse(table.add(3))
+        self.assertTrue(table.add(5))
+
+        # Once the table is full, full texts are always sent
+        self.assertTrue(table.add(7))
+        self.assertTrue(table.add(7))
+
+    def test_occurrences(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'stacktraces.log')
+            handler = FileHandler(filename, encoding='utf8')
+            handler.setFormatter(Formatter('%(message)s'))
+
+            logger = FancyLogger(file_handlers=[handler], line_mode=True, console_level=logging.WARNING)
+            try:
+                processes = [Process(target=throw, args=(logger,)) for _ in range(4)]
+                for process in processes:
+                    process.start()
+                for process in processes:
+                    process.join()
+            finally:
+                logger.terminate()
+
+            with open(filename, encoding='utf8') as f:
+                text = f.read()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        # The full text is written once, other occurrences refer to it
+        self.assertEqual(text.count('Traceback'), 1)
+        self.assertEqual(text.count('(occurrence '), 3)
+        self.assertIn('occurred 4 times in 4 processes', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+#!/bin/env/python
+# coding: utf-8
+
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing import Process, SimpleQueue
+from unittest import mock
+
+import dill
+
+from FancyLogger import FancyLogger, TaskProgress, tasks
+from FancyLogger.commands import TaskHandle, UpdateProgressCommand, decode_command, encode_update
+from FancyLogger.sinks import JsonLinesSink
+from FancyLogger.tasks import TaskTable
+
+
+def allocate(logger, handles):
+    """
+    Allocates task handles from a producer process.
+    :param logger:  The FancyLogger instance.
+    :param handles: Queue receiving the handles.
+    """
+    handles.put([logger.new_handle() for _ in range(2)])
+
+
+class TaskTableTest(unittest.TestCase):
+    """
+    Progress bars stored column by column in the logger process.
+    """
+
+    def setUp(self):
+        self.table = TaskTable()
+
+    def test_rows(self):
+        self.table.define('a', total=10, prefix='first')
+        self.table.define('b', total=None, prefix='second')
+        self.table['c'] = TaskProgress(total=4, prefix='third', keep_alive=True)
+
+        # A redefined task keeps its position, a new task reuses the row of a deleted one
+        self.table.define('a', total=20, prefix='first again')
+        del self.table['b']
+        self.table.define('d', total=5, prefix='fourth')
+
+        self.assertEqual(list(self.table), ['a', 'c', 'd'])
+        self.assertEqual(len(self.table.prefix), 3)
+        self.assertNotIn('b', self.table)
+
+        task = self.table['c']
+        self.assertEqual((task.total, task.prefix, task.keep_alive, task.display_time), (4, 'third', True, False))
+        self.assertIsNone(self.table['d'].begin_time)
+        self.assertIsNone(self.table.get('b'))
+
+    def test_longest_prefix(self):
+        self.table.define('a', total=1, prefix='x' * 5)
+        self.table.define('b', total=1, prefix='x' * 12)
+        self.table.define('c', total=1, prefix='x' * 12)
+        self.assertEqual(self.table.longest_prefix, 12)
+
+        # The longest width is kept while a task still has it
+        del self.table['b']
+        self.assertEqual(self.table.longest_prefix, 12)
+        self.table.define('c', total=1, prefix='x' * 3)
+        self.assertEqual(self.table.longest_prefix, 5)
+
+        del self.table['a']
+        del self.table['c']
+        self.assertEqual(self.table.longest_prefix, 0)
+
+    def test_set_progress(self):
+        self.table.define('a', total=10, prefix='bounded')
+        self.table.define('b', total=None, prefix='indeterminate')
+
+        self.assertTrue(self.table.set_progress('a', 15))
+        self.assertFalse(self.table.set_progress('a', 10))
+        self.assertTrue(self.table['a'].is_complete())
+        self.assertTrue(self.table.set_progress('b', 7))
+        self.assertFalse(self.table['b'].is_complete())
+        self.assertEqual((self.table['a'].progress, self.table['b'].total), (10, None))
+
+        # The final count of an indeterminate bar becomes its total
+        self.assertTrue(self.table.set_progress('b', 7, total=7))
+        self.assertTrue(self.table['b'].is_complete())
+        self.assertEqual(self.table.summary(), (17, 17, 2))
+
+    def test_completion(self):
+        self.table.define('a', total=8, prefix='half', bar_length=10)
+        self.table.define('b', total=None, prefix='indeterminate')
+        self.table.define('c', total=0, prefix='empty', bar_length=4)
+        self.table.set_progress('a', 4)
+
+        for numpy in (tasks.numpy, None):
+            with mock.patch.object(tasks, 'numpy', numpy):
+                percents, fills = self.table.completion()
+
+            self.assertEqual((percents[0], fills[0]), (50, 5))
+            self.assertTrue(math.isnan(percents[1]) and math.isnan(fills[1]))
+            self.assertEqual((percents[2], fills[2]), (100, 4))
+
+        self.assertEqual(TaskTable().completion(), ([], []))
+
+
+class BulkTaskTest(unittest.TestCase):
+    """
+    Progress bars defined and updated many at a time.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'progress.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_set_tasks_update_many(self):
+        # Every update is recorded
+        logger = FancyLogger(sinks=[JsonLinesSink(self.filename, progress_mode='sample', progress_interval_millis=0)],
+                             line_mode=True,
+                             console_level=logging.CRITICAL + 1)
+        try:
+            handles = logger.set_tasks([('a', TaskProgress(total=10, prefix='first')),
+                                        ('b', TaskProgress(total=None, prefix='second'))])
+            self.assertEqual(len(set(handles)), 2)
+
+            # Tasks are found by id or by handle, unknown ids and unchanged progress are ignored
+            logger.update_many({'a': 5, handles[1]: 3, 'unknown': 1}, totals={handles[1]: 3})
+            logger.update_many({'a': 5, 'b': 3})
+            logger.update_many({handles[0]: 10})
+            self.assertIsNotNone(logger.flush(wait=True, timeout=30))
+        finally:
+            logger.terminate()
+
+        with open(self.filename, encoding='utf8') as f:
+            records = [json.loads(line) for line in f]
+
+        self.assertEqual([(r['task_id'], r['progress'], r['total'], r['text']) for r in records],
+                         [('a', 5, 10, 'first'), ('b', 3, 3, 'second'), ('a', 10, 10, 'first')])
+
+
+class TaskHandleTest(unittest.TestCase):
+    """
+    Progress bars identified by the compact handles allocated by the processes that define them.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'progress.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_compact_update(self):
+        handle = TaskHandle((os.getpid() << 32) | 7)
+        serialized = encode_update(handle=handle, progress=3, pid=os.getpid(), timestamp=1.5)
+
+        command = decode_command(serialized)
+        self.assertIsInstance(command, UpdateProgressCommand)
+        self.assertIsInstance(command.task_id, TaskHandle)
+        self.assertEqual((command.task_id, command.progress, command.pid, command.timestamp, command.total),
+                         (handle, 3, os.getpid(), 1.5, None))
+        self.assertIsInstance(command.progress, int)
+        self.assertEqual(decode_command(encode_update(handle, 2.5, 1, 0.)).progress, 2.5)
+
+        # Several times smaller than the pickled command, which is still decoded
+        pickled = dill.dumps(UpdateProgressCommand(task_id=handle, progress=3, pid=os.getpid(), timestamp=1.5))
+        self.assertLess(len(serialized) * 3, len(pickled))
+        self.assertEqual(decode_command(pickled).task_id, handle)
+
+    def test_bind(self):
+        table = TaskTable()
+        table.define('a', total=10, prefix='first')
+        table.bind('a', TaskHandle(1))
+        self.assertEqual((table.resolve(TaskHandle(1)), table.resolve('a')), ('a', 'a'))
+
+        # The handle is forgotten along with its task, and its row is reused without it
+        del table['a']
+        self.assertIsNone(table.resolve(TaskHandle(1)))
+        table.define('b', total=10, prefix='second')
+        self.assertIsNone(table.resolve(TaskHandle(1)))
+        self.assertEqual(table.handles, {})
+
+    def test_allocation(self):
+        logger = FancyLogger(line_mode=True, console_level=logging.CRITICAL + 1)
+        try:
+            handles = SimpleQueue()
+            process = Process(target=allocate, args=(logger, handles))
+            process.start()
+            process.join()
+
+            # Handles are unique across processes: the pid is in their high bits
+            remote = handles.get()
+            local = [logger.new_handle() for _ in range(2)]
+            self.assertEqual(len(set(remote + local)), 4)
+            self.assertEqual({handle >> 32 for handle in remote}, {process.pid})
+            self.assertEqual({handle >> 32 for handle in local}, {os.getpid()})
+        finally:
+            logger.terminate()
+
+    def test_update_by_handle(self):
+        logger = FancyLogger(sinks=[JsonLinesSink(self.filename, progress_mode='sample', progress_interval_millis=0)],
+                             line_mode=True,
+                             console_level=logging.CRITICAL + 1)
+        try:
+            named = logger.set_task(task_id='named', total=10, prefix='named')
+            anonymous = logger.set_task(task_id=None, total=None, prefix='anonymous')
+
+            logger.update(named, 4)
+            logger.update(anonymous, 2)
+            logger.update(anonymous, 5, total=5)
+            self.assertIsNotNone(logger.flush(wait=True, timeout=30))
+        finally:
+            logger.terminate()
+
+        with open(self.filename, encoding='utf8') as f:
+            records = [json.loads(line) for line in f]
+
+        # Updates are recorded under the task id the handle stands for
+        self.assertEqual([(r['task_id'], r['progress'], r['total']) for r in records],
+                         [('named', 4, 10), (anonymous, 2, None), (anonymous, 5, 5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
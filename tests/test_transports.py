@@ -0,0 +1,26 @@
+#!/bin/env/python
+# coding: utf-8
+
+import unittest
+
+from roundtrip import RoundTripTest
+
+
+class TransportTest(RoundTripTest):
+    """
+    Round trips through each transport.
+    """
+
+    def test_queue(self):
+        self.assertInOrder(self.round_trip())
+
+    def test_ring(self):
+        self.assertInOrder(self.round_trip(logger_options={'transport': 'ring'}))
+
+    def test_ring_overflow(self):
+        # The producers fill their ring while the logger process stalls, then fall back to the queue
+        self.assertInOrder(self.round_trip(logger_options={'transport': 'ring', 'ring_buffer_size': 4096}, stall=True))
+
+
+if __name__ == '__main__':
+    unittest.main()